@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+import random
+import time
+
+from rumor.domain.deduplication import collapse_duplicates
+
+NUM_NEWS_ITEMS = 100000
+DUPLICATE_RATIO = 0.1
+VOCABULARY_SIZE = 20000
+
+
+def main():
+    rng = random.Random(42)
+    vocabulary = [f'word{i}' for i in range(VOCABULARY_SIZE)]
+    news_items = []
+    for i in range(NUM_NEWS_ITEMS):
+        if news_items and rng.random() < DUPLICATE_RATIO:
+            original = rng.choice(news_items)
+            title = original['title'] + ' ' + rng.choice(['[video]', '(2020)', '- Updated'])
+            url = original['url'] + '?utm_source=hn&utm_medium=social'
+        else:
+            title = ' '.join(rng.sample(vocabulary, rng.randint(5, 12)))
+            url = f'https://www.example-{rng.randint(0, 999)}.com/article/{i}'
+        news_items.append({
+            'news_item_id': f'{i}',
+            'title': title,
+            'url': url,
+            'score': rng.randint(1, 1000)
+        })
+
+    started_at = time.perf_counter()
+    results = collapse_duplicates(news_items)
+    finished_at = time.perf_counter()
+
+    print(f'{NUM_NEWS_ITEMS} news items, {len(results)} after collapsing')
+    print(f'deduplication: {finished_at - started_at:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+import copy
+import logging
+import os
+import random
+import time
+from decimal import Decimal
+
+import logzero
+
+from rumor.domain.evaluation import (finalize_news_item_qualification,
+                                     map_news_item_chunks)
+
+NUM_NEWS_ITEMS = 50000
+NUM_PREFERENCES = 200
+VOCABULARY_SIZE = 5000
+WORKERS = [1, 2, 4]
+
+
+def evaluate_chunks(news_items, preferences, workers):
+    started_at = time.perf_counter()
+    partial = map_news_item_chunks(copy.deepcopy(news_items), preferences, workers=workers)
+    mapped_at = time.perf_counter()
+    results = finalize_news_item_qualification(partial, 1.5, 10, preferences)
+    finished_at = time.perf_counter()
+    return mapped_at - started_at, finished_at - mapped_at, results
+
+
+def main():
+    logzero.loglevel(logging.WARNING)
+    rng = random.Random(42)
+    vocabulary = [f'keyword-{i}' for i in range(VOCABULARY_SIZE)]
+    news_items = [
+        {
+            'news_item_id': f'{rng.randint(0, NUM_NEWS_ITEMS)}',
+            'title': ' '.join(rng.sample(vocabulary, 8)),
+            'url': f'https://www.example-{rng.randint(0, 999)}.com/article/{i}',
+            'score': rng.randint(1, 1000),
+            'keywords': rng.sample(vocabulary, 6)
+        }
+        for i in range(NUM_NEWS_ITEMS)
+    ]
+    preferences = [
+        {'preference_key': keyword, 'preference_weight': Decimal(rng.choice(['1.5', '2', '3']))}
+        for keyword in rng.sample(vocabulary, NUM_PREFERENCES)
+    ]
+
+    print(f'{NUM_NEWS_ITEMS} news items, {NUM_PREFERENCES} preferences, {os.cpu_count()} cpu(s)')
+    baseline = None
+    for workers in WORKERS:
+        map_seconds, finalize_seconds, results = evaluate_chunks(news_items, preferences, workers)
+        baseline = baseline if baseline is not None else results
+        print(f'workers={workers}: map {map_seconds:.2f}s, finalize {finalize_seconds:.2f}s, '
+              f'identical={results == baseline}')
+
+
+if __name__ == '__main__':
+    main()
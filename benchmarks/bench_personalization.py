@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+import random
+import time
+from decimal import Decimal
+
+from rumor.domain.personalization import (build_profiles, evaluate_profiles,
+                                          group_profiles)
+
+NUM_SUBSCRIBERS = 100000
+NUM_NEWS_ITEMS = 10000
+VOCABULARY_SIZE = 5000
+KEYWORDS_PER_SUBSCRIBER = 5
+KEYWORDS_PER_NEWS_ITEM = 6
+
+
+def main():
+    rng = random.Random(42)
+    vocabulary = [f'keyword-{i}' for i in range(VOCABULARY_SIZE)]
+    news_items = [
+        {
+            'news_item_id': f'{i}',
+            'score': rng.randint(1, 1000),
+            'keywords': rng.sample(vocabulary, KEYWORDS_PER_NEWS_ITEM)
+        }
+        for i in range(NUM_NEWS_ITEMS)
+    ]
+    preferences = [
+        {
+            'subscriber': f'subscriber-{s}@example.com',
+            'keyword': keyword,
+            'preference_weight': Decimal(rng.choice(['1.5', '2', '3']))
+        }
+        for s in range(NUM_SUBSCRIBERS)
+        for keyword in rng.sample(vocabulary[:500], KEYWORDS_PER_SUBSCRIBER)
+    ]
+
+    started_at = time.perf_counter()
+    groups = group_profiles(build_profiles(preferences))
+    grouped_at = time.perf_counter()
+    results = evaluate_profiles(news_items, groups, threshold=1.5, limit=10)
+    finished_at = time.perf_counter()
+
+    print(f'{NUM_SUBSCRIBERS} subscribers, {len(groups)} profile groups, '
+          f'{NUM_NEWS_ITEMS} news items')
+    print(f'grouping:   {grouped_at - started_at:.2f}s')
+    print(f'evaluation: {finished_at - grouped_at:.2f}s')
+    print(f'reports:    {sum(1 for r in results.values() if r)}')
+
+
+if __name__ == '__main__':
+    main()
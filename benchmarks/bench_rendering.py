@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+import random
+import time
+from decimal import Decimal
+
+from rumor.domain.rendering import (render_message, render_report,
+                                    reset_render_cache)
+
+NUM_NEWS_ITEMS = 1000
+NUM_REPORTS = 50
+
+
+def legacy_format_report(report):
+    head = 'Created {}\n\n'.format(report['created_at'])
+    body = ''
+    for ni in report['news_items']:
+        modified_score = ni.get('modified_score', ni['score'])
+        body += '[{} + {}] {}\n{}\n\n'.format(
+            ni['score'], modified_score - ni['score'], ni['title'], ni['url'])
+    return head + body
+
+
+def main():
+    rng = random.Random(42)
+    reports = [
+        {
+            'version': '1',
+            'created_at': 1600000000 + r * 3600,
+            'news_items': [
+                {
+                    'news_item_id': f'{i}',
+                    'url': f'https://example.com/{r}/{i}',
+                    'title': f'News item {i} & friends',
+                    'score': rng.randint(1, 1000),
+                    'modified_score': Decimal(rng.randint(1, 2000))
+                }
+                for i in range(NUM_NEWS_ITEMS)
+            ]
+        }
+        for r in range(NUM_REPORTS)
+    ]
+
+    started_at = time.perf_counter()
+    for report in reports:
+        legacy_format_report(report)
+    legacy_at = time.perf_counter()
+
+    reset_render_cache()
+    render_report(reports[0])
+    text_at = time.perf_counter()
+    for report in reports:
+        render_report(report)
+    rendered_at = time.perf_counter()
+    for report in reports:
+        render_message(report)
+    cached_at = time.perf_counter()
+
+    render_report(reports[0], html=True)
+    warmed_at = time.perf_counter()
+    for report in reports:
+        render_report(report, html=True)
+    html_at = time.perf_counter()
+
+    print(f'{NUM_REPORTS} reports x {NUM_NEWS_ITEMS} news items')
+    print(f'legacy text:          {(legacy_at - started_at) / NUM_REPORTS * 1000:.2f}ms/report')
+    print(f'text render:          {(rendered_at - text_at) / NUM_REPORTS * 1000:.2f}ms/report')
+    print(f'cached message:       {(cached_at - rendered_at) / NUM_REPORTS * 1000:.2f}ms/report')
+    print(f'first html render:    {(warmed_at - cached_at) * 1000:.2f}ms')
+    print(f'text + html render:   {(html_at - warmed_at) / NUM_REPORTS * 1000:.2f}ms/report')
+
+
+if __name__ == '__main__':
+    main()
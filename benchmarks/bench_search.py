@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+import logging
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+import logzero
+
+from rumor.domain.search import (rebuild_search_index, search_news_items,
+                                 update_search_index)
+
+NUM_NEWS_ITEMS = 1000000
+BATCH_SIZE = 10000
+VOCABULARY_SIZE = 50000
+DAYS = 365
+QUERIES = ['webassembly', 'rust webassembly', 'postgres', 'word17', 'word4242 word7']
+
+
+def create_batches(rng, vocabulary, now):
+    cum_weights = list(accumulate(1.0 / rank for rank in range(1, len(vocabulary) + 1)))
+    for start in range(0, NUM_NEWS_ITEMS, BATCH_SIZE):
+        batch = []
+        for i in range(start, min(start + BATCH_SIZE, NUM_NEWS_ITEMS)):
+            words = rng.choices(vocabulary, cum_weights=cum_weights, k=8)
+            created_at = int(now - rng.random() * DAYS * 86400)
+            batch.append({
+                'news_item_id': str(i),
+                'title': ' '.join(words),
+                'keywords': words[:5],
+                'url': f'https://www.example-{rng.randint(0, 999)}.com/article/{i}',
+                'score': rng.randint(1, 1000),
+                'created_at': created_at
+            })
+        yield batch
+
+
+def main():
+    logzero.loglevel(logging.WARNING)
+    rng = random.Random(42)
+    vocabulary = [f'word{i}' for i in range(VOCABULARY_SIZE)]
+    vocabulary[50], vocabulary[200], vocabulary[2000] = 'rust', 'postgres', 'webassembly'
+    now = time.time()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'search.db')
+        started_at = time.perf_counter()
+        rebuild_search_index(create_batches(rng, vocabulary, now), path)
+        rebuilt_at = time.perf_counter()
+        update_search_index(next(create_batches(random.Random(7), vocabulary, now)), path)
+        updated_at = time.perf_counter()
+        print(f'{NUM_NEWS_ITEMS} news items, {os.path.getsize(path) / 1024.0 / 1024.0:.0f} MiB index')
+        print(f'rebuild:          {rebuilt_at - started_at:.1f}s')
+        print(f'update {BATCH_SIZE}:     {updated_at - rebuilt_at:.2f}s')
+
+        since = datetime.now() - timedelta(days=30)
+        for query in QUERIES:
+            for kwargs in ({}, {'since': since, 'min_score': 500}):
+                started_at = time.perf_counter()
+                results = search_news_items(path, query, **kwargs)
+                elapsed = time.perf_counter() - started_at
+                print(f'search {query!r} {kwargs and "(30 days, score >= 500)" or ""}: '
+                      f'{elapsed * 1000:.1f}ms, {len(results)} results')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+import copy
+import logging
+import random
+import time
+from decimal import Decimal
+
+import logzero
+
+from rumor.domain.evaluation import perform_news_item_qualification
+from rumor.domain.similarity import IdfStatistics
+
+NUM_NEWS_ITEMS = 5000
+NUM_PREFERENCES = 50
+VOCABULARY_SIZE = 3000
+VARIANT_RATIO = 0.2
+VARIANT_SUFFIXES = ['s', 'ql', 'js', 'db', '-rs', 'ing']
+TOP = 50
+
+
+def create_news_items(rng, vocabulary):
+    news_items = []
+    for i in range(NUM_NEWS_ITEMS):
+        words = rng.sample(vocabulary, rng.randint(5, 10))
+        words = [word + rng.choice(VARIANT_SUFFIXES) if rng.random() < VARIANT_RATIO else word
+                 for word in words]
+        news_items.append({
+            'news_item_id': f'{i}',
+            'title': ' '.join(words),
+            'url': f'https://www.example-{rng.randint(0, 999)}.com/article/{i}',
+            'score': rng.randint(1, 1000),
+            'keywords': words
+        })
+    return news_items
+
+
+def rank(news_items, preferences, scoring_mode, idf_statistics=None):
+    started_at = time.perf_counter()
+    ranked = perform_news_item_qualification(copy.deepcopy(news_items), 0.0, TOP, preferences,
+                                             scoring_mode=scoring_mode,
+                                             idf_statistics=idf_statistics)
+    return time.perf_counter() - started_at, [ni['news_item_id'] for ni in ranked]
+
+
+def main():
+    logzero.loglevel(logging.WARNING)
+    rng = random.Random(42)
+    vocabulary = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(4, 9)))
+                  for _ in range(VOCABULARY_SIZE)]
+    news_items = create_news_items(rng, vocabulary)
+    preferences = [
+        {'preference_key': keyword, 'preference_weight': Decimal(rng.choice(['1.5', '2', '3']))}
+        for keyword in rng.sample(vocabulary, NUM_PREFERENCES)
+    ]
+
+    exact_seconds, exact_ranked = rank(news_items, preferences, 'exact')
+    idf_statistics = IdfStatistics()
+    cold_seconds, tfidf_ranked = rank(news_items, preferences, 'tfidf', idf_statistics)
+    warm_seconds, _ = rank(news_items, preferences, 'tfidf', idf_statistics)
+    overlap = len(set(exact_ranked) & set(tfidf_ranked)) / max(len(exact_ranked), 1)
+
+    print(f'{NUM_NEWS_ITEMS} news items, {NUM_PREFERENCES} preferences, top {TOP}')
+    print(f'exact:        {exact_seconds:.2f}s')
+    print(f'tfidf (cold): {cold_seconds:.2f}s')
+    print(f'tfidf (warm): {warm_seconds:.2f}s')
+    print(f'overlap:      {overlap:.0%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+import functools
+import json
+import multiprocessing
+import time
+
+from rumor.interfaces.worker import load_config, supervise
+from tests.stubs import LocalSQSManager, local_sqs_client
+
+NUM_MESSAGES = 800
+BATCH_LATENCY_SECONDS = 0.2
+WORKER_COUNTS = [1, 2, 4, 8]
+
+
+def simulated_processor(records, config, caches):
+    started_at = time.time()
+    time.sleep(config['batch_latency'])
+    for record in records:
+        json.loads(record['body'])
+    config['timings'].append((started_at, time.time(), len(records)))
+    return []
+
+
+def run(workers):
+    with LocalSQSManager() as manager, multiprocessing.Manager() as sync_manager:
+        sqs = manager.LocalSQS()
+        sqs.get_queue_url(QueueName='bench-queue')
+        for i in range(0, NUM_MESSAGES, 10):
+            sqs.send_message_batch(QueueUrl='bench-queue', Entries=[
+                {'Id': str(j), 'MessageBody': json.dumps({'news_item_id': str(i + j)})}
+                for j in range(10)])
+        config = load_config('inspect', queue_name='bench-queue', wait_seconds=1, prefetch=1,
+                             watermark_path='', fingerprint_path='')
+        config['batch_latency'] = BATCH_LATENCY_SECONDS
+        config['timings'] = sync_manager.list()
+
+        started_at = time.perf_counter()
+        supervise(config, workers, max_records=NUM_MESSAGES,
+                  client_factory=functools.partial(local_sqs_client, sqs),
+                  processor=simulated_processor)
+        elapsed = time.perf_counter() - started_at
+        timings = list(config['timings'])
+        records = sum(count for _, _, count in timings)
+        busy = max(end for _, end, _ in timings) - min(start for start, _, _ in timings)
+        return records, elapsed, busy
+
+
+def main():
+    baseline = None
+    for workers in WORKER_COUNTS:
+        records, elapsed, busy = run(workers)
+        throughput = records / busy
+        baseline = baseline or throughput
+        print(f'{workers} worker(s): {records} messages, {throughput:.1f} msg/s steady state '
+              f'({throughput / baseline:.2f}x), {elapsed:.2f}s including process start-up')
+
+
+if __name__ == '__main__':
+    main()
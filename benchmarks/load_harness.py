@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import math
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import boto3
+import yaml
+from moto import mock_aws
+
+from rumor.domain.rendering import reset_render_cache
+from rumor.upstreams.aws import reset_topic_arns
+from rumor.upstreams.hacker_news import reset_circuit_breakers
+from rumor.upstreams.metrics import get_metrics_report, reset_metrics
+from rumor.upstreams.rate_control import (get_rate_controller,
+                                          reset_rate_controllers)
+
+SERVERLESS_PATH = 'serverless.yml'
+STAGE = 'loadtest'
+DEFAULT_TIMEOUT_SECONDS = 6
+STAGES = ['discovery', 'inspection', 'classification', 'evaluation', 'report']
+HANDLERS = {
+    'discovery': 'discovery_handler',
+    'inspection': 'inspection_event_handler',
+    'classification': 'classification_event_handler',
+    'evaluation': 'evaluation_handler',
+    'report': 'report_handler'
+}
+QUEUES = {
+    'inspection': 'RUMOR_COLLECTION_QUEUE_NAME',
+    'classification': 'RUMOR_CLASSIFICATION_QUEUE_NAME'
+}
+UNBOUNDED_RATE = {'rate': 1e6, 'burst': 1e6, 'max_rate': 1e6}
+WORDS = ['rust', 'python', 'serverless', 'database', 'kernel', 'compiler', 'startup',
+         'security', 'privacy', 'linux', 'browser', 'network', 'release', 'design']
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class HackerNewsStub:
+    def __init__(self, latency_ms: float = 50.0, latency_sigma: float = 0.5,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0,
+                 seed: int = 42) -> None:
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.top_stories = []
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f'http://{host}:{port}'
+
+    def publish(self, count: int) -> None:
+        start = (self.top_stories[-1] + 1) if self.top_stories else 30000000
+        self.top_stories = list(range(start, start + count))
+
+    def __enter__(self) -> 'HackerNewsStub':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def item(self, news_item_id: int) -> dict:
+        rng = random.Random(news_item_id)
+        return {
+            'id': news_item_id,
+            'type': 'story',
+            'by': f'user{rng.randint(0, 999)}',
+            'time': int(time.time()) - rng.randint(60, 3600 * 12),
+            'score': rng.randint(1, 1000),
+            'descendants': rng.randint(0, 300),
+            'title': ' '.join(rng.choice(WORDS).capitalize() for _ in range(rng.randint(4, 10))),
+            'url': f'https://example-{rng.randint(0, 99)}.com/{news_item_id}'
+        }
+
+    def _sample(self) -> tuple:
+        with self._lock:
+            self.requests += 1
+            delay = self._rng.lognormvariate(math.log(self.latency_ms / 1000.0),
+                                             self.latency_sigma) if self.latency_ms > 0 else 0
+            roll = self._rng.random()
+        if roll < self.throttle_rate:
+            return delay, 429
+        if roll < self.throttle_rate + self.error_rate:
+            return delay, 500
+        return delay, 200
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                delay, status = stub._sample()
+                time.sleep(delay)
+                match = re.match(r'^/v0/item/(\d+)\.json$', self.path)
+                if self.path == '/v0/topstories.json':
+                    body = stub.top_stories
+                elif match:
+                    body = stub.item(int(match.group(1)))
+                else:
+                    status, body = 404, {}
+                payload = json.dumps(body).encode('utf-8')
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def load_serverless(path: str = SERVERLESS_PATH) -> dict:
+    with open(path) as f:
+        config = yaml.safe_load(f)
+    variables = dict(config['custom'], stage=STAGE)
+    variables = {k: v.replace('${self:provider.stage}', STAGE) if isinstance(v, str) else v
+                 for k, v in variables.items()}
+
+    def resolve(value):
+        if isinstance(value, str):
+            value = value.replace('${self:provider.stage}', STAGE)
+            return re.sub(r'\$\{self:custom\.(\w+)\}', lambda m: str(variables[m.group(1)]), value)
+        if isinstance(value, dict):
+            return {k: resolve(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [resolve(v) for v in value]
+        return value
+
+    return resolve(config)
+
+
+def get_timeouts(config: dict) -> dict:
+    default = config['provider'].get('timeout', DEFAULT_TIMEOUT_SECONDS)
+    return {stage: config['functions'][stage].get('timeout', default) for stage in STAGES}
+
+
+def create_resources(config: dict) -> None:
+    dynamodb = boto3.client('dynamodb')
+    sqs = boto3.client('sqs')
+    sns = boto3.client('sns')
+    for resource in config['resources']['Resources'].values():
+        properties = resource.get('Properties', {})
+        if resource['Type'] == 'AWS::DynamoDB::Table':
+            table = {k: v for k, v in properties.items() if k != 'TimeToLiveSpecification'}
+            table['ProvisionedThroughput'] = {
+                k: int(v) for k, v in properties['ProvisionedThroughput'].items()}
+            dynamodb.create_table(**table)
+        elif resource['Type'] == 'AWS::SQS::Queue':
+            sqs.create_queue(QueueName=properties['QueueName'], Attributes={
+                k: str(v) for k, v in properties.items() if k != 'QueueName'})
+        elif resource['Type'] == 'AWS::SNS::Topic':
+            sns.create_topic(Name=properties['TopicName'])
+
+
+def configure_environment(config: dict, hn_url: str, state_path: str) -> None:
+    os.environ.update({k: str(v) for k, v in config['provider']['environment'].items()})
+    os.environ['RUMOR_DISCOVERY_TARGET_API_URL'] = hn_url
+    os.environ['RUMOR_WATERMARK_PATH'] = os.path.join(state_path, 'watermarks.json')
+    os.environ['RUMOR_FINGERPRINT_PATH'] = os.path.join(state_path, 'fingerprints.json')
+    os.environ['RUMOR_EMF_METRICS'] = 'false'
+
+
+def reset_state(config: dict, hn_url: str, unbounded: bool) -> None:
+    reset_rate_controllers()
+    reset_circuit_breakers()
+    reset_topic_arns()
+    reset_render_cache()
+    reset_metrics()
+    if unbounded:
+        get_rate_controller(f'hacker_news:{hn_url}', **UNBOUNDED_RATE)
+        for resource in config['resources']['Resources'].values():
+            if resource['Type'] == 'AWS::DynamoDB::Table':
+                table_name = resource['Properties']['TableName']
+                get_rate_controller(f'dynamodb:{table_name}', **UNBOUNDED_RATE)
+
+
+def timed(latencies: list, handler, event: dict):
+    started_at = time.perf_counter()
+    try:
+        return handler(event, {})
+    finally:
+        latencies.append(time.perf_counter() - started_at)
+
+
+def drain_queue(queue_name: str, handler, latencies: list, batch_size: int = 10,
+                max_receives: int = 3) -> int:
+    sqs = boto3.client('sqs')
+    queue_url = sqs.get_queue_url(QueueName=queue_name)['QueueUrl']
+    receives = defaultdict(int)
+    dropped = 0
+    while True:
+        messages = sqs.receive_message(QueueUrl=queue_url, MaxNumberOfMessages=batch_size,
+                                       VisibilityTimeout=0, AttributeNames=['SentTimestamp'],
+                                       MessageAttributeNames=['All']).get('Messages', [])
+        if not messages:
+            return dropped
+        records = [{'messageId': m['MessageId'], 'receiptHandle': m['ReceiptHandle'],
+                    'body': m['Body'], 'attributes': m.get('Attributes', {}),
+                    'messageAttributes': m.get('MessageAttributes', {})} for m in messages]
+        response = timed(latencies, handler, {'Records': records})
+        failed = {f['itemIdentifier'] for f in response.get('batchItemFailures', [])}
+        done = []
+        for message in messages:
+            receives[message['MessageId']] += 1
+            if message['MessageId'] not in failed:
+                done.append(message)
+            elif receives[message['MessageId']] >= max_receives:
+                done.append(message)
+                dropped += 1
+        if done:
+            sqs.delete_message_batch(QueueUrl=queue_url, Entries=[
+                {'Id': str(i), 'ReceiptHandle': m['ReceiptHandle']} for i, m in enumerate(done)])
+
+
+def run_volume(volume: int, stub: HackerNewsStub, config: dict, unbounded: bool) -> dict:
+    from rumor.interfaces import handlers
+
+    reset_state(config, stub.url, unbounded)
+    stub.publish(volume)
+    latencies = defaultdict(list)
+    dropped = {}
+    started_at = time.perf_counter()
+    timed(latencies['discovery'], handlers.discovery_handler, {'limit': volume})
+    for stage, queue_variable in QUEUES.items():
+        dropped[stage] = drain_queue(os.environ[queue_variable],
+                                     getattr(handlers, HANDLERS[stage]), latencies[stage])
+    timed(latencies['evaluation'], handlers.evaluation_handler, {'news_item_max_age_hours': 0})
+    timed(latencies['report'], handlers.report_handler, {})
+    elapsed = time.perf_counter() - started_at
+    return {'volume': volume, 'elapsed': elapsed, 'latencies': dict(latencies),
+            'dropped': dropped, 'freshness': get_metrics_report()}
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(math.ceil(p / 100.0 * len(ordered))) - 1)]
+
+
+def timeout_volume(results: list, stage: str, timeout: float):
+    points = [(r['volume'], max(r['latencies'].get(stage) or [0.0])) for r in results]
+    for volume, latency in points:
+        if latency > timeout:
+            return volume, 'observed'
+    if len(points) < 2:
+        return None, 'n/a'
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / variance if variance else 0.0
+    if slope <= 0:
+        return None, 'flat'
+    return int((timeout - (mean_y - slope * mean_x)) / slope), 'extrapolated'
+
+
+def report(results: list, timeouts: dict) -> None:
+    for result in results:
+        print(f'volume {result["volume"]}: {result["elapsed"]:.2f}s end to end, '
+              f'{result["volume"] / result["elapsed"]:.1f} items/s')
+        for stage in STAGES:
+            values = result['latencies'].get(stage, [])
+            print(f'  {stage:<15} n={len(values):<4} p50={percentile(values, 50):.3f}s '
+                  f'p95={percentile(values, 95):.3f}s p99={percentile(values, 99):.3f}s '
+                  f'max={max(values or [0.0]):.3f}s')
+        for stage, count in result['dropped'].items():
+            if count:
+                print(f'  {stage:<15} dropped {count} message(s) after repeated failures')
+        for stage, metrics in result['freshness'].items():
+            for name, summary in metrics.items():
+                print(f'  {stage + " " + name:<27} n={summary["count"]:<4} '
+                      f'p50={summary["p50"]:.3f}s p90={summary["p90"]:.3f}s '
+                      f'p99={summary["p99"]:.3f}s max={summary["max"]:.3f}s')
+    print('timeouts (serverless.yml):')
+    for stage in STAGES:
+        volume, method = timeout_volume(results, stage, timeouts[stage])
+        limit = f'~{volume} items ({method})' if volume is not None else method
+        print(f'  {stage:<15} {timeouts[stage]}s -> {limit}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Drive the rumor handlers against local stand-ins')
+    parser.add_argument('--volumes', default='25,50,100,200')
+    parser.add_argument('--latency-ms', type=float, default=50.0)
+    parser.add_argument('--latency-sigma', type=float, default=0.5)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limits', choices=['production', 'unbounded'], default='production')
+    args = parser.parse_args()
+
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-central-1')
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+    config = load_serverless()
+    timeouts = get_timeouts(config)
+    volumes = [int(v) for v in args.volumes.split(',')]
+
+    with tempfile.TemporaryDirectory() as tmp, mock_aws(), \
+            HackerNewsStub(args.latency_ms, args.latency_sigma, args.error_rate,
+                           args.throttle_rate) as stub:
+        create_resources(config)
+        configure_environment(config, stub.url, tmp)
+        results = [run_volume(volume, stub, config, args.rate_limits == 'unbounded')
+                   for volume in volumes]
+    report(results, timeouts)
+    print(f'hacker news stub served {stub.requests} requests')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+import json
+import random
+import threading
+from collections import Counter
+from contextlib import ExitStack
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, TextIO, Tuple
+from unittest.mock import patch
+
+from rumor.domain import (classify_records, discover, evaluate,
+                          inspect_records, send_reports)
+from rumor.domain.classification import classify_news_item, normalize
+from rumor.domain.report_references import REPORT_VERSIONS
+from rumor.interfaces.profiling import profile_call
+from rumor.upstreams.packing import pack_messages
+
+NEWS_ITEM_MAX_AGE_HOURS = 48
+SYNTHETIC_WORDS = ['rust', 'python', 'serverless', 'database', 'kernel', 'compiler',
+                   'startup', 'security', 'privacy', 'linux', 'browser', 'network',
+                   'release', 'open', 'source', 'learning', 'machine', 'design']
+
+
+class UpstreamStubs:
+    def __init__(self) -> None:
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._patches = []
+
+    def stub(self, target: str, func: Callable[..., Any]) -> None:
+        name = target.rsplit('.', 1)[-1]
+
+        def counted(*args, **kwargs):
+            with self._lock:
+                self.calls[name] += 1
+            return func(*args, **kwargs)
+        self._patches.append(patch(target, new=counted))
+
+    def __enter__(self) -> 'UpstreamStubs':
+        self._stack = ExitStack()
+        for p in self._patches:
+            self._stack.enter_context(p)
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self._stack.close()
+
+
+def profile_stage(stage: str, news_items: List[Dict[str, Any]],
+                  profiler: str = 'sampling') -> Dict[str, Any]:
+    run, stubs = STAGES[stage](news_items)
+    with stubs:
+        results = profile_call(run, profiler=profiler)
+    return dict(results, stage=stage, news_items=len(news_items),
+                upstream_calls=dict(stubs.calls))
+
+
+def synthetic_news_items(count: int, seed: int = 42) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    now = int(datetime.now().timestamp())
+    return [
+        {
+            'id': 20000000 + i,
+            'type': 'story',
+            'by': f'user{rng.randint(0, 999)}',
+            'time': now - rng.randint(60, 3600 * (NEWS_ITEM_MAX_AGE_HOURS - 1)),
+            'score': rng.randint(1, 1000),
+            'descendants': rng.randint(0, 500),
+            'title': ' '.join(rng.choice(SYNTHETIC_WORDS).capitalize()
+                              for _ in range(rng.randint(4, 10))),
+            'url': f'https://example-{rng.randint(0, 99)}.com/{i}'
+        }
+        for i in range(count)
+    ]
+
+
+def load_fixture(f: TextIO) -> List[Dict[str, Any]]:
+    data = json.load(f)
+    return data['items'] if isinstance(data, dict) else data
+
+
+def _records(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [{'messageId': f'message-{i}', 'body': body}
+            for i, body in enumerate(pack_messages(messages, compress=True))]
+
+
+def _stored_news_items(news_items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [normalize(classify_news_item(dict(ni)), ttl_hours=NEWS_ITEM_MAX_AGE_HOURS * 3)
+            for ni in news_items]
+
+
+def _subscriber_preferences(count: int = 100) -> List[Dict[str, Any]]:
+    rng = random.Random(42)
+    return [{'subscriber': f'subscriber-{s}@example.com', 'keyword': keyword,
+             'preference_weight': rng.choice([2, 3])}
+            for s in range(count) for keyword in rng.sample(SYNTHETIC_WORDS, 3)]
+
+
+def _discover_stage(news_items: List[Dict[str, Any]]) -> Tuple[Callable, UpstreamStubs]:
+    stubs = UpstreamStubs()
+    stubs.stub('rumor.domain.discovery.get_news_items',
+               lambda url: [ni['id'] for ni in news_items])
+    stubs.stub('rumor.domain.discovery.send_messages', lambda *args, **kwargs: None)
+    return (lambda: discover('http://stub', len(news_items), 'collection-queue')), stubs
+
+
+def _inspect_stage(news_items: List[Dict[str, Any]]) -> Tuple[Callable, UpstreamStubs]:
+    by_id = {str(ni['id']): ni for ni in news_items}
+    records = _records([{'news_item_id': str(ni['id'])} for ni in news_items])
+    stubs = UpstreamStubs()
+    stubs.stub('rumor.domain.inspection.news_item_source_request',
+               lambda news_item_id, url: dict(by_id[str(news_item_id)]))
+    stubs.stub('rumor.domain.inspection.send_messages', lambda *args, **kwargs: None)
+    return (lambda: inspect_records(records, 'classification-queue',
+                                    NEWS_ITEM_MAX_AGE_HOURS, 'http://stub')), stubs
+
+
+def _classify_stage(news_items: List[Dict[str, Any]]) -> Tuple[Callable, UpstreamStubs]:
+    records = _records(news_items)
+    stubs = UpstreamStubs()
+    stubs.stub('rumor.domain.classification.update_news_item', lambda *args, **kwargs: True)
+    return (lambda: classify_records(records, NEWS_ITEM_MAX_AGE_HOURS, 'news-items')), stubs
+
+
+def _evaluation_stubs(stored: List[Dict[str, Any]],
+                      reports: Optional[List[Dict[str, Any]]] = None) -> UpstreamStubs:
+    reports = reports if reports is not None else []
+    stubs = UpstreamStubs()
+    stubs.stub('rumor.domain.evaluation.get_news_items', lambda *args, **kwargs: stored)
+    stubs.stub('rumor.domain.evaluation.get_preferences', lambda *args: [
+        {'preference_key': 'rust', 'preference_weight': 2},
+        {'preference_key': 'python', 'preference_weight': 1.5}
+    ])
+    stubs.stub('rumor.domain.evaluation.get_subscriber_preferences',
+               lambda *args: _subscriber_preferences())
+    stubs.stub('rumor.domain.evaluation.store_item',
+               lambda item, table_name: reports.append(item))
+    stubs.stub('rumor.domain.evaluation.batch_write_items', lambda requests, table_name: reports.extend(
+        request['PutRequest']['Item'] for request in requests))
+    return stubs
+
+
+def _evaluate_stage(news_items: List[Dict[str, Any]]) -> Tuple[Callable, UpstreamStubs]:
+    stored = _stored_news_items(news_items)
+    return (lambda: evaluate('news-items', 'evaluation-reports', 'preferences',
+                             news_item_max_age_hours=0,
+                             evaluation_period_hours=NEWS_ITEM_MAX_AGE_HOURS)), \
+        _evaluation_stubs(stored)
+
+
+def _send_reports_stage(news_items: List[Dict[str, Any]]) -> Tuple[Callable, UpstreamStubs]:
+    stored = _stored_news_items(news_items)
+    reports = []
+    with _evaluation_stubs(stored, reports):
+        evaluate('news-items', 'evaluation-reports', 'preferences',
+                 news_item_max_age_hours=0, evaluation_period_hours=NEWS_ITEM_MAX_AGE_HOURS)
+    by_key = {(ni['created_at_date'], ni['news_item_id']): ni for ni in stored}
+    by_key.update({(r['version'], r['created_at']): r for r in reports})
+
+    stubs = UpstreamStubs()
+    stubs.stub('rumor.domain.report.get_reports', lambda *args, **kwargs: [
+        dict(r) for r in reports if r['version'] in REPORT_VERSIONS])
+    stubs.stub('rumor.domain.report.get_items_by_keys', lambda table, keys: [
+        by_key[tuple(k.values())] for k in keys if tuple(k.values()) in by_key])
+    stubs.stub('rumor.domain.report.get_subscriber_preferences',
+               lambda *args: _subscriber_preferences())
+    stubs.stub('rumor.domain.report.resolve_topic_arn', lambda hint: f'arn:{hint}')
+    stubs.stub('rumor.domain.report.publish_notifications',
+               lambda entries, topic_arn: {entry['Id'] for entry in entries})
+    stubs.stub('rumor.domain.report.mark_report_delivered', lambda *args: None)
+    return (lambda: send_reports(24, 'evaluation-reports', 'topic',
+                                 preference_table_name='preferences',
+                                 personalized_topic_arn_hint='personalized-topic',
+                                 news_item_table_name='news-items')), stubs
+
+
+STAGES = {
+    'discover': _discover_stage,
+    'inspect': _inspect_stage,
+    'classify': _classify_stage,
+    'evaluate': _evaluate_stage,
+    'send_reports': _send_reports_stage
+}
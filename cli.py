@@ -1,11 +1,29 @@
 #!/usr/bin/env python3
+import json
+import os
+from datetime import datetime, timedelta
 from typing import Any, Dict, List
 
 import boto3
 import boto3.dynamodb.types
 import click
 
-from rumor.upstreams.aws import get_preferences, store_preference
+from benchmarks.profile_stages import (STAGES, load_fixture, profile_stage,
+                                       synthetic_news_items)
+from rumor.domain.evaluation import SCORING_MODES, evaluate
+from rumor.domain.migration import migrate_news_item_shards
+from rumor.domain.preferences import (FORMATS, guess_format, read_keywords,
+                                      sync_keywords, write_keywords)
+from rumor.domain.search import (rebuild_search_index_from_table,
+                                 search_news_items)
+from rumor.domain.snapshot import Snapshot, append_to_snapshot
+from rumor.domain.trends import get_trending
+from rumor.interfaces.profiling import PROFILERS, write_collapsed
+from rumor.interfaces.worker import STAGES as WORKER_STAGES
+from rumor.interfaces.worker import load_config, supervise
+from rumor.upstreams.aws import (get_news_items, get_preferences,
+                                 store_preference, store_subscriber_preference)
+from rumor.upstreams.query_planning import estimate_cost, plan_day_queries
 
 FUNCTION_NAMES = [
     'discovery',
@@ -31,6 +49,21 @@ def get():
     pass
 
 
+@cli.group(name='import')
+def import_():
+    pass
+
+
+@cli.group()
+def export():
+    pass
+
+
+@cli.group()
+def migrate():
+    pass
+
+
 def dry_run(func):
     return click.option('--dry-run', is_flag=True, default=False)(func)
 
@@ -49,20 +82,28 @@ def std_options(func):
 
 @create.command(name='subscription')
 @std_options
-@click.option('--topic-hint', default='rumor-production-notification-topic')
+@click.option('--topic-hint', default=None)
+@click.option('--personalized', is_flag=True, default=False)
 @click.argument('email')
-def create_subscription(email: str, topic_hint: str,
+def create_subscription(email: str, topic_hint: str, personalized: bool,
                         dry_run: bool, verbose: bool, quiet: bool):
+    if topic_hint is None:
+        topic_hint = ('rumor-production-personalized-topic' if personalized
+                      else 'rumor-production-notification-topic')
     client = boto3.client('sns')
     topics = client.list_topics()['Topics']
     topic = _get_topic_arn(topics, topic_hint)
     if dry_run:
         click.echo(f'DRY RUN: Subscribe "{email}" to topic "{topic}"')
         return
+    attributes = {}
+    if personalized:
+        attributes['FilterPolicy'] = json.dumps({'subscriber': [email]})
     response = client.subscribe(
         TopicArn=topic,
         Protocol='email',
         Endpoint=email,
+        Attributes=attributes,
         ReturnSubscriptionArn=True
     )
     subscription_arn = response['SubscriptionArn']
@@ -74,9 +115,15 @@ def create_subscription(email: str, topic_hint: str,
 @std_options
 @click.option('--table', default='rumor-production-preferences')
 @click.option('--weight', default=1.25, type=float)
+@click.option('--subscriber', default=None)
 @click.argument('keyword')
-def create_keyword(keyword: str, weight: float, table: str,
+def create_keyword(keyword: str, weight: float, table: str, subscriber: str,
                    dry_run: bool, verbose: bool, quiet: bool):
+    if subscriber is not None:
+        store_subscriber_preference(subscriber, keyword, weight, table)
+        click.echo(f'Keyword "{keyword}" with weight {weight} saved for '
+                   f'subscriber "{subscriber}" to table "{table}"')
+        return
     store_preference(keyword, weight, table)
     click.echo(f'Keyword "{keyword}" with weight {weight} saved to table "{table}"')
 
@@ -92,6 +139,235 @@ def get_keywords(table: str, dry_run: bool, verbose: bool, quiet: bool):
         click.echo(f'{keyword}={weight}')
 
 
+@import_.command(name='keywords')
+@std_options
+@click.option('--table', default='rumor-production-preferences')
+@click.option('--format', 'fmt', default=None, type=click.Choice(FORMATS))
+@click.option('--prune', is_flag=True, default=False)
+@click.option('--workers', default=4, type=int)
+@click.argument('file', type=click.File('r'))
+def import_keywords(file, table: str, fmt: str, prune: bool, workers: int,
+                    dry_run: bool, verbose: bool, quiet: bool):
+    weights = read_keywords(file, guess_format(file.name, fmt))
+    changes = sync_keywords(weights, table, prune=prune, dry_run=dry_run,
+                            max_workers=workers)
+    prefix = 'DRY RUN: ' if dry_run else ''
+    if verbose:
+        for action in ['created', 'updated', 'deleted']:
+            for keyword in changes[action]:
+                click.echo(f'{prefix}{action} {keyword}={weights.get(keyword, "")}')
+    if not quiet:
+        click.echo(f'{prefix}{len(changes["created"])} created, '
+                   f'{len(changes["updated"])} updated, '
+                   f'{len(changes["deleted"])} deleted, '
+                   f'{len(changes["unchanged"])} unchanged in table "{table}"')
+
+
+@export.command(name='keywords')
+@std_options
+@click.option('--table', default='rumor-production-preferences')
+@click.option('--format', 'fmt', default=None, type=click.Choice(FORMATS))
+@click.option('--output', '-o', default='-', type=click.File('w'))
+def export_keywords(table: str, fmt: str, output, dry_run: bool, verbose: bool,
+                    quiet: bool):
+    write_keywords(get_preferences(table), output, guess_format(output.name, fmt))
+
+
+@create.command(name='snapshot')
+@std_options
+@click.option('--table', default='rumor-production-news-items')
+@click.option('--hours', default=120, type=int)
+@click.option('--shards', default=1, type=int)
+@click.option('--items-per-hour', default=30.0, type=float)
+@click.argument('path')
+def create_snapshot(path: str, table: str, hours: int, shards: int, items_per_hour: float,
+                    dry_run: bool, verbose: bool, quiet: bool):
+    created_at_to = datetime.now()
+    created_at_from = created_at_to - timedelta(hours=hours)
+    if dry_run:
+        queries = plan_day_queries(created_at_from, created_at_to, shards)
+        if verbose:
+            for query in queries:
+                click.echo(f'{query["partition_key"]}: {query["range_from"]}..{query["range_to"]}')
+        cost = estimate_cost(queries, items_per_hour)
+        click.echo(f'DRY RUN: Read ~{cost["items"]} news items in {cost["queries"]} queries '
+                   f'(~{cost["read_units"]:g} read units) into snapshot "{path}"')
+        return
+    news_items = get_news_items(table, created_at_from, created_at_to, shards=shards)
+    append_to_snapshot(news_items, path)
+    if not quiet:
+        click.echo(f'Appended {len(news_items)} news items to snapshot "{path}"')
+
+
+@get.command(name='snapshot')
+@std_options
+@click.option('--hours', default=None, type=int)
+@click.option('--top', default=10, type=int)
+@click.argument('path')
+def get_snapshot(path: str, hours: int, top: int,
+                 dry_run: bool, verbose: bool, quiet: bool):
+    with Snapshot(path) as snapshot:
+        if hours is None:
+            rows = range(len(snapshot))
+        else:
+            created_at_to = datetime.now()
+            rows = snapshot.rows_between(created_at_to - timedelta(hours=hours),
+                                         created_at_to)
+        click.echo(f'{len(rows)} of {len(snapshot)} news items, '
+                   f'{len(snapshot.keywords)} keywords')
+        for keyword, count in snapshot.keyword_counts(rows).most_common(top):
+            click.echo(f'{keyword}={count}')
+
+
+@create.command(name='search-index')
+@std_options
+@click.option('--table', default='rumor-production-news-items')
+@click.option('--export', 'exports', multiple=True, type=click.Path(exists=True, dir_okay=False))
+@click.argument('path')
+def create_search_index(path: str, table: str, exports: List[str],
+                        dry_run: bool, verbose: bool, quiet: bool):
+    source = f'{len(exports)} export file(s)' if exports else f'"{table}"'
+    if dry_run:
+        click.echo(f'DRY RUN: Rebuild search index "{path}" from {source}')
+        return
+    count = rebuild_search_index_from_table(path, table, export_paths=list(exports))
+    if not quiet:
+        click.echo(f'Indexed {count} news items from {source} in "{path}"')
+
+
+@get.command(name='trending')
+@std_options
+@click.option('--table', default='rumor-production-trends')
+@click.option('--days', default=1, type=click.IntRange(min=1))
+@click.option('--baseline-days', default=7, type=click.IntRange(min=0))
+@click.option('--top', default=10, type=int)
+def get_trending_keywords(table: str, days: int, baseline_days: int, top: int,
+                          dry_run: bool, verbose: bool, quiet: bool):
+    for row in get_trending(table, days=days, baseline_days=baseline_days, top=top):
+        if verbose:
+            click.echo(f'{row["keyword"]}={row["rise"]:.2f} mentions={row["mentions"]:g} '
+                       f'score={row["score"]:g} baseline={row["baseline_mentions"]:g}')
+        else:
+            click.echo(f'{row["keyword"]}={row["rise"]:.2f}')
+
+
+@migrate.command(name='shards')
+@std_options
+@click.option('--table', default='rumor-production-news-items')
+@click.option('--workers', default=4, type=int)
+@click.argument('shards', type=click.IntRange(min=1))
+def migrate_shards(shards: int, table: str, workers: int,
+                   dry_run: bool, verbose: bool, quiet: bool):
+    migrated = migrate_news_item_shards(table, shards, max_workers=workers, dry_run=dry_run)
+    if dry_run:
+        click.echo(f'DRY RUN: Move {migrated} news items in "{table}" to {shards} shard(s)')
+    elif not quiet:
+        click.echo(f'Moved {migrated} news items in "{table}" to {shards} shard(s)')
+
+
+@cli.command(name='search')
+@click.option('--index', default='rumor-search.db')
+@click.option('--since', default=None, type=click.DateTime(formats=['%Y-%m-%d']))
+@click.option('--min-score', default=0, type=int)
+@click.option('--limit', default=20, type=click.IntRange(min=1))
+@click.argument('query')
+def search(query: str, index: str, since: datetime, min_score: int, limit: int):
+    for news_item in search_news_items(index, query, since=since, min_score=min_score,
+                                       limit=limit):
+        click.echo(f'{news_item["created_at_date"]}\t{news_item["score"]}\t'
+                   f'{news_item["title"]}\t{news_item["url"]}')
+
+
+@cli.command(name='worker')
+@click.option('--workers', '-n', default=os.cpu_count() or 1, type=click.IntRange(min=1))
+@click.option('--prefetch', default=1, type=click.IntRange(min=1))
+@click.option('--wait', default=20, type=click.IntRange(min=0, max=20))
+@click.option('--batch-size', default=10, type=click.IntRange(min=1, max=10))
+@click.option('--visibility-timeout', default=120, type=click.IntRange(min=1))
+@click.option('--concurrency', default=None, type=int)
+@click.option('--duration', default=None, type=float)
+@click.argument('stage', type=click.Choice(WORKER_STAGES))
+def worker(stage: str, workers: int, prefetch: int, wait: int, batch_size: int,
+           visibility_timeout: int, concurrency: int, duration: float):
+    config = load_config(stage, prefetch=prefetch, wait_seconds=wait, batch_size=batch_size,
+                         visibility_timeout=visibility_timeout, concurrency=concurrency)
+    click.echo(f'Starting {workers} {stage} worker(s) on "{config["queue_name"]}"')
+    counters = supervise(config, workers, duration=duration)
+    click.echo(f'Processed {counters["records"]} messages in {counters["batches"]} batches, '
+               f'{counters["failed"]} failed')
+
+
+@cli.command(name='evaluate')
+@std_options
+@click.option('--table', default='rumor-production-news-items')
+@click.option('--report-table', default='rumor-production-evaluation-reports')
+@click.option('--preference-table', default='rumor-production-preferences')
+@click.option('--max-age-hours', default=48, type=int)
+@click.option('--period-hours', default=72, type=int)
+@click.option('--threshold', default=1.5, type=float)
+@click.option('--limit', default=10, type=int)
+@click.option('--shards', default=1, type=int)
+@click.option('--snapshot', default=None)
+@click.option('--scoring-mode', default='exact', type=click.Choice(SCORING_MODES))
+@click.option('--idf-path', default=None)
+@click.option('--workers', '-n', default=os.cpu_count() or 1, type=click.IntRange(min=1))
+def evaluate_news_items(table: str, report_table: str, preference_table: str, max_age_hours: int,
+                        period_hours: int, threshold: float, limit: int, shards: int,
+                        snapshot: str, scoring_mode: str, idf_path: str, workers: int,
+                        dry_run: bool, verbose: bool, quiet: bool):
+    report = evaluate(news_item_table_name=table,
+                      evaluation_report_table_name=report_table,
+                      preference_table_name=preference_table,
+                      news_item_max_age_hours=max_age_hours,
+                      evaluation_period_hours=period_hours,
+                      qualification_threshold=threshold,
+                      qualification_limit=limit,
+                      snapshot_path=snapshot,
+                      shards=shards,
+                      scoring_mode=scoring_mode,
+                      idf_path=idf_path,
+                      workers=workers,
+                      dry_run=dry_run)
+    prefix = 'DRY RUN: ' if dry_run else ''
+    if not quiet:
+        for news_item in report['news_items']:
+            click.echo(f'{news_item["news_item_id"]}\t{news_item["modified_score"]}')
+        click.echo(f'{prefix}{len(report["news_items"])} qualifying news items ({workers} worker(s))')
+
+
+@cli.command(name='profile')
+@click.option('--items', default=1000, type=int)
+@click.option('--fixture', default=None, type=click.File('r'))
+@click.option('--profiler', default='sampling', type=click.Choice(PROFILERS))
+@click.option('--output', '-o', default=None)
+@click.option('--top', default=15, type=int)
+@click.argument('stage', type=click.Choice(sorted(STAGES)))
+def profile(stage: str, items: int, fixture, profiler: str, output: str, top: int):
+    news_items = load_fixture(fixture) if fixture is not None else synthetic_news_items(items)
+    results = profile_stage(stage, news_items, profiler=profiler)
+
+    click.echo(f'stage:          {stage} ({results["news_items"]} news items, {profiler})')
+    click.echo(f'wall time:      {results["wall_seconds"]:.3f}s')
+    click.echo(f'cpu time:       {results["cpu_seconds"]:.3f}s')
+    click.echo(f'peak memory:    {results["peak_bytes"] / 1024.0 / 1024.0:.2f} MiB')
+    for name, count in sorted(results['upstream_calls'].items()):
+        click.echo(f'upstream call:  {name} x{count}')
+    for where, size, count in results['allocations']:
+        click.echo(f'allocation:     {where} {size / 1024.0:.1f} KiB in {count} blocks')
+
+    if results['stats'] is not None:
+        if output is not None:
+            results['stats'].dump_stats(output)
+            click.echo(f'Wrote cProfile stats to "{output}"')
+        results['stats'].sort_stats('cumulative').print_stats(top)
+        return
+    output = output or f'{stage}.collapsed'
+    with open(output, 'w') as f:
+        write_collapsed(results['stacks'], f)
+    click.echo(f'Wrote {sum(results["stacks"].values())} samples to "{output}" '
+               f'(collapsed stacks, e.g. flamegraph.pl {output} > {stage}.svg)')
+
+
 def _get_topic_arn(topics: List[Dict[str, Any]], topic_arn_hint: str) -> str:
     for topic in topics:
         if topic_arn_hint in topic['TopicArn']:
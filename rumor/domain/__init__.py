@@ -1,5 +1,6 @@
-from .classification import classify  # noqa: F401
+from .classification import classify, classify_records  # noqa: F401
 from .discovery import discover  # noqa: F401
 from .evaluation import evaluate  # noqa: F401
-from .inspection import inspect  # noqa: F401
+from .inspection import inspect, inspect_records  # noqa: F401
+from .refresh import refresh  # noqa: F401
 from .report import send_reports  # noqa: F401
@@ -1,19 +1,39 @@
-import json
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
 from logzero import logger
 
-from rumor.upstreams.aws import delete_messages, get_messages, store_item
+from rumor.domain.enrichment import ArticleEnricher
+from rumor.domain.fingerprints import (FingerprintCache,
+                                       get_attribute_fingerprints,
+                                       get_changed_attributes, get_fingerprint,
+                                       load_fingerprints, save_fingerprints)
+from rumor.domain.freshness import trace_messages, trace_stored
+from rumor.domain.search import update_search_index
+from rumor.domain.snapshot import append_to_snapshot
+from rumor.domain.trends import TrendRecorder, flush_trends
+from rumor.upstreams.aws import delete_messages, get_messages, update_news_item
+from rumor.upstreams.packing import unpack_body
+from rumor.upstreams.sharding import shard_item
+from rumor.upstreams.tracing import get_trace_context
 
 KEYWORD_PATTERN = re.compile("[a-zA-Z-]{2,}")
 EXCLUDED_FILES_PATH = 'rumor/files/excluded_words.txt'
+NEWS_ITEM_KEY_ATTRIBUTES = ['created_at_date', 'news_item_id']
 
 
 def classify(classification_queue_name: str, batch_size: int,
              news_item_max_age_hours: int,
-             news_item_table_name: str) -> None:
+             news_item_table_name: str,
+             snapshot_path: Optional[str] = None,
+             shards: int = 1,
+             fingerprint_path: Optional[str] = None,
+             trend_table_name: Optional[str] = None,
+             enrichment_timeout: float = 0.0,
+             search_index_path: Optional[str] = None) -> None:
     if batch_size <= 0 or batch_size > 10:
         logger.warning(f'Invalid batch size: {batch_size}')
         return
@@ -23,20 +43,169 @@ def classify(classification_queue_name: str, batch_size: int,
         logger.info('Queue is empty')
         return
 
+    received_at = time.time()
+    fingerprints = load_fingerprints(fingerprint_path)
+    trends = TrendRecorder() if trend_table_name else None
+    enricher = create_enricher(enrichment_timeout)
+    stored_news_items = []
     for message in messages:
-        body = json.loads(message['Body'])
-        classified_data = classify_news_item(body)
-        normalized_data = normalize(classified_data, ttl_hours=news_item_max_age_hours*3)
-        store_item(normalized_data, news_item_table_name)
+        stored_news_items.extend(store_news_items(
+            unpack_body(message['Body']), news_item_max_age_hours, news_item_table_name,
+            get_trace_context(message), shards=shards, fingerprints=fingerprints,
+            trends=trends, enricher=enricher))
+    trace_messages('classify', messages, received_at, time.time())
+    append_to_snapshot(stored_news_items, snapshot_path)
+    update_search_index(stored_news_items, search_index_path)
+    save_fingerprints(fingerprints, fingerprint_path)
+    if trends is not None:
+        flush_trends(trends, trend_table_name)
 
     delete_messages(messages=messages, queue_name=classification_queue_name)
 
-    logger.info('Read {} messages from queue {}'.format(len(messages),
-                                                        classification_queue_name))
+    logger.info('Read {} messages from queue {}, wrote {} news items, skipped {} unchanged'.format(
+        len(messages), classification_queue_name, fingerprints.written, fingerprints.skipped))
+
+
+def classify_records(records: List[Dict[str, Any]],
+                     news_item_max_age_hours: int, news_item_table_name: str,
+                     max_workers: int = 10,
+                     snapshot_path: Optional[str] = None,
+                     shards: int = 1,
+                     fingerprint_path: Optional[str] = None,
+                     fingerprints: Optional[FingerprintCache] = None,
+                     trend_table_name: Optional[str] = None,
+                     enrichment_timeout: float = 0.0,
+                     search_index_path: Optional[str] = None) -> List[str]:
+    if fingerprints is None:
+        fingerprints = load_fingerprints(fingerprint_path)
+    written, skipped = fingerprints.written, fingerprints.skipped
+    trends = TrendRecorder() if trend_table_name else None
+    enricher = create_enricher(enrichment_timeout)
+    received_at = time.time()
+
+    def classify_record(record: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return store_news_items(unpack_body(record['body']), news_item_max_age_hours,
+                                news_item_table_name, get_trace_context(record),
+                                shards=shards, fingerprints=fingerprints, trends=trends,
+                                enricher=enricher)
+
+    failed_message_ids = []
+    stored_news_items = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [(record, executor.submit(classify_record, record))
+                   for record in records]
+        for record, future in futures:
+            try:
+                stored_news_items.extend(future.result())
+            except Exception as e:
+                logger.warning(f'Failed to classify message {record["messageId"]}: {e}')
+                failed_message_ids.append(record['messageId'])
+    trace_messages('classify', records, received_at, time.time())
+    append_to_snapshot(stored_news_items, snapshot_path)
+    update_search_index(stored_news_items, search_index_path)
+    save_fingerprints(fingerprints, fingerprint_path)
+    if trends is not None:
+        flush_trends(trends, trend_table_name)
+
+    logger.info('Classified {} records, {} failed, wrote {} news items, skipped {} unchanged'.format(
+        len(records), len(failed_message_ids), fingerprints.written - written,
+        fingerprints.skipped - skipped))
+    return failed_message_ids
+
+
+def store_news_items(news_items: List[Dict[str, Any]], news_item_max_age_hours: int,
+                     news_item_table_name: str, trace_context: Optional[Dict[str, Any]],
+                     shards: int = 1, fingerprints: Optional[FingerprintCache] = None,
+                     trends: Optional[TrendRecorder] = None,
+                     enricher: Optional[ArticleEnricher] = None) -> List[Dict[str, Any]]:
+    fingerprints = fingerprints if fingerprints is not None else FingerprintCache()
+    if enricher is not None:
+        enricher.enrich(news_items)
+    stored_news_items = []
+    first_seen = []
+    for news_item in news_items:
+        is_new = fingerprints.get(str(news_item['id'])) is None
+        stored_news_item = store_news_item(news_item, news_item_max_age_hours,
+                                           news_item_table_name, shards=shards,
+                                           fingerprints=fingerprints, trends=trends)
+        if stored_news_item is None:
+            continue
+        stored_news_items.append(stored_news_item)
+        if is_new:
+            first_seen.append(stored_news_item)
+    trace_stored('classify', first_seen, trace_context, time.time())
+    return stored_news_items
+
+
+def store_news_item(news_item: Dict[str, Any], news_item_max_age_hours: int,
+                    news_item_table_name: str, shards: int = 1,
+                    fingerprints: Optional[FingerprintCache] = None,
+                    trends: Optional[TrendRecorder] = None) -> Optional[Dict[str, Any]]:
+    classified_data = classify_news_item(news_item)
+    normalized_data = normalize(classified_data, ttl_hours=news_item_max_age_hours*3)
+    fingerprints = fingerprints if fingerprints is not None else FingerprintCache()
+
+    attribute_fingerprints = get_attribute_fingerprints(normalized_data)
+    fingerprint = get_fingerprint(attribute_fingerprints)
+    news_item_id = normalized_data['news_item_id']
+    cached = fingerprints.get(news_item_id)
+    changed_attributes = get_changed_attributes(cached, attribute_fingerprints)
+    item = shard_item(normalized_data, shards)
+    if not changed_attributes:
+        if needs_ttl_renewal(cached, normalized_data) and update_news_item(
+                item, ['ttl'], fingerprint, news_item_table_name, previous_fingerprint=fingerprint):
+            fingerprints.put(news_item_id, get_cache_entry(attribute_fingerprints, normalized_data))
+        fingerprints.count(written=False)
+        return None
+
+    written = False
+    if cached is not None:
+        written = update_news_item(
+            item, changed_attributes + ['updated_at', 'ttl'],
+            fingerprint, news_item_table_name, previous_fingerprint=get_fingerprint(cached))
+    if not written:
+        written = update_news_item(
+            item, [name for name in item if name not in NEWS_ITEM_KEY_ATTRIBUTES],
+            fingerprint, news_item_table_name)
+    fingerprints.count(written)
+    if not written:
+        fingerprints.put(news_item_id, attribute_fingerprints)
+        return None
+    fingerprints.put(news_item_id, get_cache_entry(attribute_fingerprints, normalized_data))
+    if trends is not None:
+        trends.add(normalized_data, previous_score=get_previous_score(cached, normalized_data))
+    return normalized_data
+
+
+def get_cache_entry(attribute_fingerprints: Dict[str, str],
+                    normalized_data: Dict[str, Any]) -> Dict[str, str]:
+    return dict(attribute_fingerprints, ttl=str(normalized_data['ttl']),
+                last_score=str(normalized_data['score']))
+
+
+def get_previous_score(cached: Optional[Dict[str, str]],
+                       normalized_data: Dict[str, Any]) -> Optional[float]:
+    if cached is None:
+        return None
+    return float(cached.get('last_score', normalized_data['score']))
+
+
+def needs_ttl_renewal(cached: Dict[str, str], normalized_data: Dict[str, Any]) -> bool:
+    return int(cached.get('ttl', 0)) < (normalized_data['updated_at'] + normalized_data['ttl']) // 2
+
+
+def create_enricher(enrichment_timeout: float) -> Optional[ArticleEnricher]:
+    if enrichment_timeout <= 0:
+        return None
+    return ArticleEnricher(enrichment_timeout, KEYWORD_PATTERN,
+                           set(get_excluded_words(EXCLUDED_FILES_PATH)))
 
 
 def classify_news_item(news_item: Dict[str, Any]) -> Dict[str, Any]:
-    news_item['keywords'] = extract_keywords(news_item['title'])
+    keywords = extract_keywords(news_item['title'])
+    keywords.extend(keyword for keyword in news_item.get('body_keywords', [])
+                    if keyword not in keywords)
+    news_item['keywords'] = keywords
     logger.info(news_item['keywords'])
     return news_item
 
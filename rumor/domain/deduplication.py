@@ -0,0 +1,119 @@
+import re
+import zlib
+from collections import defaultdict
+from random import Random
+from typing import Any, Dict, Iterable, List, Optional, Set
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from logzero import logger
+
+NUM_BANDS = 6
+ROWS_PER_BAND = 3
+SIMILARITY_THRESHOLD = 0.6
+MIN_TITLE_WORDS = 3
+MAX_BUCKET_SIZE = 50
+TRACKING_PARAMS = {'fbclid', 'gclid', 'mc_cid', 'mc_eid', 'ref_src'}
+TRACKING_PARAM_PREFIXES = ('utm_',)
+HOST_PREFIXES = ('www.', 'm.', 'mobile.', 'amp.')
+
+_masks = [Random(i).getrandbits(32) for i in range(NUM_BANDS * ROWS_PER_BAND)]
+_word_pattern = re.compile(r'[a-z0-9]+')
+_index_pattern = re.compile(r'/(index\.html?)?$')
+
+
+def collapse_duplicates(news_items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    parents = list(range(len(news_items)))
+
+    def find(i: int) -> int:
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    def union(i: int, j: int) -> None:
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parents[max(root_i, root_j)] = min(root_i, root_j)
+
+    by_url = {}
+    shingle_sets = []
+    buckets = defaultdict(list)
+    for i, news_item in enumerate(news_items):
+        url = canonicalize_url(news_item.get('url'))
+        if url is not None:
+            if url in by_url:
+                union(by_url[url], i)
+            else:
+                by_url[url] = i
+
+        shingles = title_shingles(news_item.get('title'))
+        shingle_sets.append(shingles)
+        if shingles:
+            for band in lsh_bands(minhash(shingles)):
+                buckets[band].append(i)
+
+    for members in buckets.values():
+        if len(members) < 2:
+            continue
+        members = members[:MAX_BUCKET_SIZE]
+        for a in range(len(members)):
+            for b in range(a + 1, len(members)):
+                i, j = members[a], members[b]
+                if find(i) != find(j) and jaccard(shingle_sets[i], shingle_sets[j]) >= SIMILARITY_THRESHOLD:
+                    union(i, j)
+
+    keep = {}
+    for i, news_item in enumerate(news_items):
+        root = find(i)
+        if root not in keep or news_item['score'] > news_items[keep[root]]['score']:
+            keep[root] = i
+
+    results = [news_items[i] for i in sorted(keep.values())]
+    if len(results) < len(news_items):
+        logger.info('Collapsed {} duplicate news item(s)'.format(len(news_items) - len(results)))
+    return results
+
+
+def canonicalize_url(url: Optional[str]) -> Optional[str]:
+    if not url:
+        return None
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or '').lower()
+    for prefix in HOST_PREFIXES:
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    if not host:
+        return None
+    path = _index_pattern.sub('', parts.path)
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS and not k.lower().startswith(TRACKING_PARAM_PREFIXES)
+    )
+    if not path and not query:
+        return None
+    canonical = host + path
+    if query:
+        canonical = f'{canonical}?{urlencode(query)}'
+    return canonical
+
+
+def title_shingles(title: Optional[str]) -> Set[int]:
+    words = _word_pattern.findall((title or '').lower())
+    if len(words) < MIN_TITLE_WORDS:
+        return set()
+    return {zlib.crc32(f'{a} {b}'.encode('utf-8')) for a, b in zip(words, words[1:])}
+
+
+def minhash(shingles: Iterable[int]) -> List[int]:
+    shingles = list(shingles)
+    return [min(map(mask.__xor__, shingles)) for mask in _masks]
+
+
+def lsh_bands(signature: List[int]) -> List[tuple]:
+    return [(band, *signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND])
+            for band in range(NUM_BANDS)]
+
+
+def jaccard(a: Set[int], b: Set[int]) -> float:
+    return len(a & b) / float(max(len(a | b), 1))
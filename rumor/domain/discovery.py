@@ -2,6 +2,7 @@ from logzero import logger
 
 from rumor.upstreams.aws import send_messages
 from rumor.upstreams.hacker_news import get_news_items
+from rumor.upstreams.tracing import get_trace_attributes, new_trace_context
 
 
 def discover(target_api_url: str, limit: int, queue_name: str) -> None:
@@ -11,5 +12,8 @@ def discover(target_api_url: str, limit: int, queue_name: str) -> None:
             'news_item_id': f'{r}'
         } for r in response_data[:limit]
     ]
-    send_messages(messages, queue_name)
-    logger.info('Sent {} messages on queue {}'.format(len(messages), queue_name))
+    trace_context = new_trace_context()
+    send_messages(messages, queue_name, pack=True,
+                  message_attributes=get_trace_attributes(trace_context))
+    logger.info('Sent {} messages on queue {} with trace {}'.format(
+        len(messages), queue_name, trace_context['trace_id']))
@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional, Pattern, Set
+
+from logzero import logger
+
+from rumor.exceptions import UpstreamError
+from rumor.upstreams.articles import stream_article
+
+MAX_ARTICLE_BYTES = 256 * 1024
+MAX_BODY_KEYWORDS = 5
+MAX_DISTINCT_WORDS = 5000
+MIN_KEYWORD_COUNT = 2
+MAX_CACHE_ENTRIES = 2048
+SKIPPED_TAGS = {'script', 'style', 'noscript', 'template', 'svg', 'head',
+                'nav', 'header', 'footer', 'aside', 'form'}
+
+_executor = ThreadPoolExecutor(max_workers=16)
+
+
+class ArticleTextParser(HTMLParser):
+    def __init__(self, keyword_pattern: Pattern, excluded_words: Set[str],
+                 max_words: int = MAX_DISTINCT_WORDS) -> None:
+        super().__init__(convert_charrefs=True)
+        self.keyword_pattern = keyword_pattern
+        self.excluded_words = excluded_words
+        self.max_words = max_words
+        self.counts = Counter()
+        self._skip_depth = 0
+        self._tail = ''
+
+    def handle_starttag(self, tag: str, attrs: List[Any]) -> None:
+        self._flush_tail()
+        if tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+
+    def handle_endtag(self, tag: str) -> None:
+        self._flush_tail()
+        if tag in SKIPPED_TAGS and self._skip_depth > 0:
+            self._skip_depth -= 1
+
+    def handle_data(self, data: str) -> None:
+        if self._skip_depth > 0:
+            return
+        text = self._tail + data
+        self._tail = ''
+        for match in self.keyword_pattern.finditer(text):
+            if match.end() == len(text):
+                self._tail = match.group()
+            else:
+                self._count(match.group())
+
+    def close(self) -> None:
+        super().close()
+        self._flush_tail()
+
+    def _flush_tail(self) -> None:
+        if self._tail:
+            self._count(self._tail)
+        self._tail = ''
+
+    def _count(self, word: str) -> None:
+        word = word.lower()
+        if word in self.excluded_words:
+            return
+        if word in self.counts or len(self.counts) < self.max_words:
+            self.counts[word] += 1
+
+    def feed_chunk(self, chunk: str) -> bool:
+        self.feed(chunk)
+        return True
+
+    def keywords(self, max_keywords: int) -> List[str]:
+        return [word for word, count in self.counts.most_common(max_keywords)
+                if count >= MIN_KEYWORD_COUNT]
+
+
+class ArticleCache:
+    def __init__(self, max_entries: int = MAX_CACHE_ENTRIES) -> None:
+        self.entries = OrderedDict()
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> Optional[List[str]]:
+        with self._lock:
+            if url not in self.entries:
+                return None
+            self.entries.move_to_end(url)
+            return self.entries[url]
+
+    def put(self, url: str, keywords: List[str]) -> None:
+        with self._lock:
+            self.entries[url] = keywords
+            self.entries.move_to_end(url)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+_cache = ArticleCache()
+
+
+class ArticleEnricher:
+    def __init__(self, timeout: float, keyword_pattern: Pattern, excluded_words: Set[str],
+                 max_bytes: int = MAX_ARTICLE_BYTES,
+                 max_keywords: int = MAX_BODY_KEYWORDS,
+                 cache: Optional[ArticleCache] = None) -> None:
+        self.deadline = time.monotonic() + timeout
+        self.keyword_pattern = keyword_pattern
+        self.excluded_words = excluded_words
+        self.max_bytes = max_bytes
+        self.max_keywords = max_keywords
+        self.cache = cache if cache is not None else _cache
+
+    def enrich(self, news_items: List[Dict[str, Any]]) -> None:
+        futures = [(news_item, _executor.submit(self.get_body_keywords, news_item['url']))
+                   for news_item in news_items if news_item.get('url')]
+        for news_item, future in futures:
+            news_item['body_keywords'] = future.result()
+
+    def get_body_keywords(self, url: str) -> List[str]:
+        keywords = self.cache.get(url)
+        if keywords is not None:
+            return keywords
+        parser = ArticleTextParser(self.keyword_pattern, self.excluded_words)
+        try:
+            stream_article(url, self.max_bytes, self.deadline, parser.feed_chunk)
+        except UpstreamError as e:
+            logger.info(f'Skipping article body for {url}: {e}')
+            return []
+        parser.close()
+        keywords = parser.keywords(self.max_keywords)
+        self.cache.put(url, keywords)
+        return keywords
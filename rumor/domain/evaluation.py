@@ -1,12 +1,30 @@
+import os
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from decimal import Decimal
+from functools import reduce
+from itertools import repeat
 from operator import itemgetter
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
 from logzero import logger
 
-from rumor.upstreams.aws import get_news_items, get_preferences, store_item
+from rumor.domain.deduplication import collapse_duplicates
+from rumor.domain.personalization import (build_profiles, evaluate_profiles,
+                                          group_profiles)
+from rumor.domain.report_references import (create_profile_items,
+                                            create_reference_report)
+from rumor.domain.similarity import (IdfStatistics, get_similarity_modifiers,
+                                     load_idf_statistics, save_idf_statistics)
+from rumor.domain.snapshot import Snapshot
+from rumor.upstreams.aws import (batch_write_items, get_news_items,
+                                 get_preferences, get_subscriber_preferences,
+                                 store_item)
+from rumor.upstreams.query_planning import plan_day_queries
+from rumor.upstreams.rate_control import set_rate_share
+
+SCORING_MODES = ('exact', 'tfidf')
 
 
 def evaluate(news_item_table_name: str,
@@ -15,21 +33,44 @@ def evaluate(news_item_table_name: str,
              news_item_max_age_hours: int = 24,
              evaluation_period_hours: int = 72,
              qualification_threshold: float = 1.5,
-             qualification_limit: int = 10) -> Dict[str, Any]:
+             qualification_limit: int = 10,
+             snapshot_path: Optional[str] = None,
+             include_report_snapshot: bool = False,
+             shards: int = 1,
+             scoring_mode: str = 'exact',
+             idf_path: Optional[str] = None,
+             workers: int = 1,
+             dry_run: bool = False) -> Dict[str, Any]:
 
+    if scoring_mode not in SCORING_MODES:
+        raise ValueError(f'Unsupported scoring mode {scoring_mode}')
     now = datetime.now()
     created_at_to = now - timedelta(hours=news_item_max_age_hours)
     created_at_from = created_at_to - timedelta(hours=evaluation_period_hours)
 
-    news_items = get_news_items(news_item_table_name, created_at_from,
-                                created_at_to)
-
     preferences = get_preferences(preference_table_name)
-    qualifying_news_items = perform_news_item_qualification(
-        news_items,
+    if snapshot_path is not None and os.path.exists(snapshot_path):
+        with Snapshot(snapshot_path) as snapshot:
+            news_items = snapshot.news_items(created_at_from, created_at_to)
+        logger.info('Read {} news items from snapshot {}'.format(len(news_items),
+                                                                 snapshot_path))
+        partial = map_news_item_chunks(news_items, preferences, scoring_mode, workers)
+    else:
+        partial = map_news_item_partitions(news_item_table_name, created_at_from,
+                                           created_at_to, shards, preferences,
+                                           scoring_mode, workers)
+    news_items = list(partial.news_items.values())
+
+    idf_statistics = load_idf_statistics(idf_path) if scoring_mode == 'tfidf' else None
+    qualifying_news_items = finalize_news_item_qualification(
+        partial,
         qualification_threshold,
         qualification_limit,
-        preferences)
+        preferences,
+        scoring_mode=scoring_mode,
+        idf_statistics=idf_statistics)
+    if idf_statistics is not None and not dry_run:
+        save_idf_statistics(idf_statistics, idf_path)
 
     evaluation_report = {
         'created_at': int(now.timestamp()),
@@ -38,13 +79,30 @@ def evaluate(news_item_table_name: str,
             'RUMOR_NEWS_ITEM_MAX_AGE_HOURS': Decimal(news_item_max_age_hours),
             'RUMOR_EVALUATION_PERIOD_HOURS': Decimal(evaluation_period_hours),
             'RUMOR_QUALIFICATION_THRESHOLD': Decimal(qualification_threshold),
-            'RUMOR_QUALIFICATION_LIMIT': Decimal(qualification_limit)
+            'RUMOR_QUALIFICATION_LIMIT': Decimal(qualification_limit),
+            'RUMOR_SCORING_MODE': scoring_mode
         },
         'version': '1'
     }
 
-    if len(qualifying_news_items) > 0:
-        logger.info('Stored report')
+    subscriber_preferences = get_subscriber_preferences(preference_table_name)
+    if len(subscriber_preferences) > 0:
+        evaluation_report.update(perform_profile_qualification(
+            news_items,
+            qualification_threshold,
+            qualification_limit,
+            subscriber_preferences))
+
+    profile_items = create_profile_items(evaluation_report)
+    evaluation_report = create_reference_report(evaluation_report,
+                                                include_snapshot=include_report_snapshot)
+    if dry_run:
+        logger.info('Skipped storing report (dry run)')
+    elif len(qualifying_news_items) > 0 or len(profile_items) > 0:
+        if len(profile_items) > 0:
+            batch_write_items([{'PutRequest': {'Item': item}} for item in profile_items],
+                              evaluation_report_table_name)
+        logger.info('Stored report with {} profile group(s)'.format(len(profile_items)))
         store_item(item=evaluation_report, table_name=evaluation_report_table_name)
 
     return evaluation_report
@@ -53,14 +111,71 @@ def evaluate(news_item_table_name: str,
 def perform_news_item_qualification(news_items: List[Dict[str, Any]],
                                     threshold: float,
                                     limit: int,
-                                    preferences: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+                                    preferences: List[Dict[str, Any]],
+                                    scoring_mode: str = 'exact',
+                                    idf_statistics: Optional[IdfStatistics] = None
+                                    ) -> List[Dict[str, Any]]:
+    return finalize_news_item_qualification(
+        map_news_items(news_items, preferences, scoring_mode),
+        threshold, limit, preferences,
+        scoring_mode=scoring_mode, idf_statistics=idf_statistics)
+
 
-    highscore_map = create_highscore_map(news_items)
-    pruned_news_items = highscore_map.values()
+class QualificationPartial:
+    def __init__(self) -> None:
+        self.news_items = OrderedDict()
+        self.count = 0
 
-    for news_item in pruned_news_items:
-        score_modifier = get_score_modifier(news_item, preferences)
-        news_item['modified_score'] = news_item['score'] * score_modifier
+    def add(self, news_item: Dict[str, Any]) -> None:
+        self.count += 1
+        self._keep(str(news_item['news_item_id']), news_item)
+
+    def merge(self, other: 'QualificationPartial') -> 'QualificationPartial':
+        merged = QualificationPartial()
+        merged.news_items = OrderedDict(self.news_items)
+        merged.count = self.count + other.count
+        for news_item_id, news_item in other.news_items.items():
+            merged._keep(news_item_id, news_item)
+        return merged
+
+    def _keep(self, news_item_id: str, news_item: Dict[str, Any]) -> None:
+        current = self.news_items.get(news_item_id)
+        if current is None or int(news_item['score']) > current['score']:
+            self.news_items[news_item_id] = news_item
+
+
+def map_news_items(news_items: List[Dict[str, Any]],
+                   preferences: List[Dict[str, Any]],
+                   scoring_mode: str = 'exact') -> QualificationPartial:
+    partial = QualificationPartial()
+    for news_item in news_items:
+        partial.add(news_item)
+    if scoring_mode == 'exact':
+        for news_item in partial.news_items.values():
+            news_item['modified_score'] = news_item['score'] * get_score_modifier(news_item,
+                                                                                  preferences)
+    return partial
+
+
+def merge_partials(partials: List[QualificationPartial]) -> QualificationPartial:
+    return reduce(QualificationPartial.merge, partials, QualificationPartial())
+
+
+def finalize_news_item_qualification(partial: QualificationPartial,
+                                     threshold: float,
+                                     limit: int,
+                                     preferences: List[Dict[str, Any]],
+                                     scoring_mode: str = 'exact',
+                                     idf_statistics: Optional[IdfStatistics] = None
+                                     ) -> List[Dict[str, Any]]:
+
+    pruned_news_items = collapse_duplicates(list(partial.news_items.values()))
+
+    if scoring_mode != 'exact':
+        score_modifiers = get_score_modifiers(pruned_news_items, preferences,
+                                              scoring_mode, idf_statistics)
+        for news_item, score_modifier in zip(pruned_news_items, score_modifiers):
+            news_item['modified_score'] = news_item['score'] * score_modifier
 
     mean_score = calculate_mean(pruned_news_items, 'modified_score')
     score_threshold = mean_score * threshold
@@ -73,6 +188,101 @@ def perform_news_item_qualification(news_items: List[Dict[str, Any]],
     return sorted_news_items[:limit]
 
 
+def map_news_item_partition(news_item_table_name: str, created_at_from: datetime,
+                            created_at_to: datetime, shards: int,
+                            preferences: List[Dict[str, Any]],
+                            scoring_mode: str = 'exact',
+                            rate_share: float = 1.0) -> QualificationPartial:
+    set_rate_share(rate_share)
+    news_items = get_news_items(news_item_table_name, created_at_from, created_at_to,
+                                shards=shards)
+    return map_news_items(news_items, preferences, scoring_mode)
+
+
+def map_news_item_partitions(news_item_table_name: str, created_at_from: datetime,
+                             created_at_to: datetime, shards: int,
+                             preferences: List[Dict[str, Any]],
+                             scoring_mode: str = 'exact',
+                             workers: int = 1) -> QualificationPartial:
+    if workers <= 1:
+        return map_news_item_partition(news_item_table_name, created_at_from, created_at_to,
+                                       shards, preferences, scoring_mode)
+    windows = get_partition_windows(created_at_from, created_at_to)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        partials = list(executor.map(map_news_item_partition, repeat(news_item_table_name),
+                                     [window[0] for window in windows],
+                                     [window[1] for window in windows],
+                                     repeat(shards), repeat(preferences),
+                                     repeat(scoring_mode), repeat(1.0 / workers)))
+    return log_partials(merge_partials(partials), len(partials))
+
+
+def map_news_item_chunks(news_items: List[Dict[str, Any]],
+                         preferences: List[Dict[str, Any]],
+                         scoring_mode: str = 'exact',
+                         workers: int = 1) -> QualificationPartial:
+    if workers <= 1:
+        return map_news_items(news_items, preferences, scoring_mode)
+    chunks = split_news_items(news_items, workers)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        partials = list(executor.map(map_news_items, chunks, repeat(preferences),
+                                     repeat(scoring_mode)))
+    return log_partials(merge_partials(partials), len(partials))
+
+
+def get_partition_windows(created_at_from: datetime,
+                          created_at_to: datetime) -> List[Tuple[datetime, datetime]]:
+    return [(datetime.fromtimestamp(query['range_from']), datetime.fromtimestamp(query['range_to']))
+            for query in plan_day_queries(created_at_from, created_at_to)]
+
+
+def split_news_items(news_items: List[Dict[str, Any]],
+                     partitions: int) -> List[List[Dict[str, Any]]]:
+    size = max(1, -(-len(news_items) // max(partitions, 1)))
+    return [news_items[i:i + size] for i in range(0, len(news_items), size)]
+
+
+def log_partials(partial: QualificationPartial, partitions: int) -> QualificationPartial:
+    logger.info('Merged {} partition(s) with {} news items into {} distinct news items'.format(
+        partitions, partial.count, len(partial.news_items)))
+    return partial
+
+
+def perform_profile_qualification(news_items: List[Dict[str, Any]],
+                                  threshold: float,
+                                  limit: int,
+                                  subscriber_preferences: List[Dict[str, Any]]
+                                  ) -> Dict[str, Any]:
+    pruned_news_items = collapse_duplicates(list(create_highscore_map(news_items).values()))
+    groups = group_profiles(build_profiles(subscriber_preferences))
+    profiles = evaluate_profiles(pruned_news_items, groups, threshold, limit)
+    news_items_by_id = {str(news_item['news_item_id']): news_item
+                        for news_item in pruned_news_items}
+    referenced_ids = {ref['news_item_id'] for refs in profiles.values() for ref in refs}
+    profile_news_items = {
+        news_item_id: {k: v for k, v in news_items_by_id[news_item_id].items()
+                       if k != 'modified_score'}
+        for news_item_id in referenced_ids
+    }
+    return {
+        'profiles': profiles,
+        'profile_news_items': profile_news_items
+    }
+
+
+def get_score_modifiers(news_items: List[Dict[str, Any]],
+                        preferences: List[Dict[str, Any]],
+                        scoring_mode: str = 'exact',
+                        idf_statistics: Optional[IdfStatistics] = None) -> List[Any]:
+    if scoring_mode == 'exact':
+        return [get_score_modifier(news_item, preferences) for news_item in news_items]
+    if scoring_mode == 'tfidf':
+        idf_statistics = idf_statistics if idf_statistics is not None else IdfStatistics()
+        return [Decimal(str(round(modifier, 6))) for modifier in
+                get_similarity_modifiers(news_items, preferences, idf_statistics)]
+    raise ValueError(f'Unsupported scoring mode {scoring_mode}')
+
+
 def get_score_modifier(news_item: Dict[str, Any], preferences: Dict[str, Any]) -> int:
     score_modifier = 1
     for preference in preferences:
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from logzero import logger
+
+FINGERPRINT_ATTRIBUTES = ['score', 'title', 'url', 'keywords']
+MAX_ENTRIES = 4096
+
+
+class FingerprintCache:
+    def __init__(self, entries: Optional[Dict[str, Dict[str, str]]] = None,
+                 max_entries: int = MAX_ENTRIES) -> None:
+        self.entries = OrderedDict(entries or {})
+        self.max_entries = max_entries
+        self.written = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def get(self, news_item_id: str) -> Optional[Dict[str, str]]:
+        with self._lock:
+            return self.entries.get(news_item_id)
+
+    def put(self, news_item_id: str, fingerprints: Dict[str, str]) -> None:
+        with self._lock:
+            self.entries[news_item_id] = fingerprints
+            self.entries.move_to_end(news_item_id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def count(self, written: bool) -> None:
+        with self._lock:
+            if written:
+                self.written += 1
+            else:
+                self.skipped += 1
+
+
+def get_attribute_fingerprints(item: Dict[str, Any]) -> Dict[str, str]:
+    return {name: _digest(_canonical(name, item.get(name))) for name in FINGERPRINT_ATTRIBUTES}
+
+
+def get_fingerprint(attribute_fingerprints: Dict[str, str]) -> str:
+    return _digest(';'.join(attribute_fingerprints[name] for name in FINGERPRINT_ATTRIBUTES))
+
+
+def get_changed_attributes(cached: Optional[Dict[str, str]],
+                           attribute_fingerprints: Dict[str, str]) -> List[str]:
+    return [name for name in FINGERPRINT_ATTRIBUTES
+            if cached is None or cached.get(name) != attribute_fingerprints[name]]
+
+
+def load_fingerprints(path: Optional[str]) -> FingerprintCache:
+    if path is None or not os.path.exists(path):
+        return FingerprintCache()
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        return FingerprintCache(data['entries'])
+    except (ValueError, KeyError) as e:
+        logger.warning(f'Ignoring unreadable fingerprint file {path}: {e}')
+        return FingerprintCache()
+
+
+def save_fingerprints(cache: FingerprintCache, path: Optional[str]) -> None:
+    if path is None:
+        return
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'entries': cache.entries}, f)
+    os.replace(tmp_path, path)
+
+
+def _canonical(name: str, value: Any) -> str:
+    if name == 'keywords':
+        value = sorted(value or [])
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha1(value.encode('utf-8')).hexdigest()[:16]
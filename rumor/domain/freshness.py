@@ -0,0 +1,30 @@
+from typing import Any, Dict, List, Optional
+
+from rumor.upstreams.metrics import record_metric
+from rumor.upstreams.tracing import (add_hop, get_sent_at, get_trace_context,
+                                     merge_trace_contexts)
+
+
+def trace_messages(stage: str, messages: List[Dict[str, Any]], received_at: float,
+                   processed_at: float) -> Optional[Dict[str, Any]]:
+    processing = processed_at - received_at
+    contexts = []
+    for message in messages:
+        sent_at = get_sent_at(message)
+        queue_wait = received_at - sent_at if sent_at is not None else None
+        record_metric(stage, 'QueueWait', queue_wait)
+        record_metric(stage, 'Processing', processing)
+        context = get_trace_context(message)
+        if context is not None:
+            record_metric(stage, 'PipelineLatency', processed_at - context['discovered_at'])
+            contexts.append(add_hop(context, stage, queue_wait, processing))
+    return merge_trace_contexts(contexts)
+
+
+def trace_stored(stage: str, news_items: List[Dict[str, Any]],
+                 context: Optional[Dict[str, Any]], stored_at: float) -> None:
+    for news_item in news_items:
+        record_metric(stage, 'Freshness', stored_at - news_item['created_at'])
+        if context is not None:
+            record_metric(stage, 'DiscoveryDelay',
+                          context['discovered_at'] - news_item['created_at'])
@@ -1,15 +1,25 @@
-import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
 
 from logzero import logger
 
+from rumor.domain.freshness import trace_messages
+from rumor.domain.watermark import (WatermarkIndex, load_watermarks,
+                                    save_watermarks)
 from rumor.upstreams.aws import delete_messages, get_messages, send_messages
-from rumor.upstreams.hacker_news import news_item_source_request
+from rumor.upstreams.hacker_news import (get_latency_stats,
+                                         news_item_source_request,
+                                         set_caller_concurrency)
+from rumor.upstreams.packing import unpack_body
+from rumor.upstreams.tracing import get_trace_attributes
 
 
 def inspect(collection_queue_name: str,
             classification_queue_name: str, batch_size: int,
-            news_item_max_age_hours: int, target_api_url: str):
+            news_item_max_age_hours: int, target_api_url: str,
+            watermark_path: Optional[str] = None):
 
     if batch_size <= 0 or batch_size > 10:
         logger.warning(f'Invalid batch size: {batch_size}')
@@ -20,23 +30,21 @@ def inspect(collection_queue_name: str,
         logger.info('Queue is empty')
         return
 
+    received_at = time.time()
+    watermarks = load_watermarks(watermark_path)
     classification_messages = []
     for message in messages:
-        data = json.loads(message['Body'])
-        news_item_data = news_item_source_request(data['news_item_id'], target_api_url)
-
-        if 'url' not in news_item_data:
-            continue
-
-        created_at_before_threshold = (
-            datetime.now() - timedelta(hours=news_item_max_age_hours)
-        ).timestamp()
-        if news_item_data['time'] <= created_at_before_threshold:
-            continue
-
-        classification_messages.append(news_item_data)
+        for data in unpack_body(message['Body']):
+            news_item_data = inspect_news_item(data, news_item_max_age_hours,
+                                               target_api_url, watermarks)
+            if news_item_data is not None:
+                classification_messages.append(news_item_data)
 
     delete_messages(messages=messages, queue_name=collection_queue_name)
+    save_watermarks(watermarks, watermark_path)
+    logger.info('Watermark prefilter saved {} fetches'.format(watermarks.skipped))
+    logger.info('Hacker News latency: {}'.format(get_latency_stats()))
+    trace_context = trace_messages('inspect', messages, received_at, time.time())
 
     if len(classification_messages) == 0:
         logger.info('No messages to send')
@@ -44,9 +52,89 @@ def inspect(collection_queue_name: str,
 
     send_messages(messages=classification_messages,
                   queue_name=classification_queue_name,
-                  batch_size=batch_size)
+                  batch_size=batch_size,
+                  pack=True,
+                  compress=True,
+                  message_attributes=get_trace_attributes(trace_context))
 
     logger.info('Read {} messages from queue {}'.format(len(messages),
                                                         collection_queue_name))
     logger.info('Sent {} messages on queue {}'.format(len(classification_messages),
                                                       classification_queue_name))
+
+
+def inspect_records(records: List[Dict[str, Any]],
+                    classification_queue_name: str,
+                    news_item_max_age_hours: int, target_api_url: str,
+                    max_workers: int = 10,
+                    watermark_path: Optional[str] = None,
+                    watermarks: Optional[WatermarkIndex] = None) -> List[str]:
+    received_at = time.time()
+    set_caller_concurrency(max_workers)
+    if watermarks is None:
+        watermarks = load_watermarks(watermark_path)
+    classification_messages = []
+    failed_message_ids = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = []
+        for record in records:
+            try:
+                items = unpack_body(record['body'])
+            except ValueError as e:
+                logger.warning(f'Failed to decode message {record["messageId"]}: {e}')
+                failed_message_ids.append(record['messageId'])
+                continue
+            futures.append((record, [
+                executor.submit(inspect_news_item, data, news_item_max_age_hours,
+                                target_api_url, watermarks)
+                for data in items
+            ]))
+        for record, record_futures in futures:
+            try:
+                results = [future.result() for future in record_futures]
+            except Exception as e:
+                logger.warning(f'Failed to inspect message {record["messageId"]}: {e}')
+                failed_message_ids.append(record['messageId'])
+                continue
+            classification_messages.extend(r for r in results if r is not None)
+
+    save_watermarks(watermarks, watermark_path)
+    logger.info('Watermark prefilter saved {} fetches'.format(watermarks.skipped))
+    logger.info('Hacker News latency: {}'.format(get_latency_stats()))
+    trace_context = trace_messages('inspect', records, received_at, time.time())
+    if len(classification_messages) > 0:
+        send_messages(messages=classification_messages,
+                      queue_name=classification_queue_name,
+                      pack=True,
+                      compress=True,
+                      message_attributes=get_trace_attributes(trace_context))
+
+    logger.info('Inspected {} records, {} failed'.format(len(records),
+                                                         len(failed_message_ids)))
+    logger.info('Sent {} messages on queue {}'.format(len(classification_messages),
+                                                      classification_queue_name))
+    return failed_message_ids
+
+
+def inspect_news_item(data: Dict[str, Any], news_item_max_age_hours: int,
+                      target_api_url: str,
+                      watermarks: Optional[WatermarkIndex] = None
+                      ) -> Optional[Dict[str, Any]]:
+    created_at_before_threshold = (
+        datetime.now() - timedelta(hours=news_item_max_age_hours)
+    ).timestamp()
+    if watermarks is not None and watermarks.skip(data['news_item_id'],
+                                                  created_at_before_threshold):
+        return None
+
+    news_item_data = news_item_source_request(data['news_item_id'], target_api_url)
+    if watermarks is not None and 'time' in news_item_data:
+        watermarks.observe(data['news_item_id'], news_item_data['time'])
+
+    if 'url' not in news_item_data:
+        return None
+
+    if news_item_data['time'] <= created_at_before_threshold:
+        return None
+
+    return news_item_data
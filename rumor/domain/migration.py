@@ -0,0 +1,36 @@
+from typing import Any, Dict, List
+
+from logzero import logger
+
+from rumor.upstreams.aws import batch_write_items, scan_items
+from rumor.upstreams.sharding import PARTITION_KEY, shard_item
+
+
+def migrate_news_item_shards(news_item_table_name: str, shards: int,
+                             max_workers: int = 4, dry_run: bool = False) -> int:
+    migrated = 0
+    for page in scan_items(news_item_table_name):
+        moves = get_moves(page, shards)
+        if moves and not dry_run:
+            batch_write_items([{'PutRequest': {'Item': target}} for _, target in moves],
+                              news_item_table_name, max_workers=max_workers)
+            batch_write_items([{'DeleteRequest': {'Key': get_key(source)}} for source, _ in moves],
+                              news_item_table_name, max_workers=max_workers)
+        migrated += len(moves)
+
+    logger.info('Migrated {} news items in {} to {} shard(s)'.format(
+        migrated, news_item_table_name, shards))
+    return migrated
+
+
+def get_moves(items: List[Dict[str, Any]], shards: int) -> List[tuple]:
+    moves = []
+    for item in items:
+        target = shard_item(item, shards)
+        if target[PARTITION_KEY] != item[PARTITION_KEY]:
+            moves.append((item, target))
+    return moves
+
+
+def get_key(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {PARTITION_KEY: item[PARTITION_KEY], 'news_item_id': item['news_item_id']}
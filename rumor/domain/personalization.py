@@ -0,0 +1,106 @@
+import hashlib
+import heapq
+from collections import defaultdict
+from decimal import Decimal
+from typing import Any, Dict, List, Tuple
+
+from logzero import logger
+
+ProfileGroups = Dict[str, Tuple[Dict[str, Any], List[str]]]
+
+
+def build_profiles(subscriber_preferences: List[Dict[str, Any]]
+                   ) -> Dict[str, Dict[str, Any]]:
+    profiles = defaultdict(dict)
+    for preference in subscriber_preferences:
+        subscriber = preference['subscriber']
+        profiles[subscriber][preference['keyword']] = preference['preference_weight']
+    return dict(profiles)
+
+
+def profile_id(profile: Dict[str, Any]) -> str:
+    canonical = ';'.join(f'{k}={Decimal(str(w)).normalize()}'
+                         for k, w in sorted(profile.items()))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:12]
+
+
+def group_profiles(profiles: Dict[str, Dict[str, Any]]) -> ProfileGroups:
+    groups = {}
+    for subscriber, profile in sorted(profiles.items()):
+        pid = profile_id(profile)
+        if pid not in groups:
+            groups[pid] = (profile, [])
+        groups[pid][1].append(subscriber)
+    return groups
+
+
+def evaluate_profiles(news_items: List[Dict[str, Any]], groups: ProfileGroups,
+                      threshold: float, limit: int
+                      ) -> Dict[str, List[Dict[str, Any]]]:
+    keywords = {keyword for profile, _ in groups.values() for keyword in profile}
+    scores = [float(news_item['score']) for news_item in news_items]
+
+    postings = defaultdict(list)
+    for i, news_item in enumerate(news_items):
+        for keyword in set(news_item.get('keywords', [])):
+            if keyword in keywords:
+                postings[keyword].append(i)
+    by_score = lambda i: (-scores[i], i)  # noqa: E731
+    ranked_postings = {k: sorted(p, key=by_score) for k, p in postings.items()}
+    posting_sets = {k: frozenset(p) for k, p in postings.items()}
+    posting_sums = {k: sum(scores[i] for i in p) for k, p in postings.items()}
+
+    news_item_ids = [str(news_item['news_item_id']) for news_item in news_items]
+    base_total = sum(scores)
+    base_ranked = sorted(range(len(news_items)), key=by_score)
+    count = max(len(news_items), 1)
+
+    results = {}
+    for pid, (profile, _) in groups.items():
+        matches = [(k, float(w)) for k, w in profile.items() if k in posting_sets]
+        total = base_total + sum((w - 1.0) * posting_sums[k] for k, w in matches)
+
+        multi = set()
+        for a in range(len(matches)):
+            for b in range(a + 1, len(matches)):
+                multi |= posting_sets[matches[a][0]] & posting_sets[matches[b][0]]
+
+        candidates = {}
+        for i in multi:
+            modifier = 1.0
+            for k, w in matches:
+                if i in posting_sets[k]:
+                    modifier *= w
+                    total -= scores[i] * (w - 1.0)
+            candidates[i] = scores[i] * modifier
+            total += candidates[i] - scores[i]
+        for k, w in matches:
+            taken = 0
+            for i in ranked_postings[k]:
+                if taken >= limit:
+                    break
+                if i not in multi:
+                    candidates[i] = scores[i] * w
+                    taken += 1
+        touched = frozenset().union(*[posting_sets[k] for k, _ in matches])
+        taken = 0
+        for i in base_ranked:
+            if taken >= limit:
+                break
+            if i not in touched:
+                candidates[i] = scores[i]
+                taken += 1
+
+        score_threshold = total / count * threshold
+        ranked = heapq.nsmallest(limit, [(-m, i) for i, m in candidates.items()])
+        results[pid] = [
+            {
+                'news_item_id': news_item_ids[i],
+                'modified_score': Decimal(str(round(-negative_score, 6)))
+            }
+            for negative_score, i in ranked if -negative_score >= score_threshold
+        ]
+
+    logger.info('Evaluated {} profile(s) over {} news items'.format(len(groups),
+                                                                    len(news_items)))
+    return results
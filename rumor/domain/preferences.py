@@ -0,0 +1,82 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, List, Optional, TextIO
+
+from logzero import logger
+
+from rumor.upstreams.aws import (delete_preferences, get_preferences,
+                                 store_preferences)
+
+FORMATS = ['csv', 'json']
+
+
+def sync_keywords(weights: Dict[str, Decimal], preference_table_name: str,
+                  prune: bool = False, dry_run: bool = False,
+                  max_workers: int = 4) -> Dict[str, List[str]]:
+    current = {p['preference_key']: p['preference_weight']
+               for p in get_preferences(preference_table_name)}
+    changes = diff_keywords(current, weights, prune)
+    if not dry_run:
+        upserts = {k: weights[k] for k in changes['created'] + changes['updated']}
+        store_preferences(upserts, preference_table_name, max_workers=max_workers)
+        delete_preferences(changes['deleted'], preference_table_name,
+                           max_workers=max_workers)
+    logger.info('Synced keywords: {}'.format(
+        ', '.join(f'{len(v)} {k}' for k, v in changes.items())))
+    return changes
+
+
+def diff_keywords(current: Dict[str, Decimal], desired: Dict[str, Decimal],
+                  prune: bool = False) -> Dict[str, List[str]]:
+    changes = {'created': [], 'updated': [], 'deleted': [], 'unchanged': []}
+    for keyword, weight in sorted(desired.items()):
+        if keyword not in current:
+            changes['created'].append(keyword)
+        elif Decimal(current[keyword]) != weight:
+            changes['updated'].append(keyword)
+        else:
+            changes['unchanged'].append(keyword)
+    if prune:
+        changes['deleted'] = sorted(set(current) - set(desired))
+    return changes
+
+
+def read_keywords(f: TextIO, fmt: str) -> Dict[str, Decimal]:
+    if fmt == 'json':
+        data = json.load(f)
+        rows = data.items() if isinstance(data, dict) else (
+            (row['keyword'], row['weight']) for row in data)
+    else:
+        rows = (row for row in csv.reader(f) if row and not row[0].startswith('#'))
+    weights = {}
+    for keyword, weight in rows:
+        keyword = keyword.strip().lower()
+        if keyword == 'keyword':
+            continue
+        weights[keyword] = parse_weight(keyword, weight)
+    return weights
+
+
+def write_keywords(preferences: List[Dict[str, Any]], f: TextIO, fmt: str) -> None:
+    rows = sorted((p['preference_key'], str(p['preference_weight'])) for p in preferences)
+    if fmt == 'json':
+        json.dump([{'keyword': k, 'weight': w} for k, w in rows], f, indent=2)
+        f.write('\n')
+        return
+    writer = csv.writer(f, lineterminator='\n')
+    writer.writerow(['keyword', 'weight'])
+    writer.writerows(rows)
+
+
+def parse_weight(keyword: str, weight: Any) -> Decimal:
+    try:
+        return Decimal(str(weight).strip())
+    except InvalidOperation:
+        raise ValueError(f'Invalid weight for "{keyword}": {weight}')
+
+
+def guess_format(path: str, fmt: Optional[str] = None) -> str:
+    if fmt is not None:
+        return fmt
+    return 'json' if path.lower().endswith('.json') else 'csv'
@@ -0,0 +1,86 @@
+import heapq
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from logzero import logger
+
+from rumor.domain.classification import (NEWS_ITEM_KEY_ATTRIBUTES,
+                                         classify_news_item, normalize)
+from rumor.domain.evaluation import calculate_mean, create_highscore_map
+from rumor.domain.fingerprints import (get_attribute_fingerprints,
+                                       get_fingerprint)
+from rumor.upstreams.aws import get_news_items, update_news_item
+from rumor.upstreams.hacker_news import news_item_source_request
+from rumor.upstreams.sharding import shard_item
+
+MIN_AGE_SECONDS = 60
+
+
+def refresh(news_item_table_name: str, target_api_url: str,
+            news_item_max_age_hours: int, evaluation_period_hours: int,
+            qualification_threshold: float, fetch_budget: int,
+            shards: int = 1) -> int:
+    if fetch_budget <= 0:
+        logger.warning(f'Invalid fetch budget: {fetch_budget}')
+        return 0
+
+    now = datetime.now()
+    created_at_from = now - timedelta(hours=news_item_max_age_hours + evaluation_period_hours)
+    news_items = list(create_highscore_map(
+        get_news_items(news_item_table_name, created_at_from, now,
+                       shards=shards)).values())
+    if len(news_items) == 0:
+        logger.info('No news items to refresh')
+        return 0
+
+    selected = schedule_refresh(news_items, now.timestamp(), fetch_budget,
+                                qualification_threshold)
+    refreshed = 0
+    for news_item in selected:
+        news_item_data = news_item_source_request(news_item['news_item_id'],
+                                                  target_api_url)
+        if not news_item_data or 'url' not in news_item_data:
+            continue
+        normalized_data = normalize(classify_news_item(news_item_data),
+                                    ttl_hours=news_item_max_age_hours*3)
+        normalized_data['previous_score'] = news_item['score']
+        normalized_data['previous_updated_at'] = news_item['updated_at']
+        normalized_data['ttl'] = news_item.get('ttl', normalized_data['ttl'])
+        item = shard_item(normalized_data, shards)
+        if update_news_item(item, [name for name in item if name not in NEWS_ITEM_KEY_ATTRIBUTES],
+                            get_fingerprint(get_attribute_fingerprints(normalized_data)),
+                            news_item_table_name,
+                            previous_fingerprint=news_item.get('fingerprint')):
+            refreshed += 1
+
+    logger.info('Refreshed {} of {} news items'.format(refreshed, len(news_items)))
+    return refreshed
+
+
+def schedule_refresh(news_items: List[Dict[str, Any]], now: float,
+                     fetch_budget: int,
+                     qualification_threshold: float) -> List[Dict[str, Any]]:
+    threshold_score = calculate_mean(news_items) * qualification_threshold
+    return heapq.nlargest(
+        fetch_budget, news_items,
+        key=lambda news_item: refresh_priority(news_item, now, threshold_score))
+
+
+def refresh_priority(news_item: Dict[str, Any], now: float,
+                     threshold_score: float) -> float:
+    velocity = score_velocity(news_item)
+    staleness = max(0.0, now - float(news_item['updated_at']))
+    expected_change = velocity * staleness
+    predicted_score = float(news_item['score']) + expected_change
+    distance = abs(predicted_score - threshold_score) / max(threshold_score, 1.0)
+    return abs(expected_change) / (1.0 + distance)
+
+
+def score_velocity(news_item: Dict[str, Any]) -> float:
+    updated_at = float(news_item['updated_at'])
+    if 'previous_score' in news_item and 'previous_updated_at' in news_item:
+        elapsed = updated_at - float(news_item['previous_updated_at'])
+        if elapsed > 0:
+            return (float(news_item['score']) - float(news_item['previous_score'])) / elapsed
+    age = max(updated_at - float(news_item['created_at']), MIN_AGE_SECONDS)
+    return float(news_item['score']) / age
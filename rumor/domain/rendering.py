@@ -0,0 +1,108 @@
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Hashable, Optional
+
+from jinja2 import Environment, FileSystemLoader, Template, select_autoescape
+from logzero import logger
+
+from rumor.upstreams.packing import MAX_MESSAGE_BYTES
+
+TEMPLATES_PATH = 'rumor/templates'
+TEXT_HEADER_FORMAT = 'Created {}\n\n'
+TEXT_NEWS_ITEM_FORMAT = '[{} + {}] {}\n{}\n\n'
+HTML_TEMPLATE = 'report.html.j2'
+RENDER_CACHE_SIZE = 256
+HTML_PROTOCOL = 'https'
+
+_environment = None
+_templates: Dict[str, Template] = {}
+_templates_lock = threading.Lock()
+_render_cache: 'OrderedDict[Hashable, Dict[str, str]]' = OrderedDict()
+_render_cache_lock = threading.Lock()
+
+
+def render_report(report: Dict[str, Any], variant: Optional[str] = None,
+                  html: bool = False) -> Dict[str, str]:
+    cache_key = (report.get('version'), report['created_at'], variant, html)
+    with _render_cache_lock:
+        if cache_key in _render_cache:
+            _render_cache.move_to_end(cache_key)
+            return _render_cache[cache_key]
+
+    text = format_text(report)
+    rendered = {
+        'text': text,
+        'message': json.dumps({'default': text})
+    }
+    if html:
+        rendered['html'] = ''.join(get_template(HTML_TEMPLATE).generate(get_attributes(report)))
+        message = json.dumps({'default': text, HTML_PROTOCOL: rendered['html']})
+        if len(message.encode('utf-8')) > MAX_MESSAGE_BYTES:
+            logger.warning(f'Report {report["created_at"]} is too large for HTML, sending text only')
+        else:
+            rendered['message'] = message
+
+    with _render_cache_lock:
+        _render_cache[cache_key] = rendered
+        while len(_render_cache) > RENDER_CACHE_SIZE:
+            _render_cache.popitem(last=False)
+    return rendered
+
+
+def render_message(report: Dict[str, Any], variant: Optional[str] = None,
+                   html: bool = False) -> str:
+    return render_report(report, variant, html)['message']
+
+
+def format_text(report: Dict[str, Any]) -> str:
+    lines = [TEXT_HEADER_FORMAT.format(format_created_at(report['created_at']))]
+    for news_item in report['news_items']:
+        modified_score = news_item.get('modified_score', news_item['score'])
+        lines.append(TEXT_NEWS_ITEM_FORMAT.format(
+            news_item['score'], modified_score - news_item['score'],
+            news_item['title'], news_item['url']))
+    return ''.join(lines)
+
+
+def format_created_at(created_at: Any) -> str:
+    return datetime.utcfromtimestamp(int(created_at)).strftime(
+        '%Y-%m-%d %H:%M:%S+00:00 (UTC)'
+    )
+
+
+def get_attributes(report: Dict[str, Any]) -> Dict[str, Any]:
+    created_at = report['created_at']
+    return {
+        'created_at': created_at,
+        'created_at_pretty': format_created_at(created_at),
+        'news_items': [get_news_item_attributes(ni) for ni in report['news_items']]
+    }
+
+
+def get_news_item_attributes(news_item: Dict[str, Any]) -> Dict[str, Any]:
+    modified_score = news_item.get('modified_score', news_item['score'])
+    return dict(news_item,
+                modified_score=modified_score,
+                score_bonus=modified_score - news_item['score'])
+
+
+def get_template(name: str) -> Template:
+    global _environment
+    with _templates_lock:
+        if name not in _templates:
+            if _environment is None:
+                _environment = Environment(
+                    loader=FileSystemLoader(TEMPLATES_PATH),
+                    autoescape=select_autoescape(['html', 'html.j2']),
+                    trim_blocks=True,
+                    keep_trailing_newline=True
+                )
+            _templates[name] = _environment.get_template(name)
+        return _templates[name]
+
+
+def reset_render_cache() -> None:
+    with _render_cache_lock:
+        _render_cache.clear()
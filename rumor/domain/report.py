@@ -1,61 +1,204 @@
+import json
+from collections import defaultdict
 from datetime import datetime, timedelta
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 from logzero import logger
 
-from rumor.upstreams.aws import get_reports, send_notification
+from rumor.domain.personalization import build_profiles, group_profiles
+from rumor.domain.rendering import render_message
+from rumor.domain.report_references import (REPORT_VERSIONS,
+                                            get_news_item_keys,
+                                            get_profile_keys, get_profiles,
+                                            resolve_report)
+from rumor.exceptions import UpstreamError
+from rumor.upstreams.aws import (get_items_by_keys, get_reports,
+                                 get_subscriber_preferences,
+                                 mark_report_delivered, publish_notifications,
+                                 resolve_topic_arn)
+from rumor.upstreams.sharding import shard_key, unshard_item
+
+SUBSCRIBERS_PER_MESSAGE = 1000
+REPORT_SUBJECT = 'Rumor Report'
+GLOBAL_DELIVERY_KEY = 'global'
 
 
 def send_reports(report_period_hours: int, evaluation_report_table_name: str,
-                 topic_arn_hint: str) -> None:
+                 topic_arn_hint: str,
+                 preference_table_name: Optional[str] = None,
+                 personalized_topic_arn_hint: Optional[str] = None,
+                 news_item_table_name: Optional[str] = None,
+                 shards: int = 1,
+                 html: bool = False) -> None:
     created_at_to = datetime.now()
     created_at_from = created_at_to - timedelta(hours=report_period_hours)
-    reports = get_reports(evaluation_report_table_name, created_at_from,
-                          created_at_to)
-    send(reports, topic_arn_hint)
+    reports = resolve_reports(get_reports(evaluation_report_table_name, created_at_from,
+                                          created_at_to, REPORT_VERSIONS),
+                              news_item_table_name, shards=shards)
+    deliveries = get_deliveries(reports, topic_arn_hint, html=html)
+    if preference_table_name is not None and personalized_topic_arn_hint is not None:
+        deliveries += get_personalized_deliveries(reports, personalized_topic_arn_hint,
+                                                  preference_table_name,
+                                                  evaluation_report_table_name,
+                                                  html=html)
+    deliver(deliveries, evaluation_report_table_name)
+
+
+def resolve_reports(reports: List[Dict[str, Any]],
+                    news_item_table_name: Optional[str],
+                    shards: int = 1) -> List[Dict[str, Any]]:
+    keys = [key for report in reports for key in get_news_item_keys(report)]
+    news_items = {}
+    if keys and news_item_table_name is None:
+        logger.warning('No news item table to resolve {} reference(s)'.format(len(keys)))
+    elif keys:
+        unique_keys = list({(k['created_at_date'], k['news_item_id']): k
+                            for k in keys}.values())
+        news_items = get_news_items_by_keys(news_item_table_name, unique_keys, shards)
+    return [resolve_report(report, news_items) for report in reports]
+
 
+def get_news_items_by_keys(news_item_table_name: str, keys: List[Dict[str, Any]],
+                           shards: int) -> Dict[str, Dict[str, Any]]:
+    news_items = {str(ni['news_item_id']): unshard_item(ni)
+                  for ni in get_items_by_keys(news_item_table_name,
+                                              [shard_key(k, shards) for k in keys])}
+    missing_keys = [k for k in keys if str(k['news_item_id']) not in news_items]
+    if shards > 1 and missing_keys:
+        news_items.update({str(ni['news_item_id']): unshard_item(ni)
+                           for ni in get_items_by_keys(news_item_table_name,
+                                                       [shard_key(k, 1) for k in missing_keys])})
+    return news_items
 
-def send(reports: List[Dict[str, Any]], topic_arn_hint: str) -> None:
+
+def get_deliveries(reports: List[Dict[str, Any]], topic_arn_hint: str,
+                   html: bool = False) -> List[Dict[str, Any]]:
+    return [
+        create_delivery(report, GLOBAL_DELIVERY_KEY, topic_arn_hint,
+                        render_message(report, GLOBAL_DELIVERY_KEY, html))
+        for report in reports
+        if len(report.get('news_items', [])) > 0
+        and not is_delivered(report, GLOBAL_DELIVERY_KEY)
+    ]
+
+
+def get_personalized_deliveries(reports: List[Dict[str, Any]], topic_arn_hint: str,
+                                preference_table_name: str,
+                                evaluation_report_table_name: str,
+                                html: bool = False) -> List[Dict[str, Any]]:
+    reports = [r for r in reports if r.get('profiles') or r.get('profile_groups')]
     if len(reports) == 0:
+        return []
+    groups = group_profiles(build_profiles(
+        get_subscriber_preferences(preference_table_name)))
+
+    deliveries = []
+    for report in reports:
+        profiles = report.get('profiles') or get_profiles(get_items_by_keys(
+            evaluation_report_table_name, get_profile_keys(report, groups)))
+        for pid, refs in profiles.items():
+            if pid not in groups or len(refs) == 0:
+                continue
+            message = None
+            subscribers = groups[pid][1]
+            for i in range(0, len(subscribers), SUBSCRIBERS_PER_MESSAGE):
+                delivery_key = f'profile#{pid}#{i // SUBSCRIBERS_PER_MESSAGE}'
+                if is_delivered(report, delivery_key):
+                    continue
+                if message is None:
+                    message = render_message(get_profile_report(report, refs),
+                                             f'profile#{pid}', html)
+                deliveries.append(create_delivery(
+                    report, delivery_key, topic_arn_hint, message,
+                    subscriber_attributes(subscribers[i:i + SUBSCRIBERS_PER_MESSAGE])))
+    return deliveries
+
+
+def create_delivery(report: Dict[str, Any], delivery_key: str,
+                    topic_arn_hint: str, message: str,
+                    message_attributes: Optional[Dict[str, Any]] = None
+                    ) -> Dict[str, Any]:
+    return {
+        'report': report,
+        'delivery_key': delivery_key,
+        'topic_arn_hint': topic_arn_hint,
+        'message': message,
+        'message_attributes': message_attributes
+    }
+
+
+def is_delivered(report: Dict[str, Any], delivery_key: str) -> bool:
+    return delivery_key in report.get('delivered', set())
+
+
+def deliver(deliveries: List[Dict[str, Any]],
+            evaluation_report_table_name: str) -> None:
+    if len(deliveries) == 0:
         logger.info('No reports to send')
         return
-    for report in reports:
-        formated_report = format_report(report)
-        send_notification(formated_report, topic_arn_hint, 'Rumor Report')
-    logger.info('Sent {} report(s)'.format(len(reports)))
-
-
-def format_report(report: Dict[str, Any]) -> str:
-    attributes = get_attributes(report)
-    head_template = 'Created {created_at_pretty}\n\n'
-    body_template = (
-        '[{score} + {score_bonus}] {title}\n'
-        '{url}\n'
-        '\n'
-    )
-    head = head_template.format(**attributes)
-    body = ''
-    for news_item in attributes['news_items']:
-        body += body_template.format(**news_item)
-
-    formated_report = head + body
-
-    return formated_report
-
-
-def get_attributes(report: Dict[str, Any]) -> Dict[str, Any]:
-    created_at = report['created_at']
-    created_at_pretty = datetime.utcfromtimestamp(created_at).strftime(
-        '%Y-%m-%d %H:%M:%S+00:00 (UTC)'
-    )
-    for ni in report['news_items']:
-        modified_score = (ni.get('modified_score')
-                          if 'modified_score' in ni else ni['score'])
-        score_bonus = modified_score - ni['score']
-        ni['score_bonus'] = score_bonus
-        ni['modified_score'] = modified_score
+
+    by_topic = defaultdict(list)
+    for i, delivery in enumerate(deliveries):
+        by_topic[delivery['topic_arn_hint']].append((str(i), delivery))
+
+    delivered = {}
+    failed = 0
+    for topic_arn_hint, topic_deliveries in by_topic.items():
+        try:
+            topic_arn = resolve_topic_arn(topic_arn_hint)
+        except UpstreamError as e:
+            logger.warning(f'Failed to resolve topic {topic_arn_hint}: {e}')
+            failed += len(topic_deliveries)
+            continue
+        entries = [create_entry(entry_id, delivery)
+                   for entry_id, delivery in topic_deliveries]
+        successful = publish_notifications(entries, topic_arn)
+        for entry_id, delivery in topic_deliveries:
+            if entry_id not in successful:
+                failed += 1
+                continue
+            report = delivery['report']
+            report_key = (report['version'], report['created_at'])
+            delivered.setdefault(report_key, (report, set()))[1].add(
+                delivery['delivery_key'])
+
+    for report, delivery_keys in delivered.values():
+        mark_report_delivered(report, delivery_keys, evaluation_report_table_name)
+
+    logger.info('Sent {} report(s)'.format(len(deliveries) - failed))
+    if failed > 0:
+        raise UpstreamError(f'Failed to send {failed} of {len(deliveries)} report(s)')
+
+
+def create_entry(entry_id: str, delivery: Dict[str, Any]) -> Dict[str, Any]:
+    entry = {
+        'Id': entry_id,
+        'Subject': REPORT_SUBJECT,
+        'Message': delivery['message'],
+        'MessageStructure': 'json'
+    }
+    if delivery['message_attributes']:
+        entry['MessageAttributes'] = delivery['message_attributes']
+    return entry
+
+
+def get_profile_report(report: Dict[str, Any],
+                       refs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        'version': report.get('version'),
+        'created_at': report['created_at'],
+        'news_items': [
+            dict(report['profile_news_items'][ref['news_item_id']],
+                 modified_score=ref['modified_score'])
+            for ref in refs if ref['news_item_id'] in report['profile_news_items']
+        ]
+    }
+
+
+def subscriber_attributes(subscribers: List[str]) -> Dict[str, Any]:
     return {
-        'created_at': created_at,
-        'created_at_pretty': created_at_pretty,
-        'news_items': report['news_items']
+        'subscriber': {
+            'DataType': 'String.Array',
+            'StringValue': json.dumps(subscribers)
+        }
     }
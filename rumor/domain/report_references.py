@@ -0,0 +1,112 @@
+import json
+import zlib
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List
+
+from boto3.dynamodb.types import Binary
+from logzero import logger
+
+REPORT_VERSION = '2'
+REPORT_VERSIONS = ['1', REPORT_VERSION]
+SNAPSHOT_ATTRIBUTES = ['news_item_id', 'title', 'url', 'score']
+PROFILE_VERSION_PREFIX = 'profile#'
+
+
+def create_reference_report(report: Dict[str, Any],
+                            include_snapshot: bool = False) -> Dict[str, Any]:
+    news_items = {str(ni['news_item_id']): ni for ni in report['news_items']}
+    news_items.update(report.get('profile_news_items', {}))
+    reference_report = {k: v for k, v in report.items()
+                        if k not in ('news_items', 'profiles', 'profile_news_items')}
+    reference_report.update({
+        'version': REPORT_VERSION,
+        'news_items': [
+            {'news_item_id': str(ni['news_item_id']), 'modified_score': ni['modified_score']}
+            for ni in report['news_items']
+        ],
+        'news_item_keys': {
+            news_item_id: get_created_at_date(news_item)
+            for news_item_id, news_item in news_items.items()
+        }
+    })
+    if 'profiles' in report:
+        reference_report['profile_groups'] = Decimal(len(report['profiles']))
+    if include_snapshot:
+        reference_report['snapshot'] = encode_snapshot(news_items.values())
+    return reference_report
+
+
+def create_profile_items(report: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [
+        {'version': f'{PROFILE_VERSION_PREFIX}{pid}', 'created_at': report['created_at'],
+         'news_items': refs}
+        for pid, refs in sorted(report.get('profiles', {}).items()) if refs
+    ]
+
+
+def get_profile_keys(report: Dict[str, Any], pids: Iterable[str]) -> List[Dict[str, Any]]:
+    return [{'version': f'{PROFILE_VERSION_PREFIX}{pid}', 'created_at': report['created_at']}
+            for pid in pids]
+
+
+def get_profiles(profile_items: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    return {item['version'][len(PROFILE_VERSION_PREFIX):]: item['news_items']
+            for item in profile_items}
+
+
+def get_created_at_date(news_item: Dict[str, Any]) -> str:
+    if 'created_at_date' in news_item:
+        return news_item['created_at_date']
+    return str(datetime.fromtimestamp(int(news_item['created_at'])).date())
+
+
+def get_news_item_keys(report: Dict[str, Any]) -> List[Dict[str, str]]:
+    if report.get('version') != REPORT_VERSION or 'snapshot' in report:
+        return []
+    return [{'created_at_date': created_at_date, 'news_item_id': news_item_id}
+            for news_item_id, created_at_date in report['news_item_keys'].items()]
+
+
+def resolve_report(report: Dict[str, Any],
+                   news_items: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    if report.get('version') != REPORT_VERSION:
+        return report
+    if 'snapshot' in report:
+        news_items = decode_snapshot(report['snapshot'])
+    missing = [k for k in report['news_item_keys'] if k not in news_items]
+    if missing:
+        logger.warning('Report {} references {} missing news item(s)'.format(
+            report['created_at'], len(missing)))
+
+    resolved = {k: v for k, v in report.items() if k not in ('snapshot', 'news_item_keys')}
+    resolved['news_items'] = [
+        dict(news_items[ref['news_item_id']], modified_score=ref['modified_score'])
+        for ref in report['news_items'] if ref['news_item_id'] in news_items
+    ]
+    if 'profiles' in report or 'profile_groups' in report:
+        resolved['profile_news_items'] = {
+            news_item_id: news_items[news_item_id]
+            for news_item_id in report['news_item_keys'] if news_item_id in news_items
+        }
+    return resolved
+
+
+def encode_snapshot(news_items: Any) -> bytes:
+    snapshot = [{k: ni[k] for k in SNAPSHOT_ATTRIBUTES if k in ni} for ni in news_items]
+    payload = json.dumps(snapshot, separators=(',', ':'), default=_json_default)
+    return zlib.compress(payload.encode('utf-8'), 9)
+
+
+def decode_snapshot(snapshot: Any) -> Dict[str, Dict[str, Any]]:
+    if isinstance(snapshot, Binary):
+        snapshot = snapshot.value
+    news_items = json.loads(zlib.decompress(bytes(snapshot)).decode('utf-8'),
+                            parse_float=Decimal)
+    return {str(ni['news_item_id']): ni for ni in news_items}
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
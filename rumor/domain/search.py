@@ -0,0 +1,168 @@
+import os
+import re
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from logzero import logger
+
+from rumor.upstreams.aws import read_table_export, scan_items
+from rumor.upstreams.sharding import unshard_item
+
+BUSY_TIMEOUT_SECONDS = 30.0
+DEFAULT_LIMIT = 20
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+TABLE_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS news_items (
+        news_item_id INTEGER PRIMARY KEY,
+        title TEXT NOT NULL,
+        keywords TEXT NOT NULL,
+        url TEXT,
+        score INTEGER NOT NULL,
+        created_at INTEGER NOT NULL,
+        created_at_date TEXT NOT NULL,
+        updated_at INTEGER NOT NULL
+    )''',
+    'CREATE INDEX IF NOT EXISTS news_items_created_at ON news_items (created_at)',
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS news_item_text USING fts5(
+        title, keywords, content='news_items', content_rowid='news_item_id',
+        tokenize='porter unicode61'
+    )'''
+]
+TRIGGER_SCHEMA = [
+    '''CREATE TRIGGER IF NOT EXISTS news_items_insert AFTER INSERT ON news_items BEGIN
+        INSERT INTO news_item_text (rowid, title, keywords)
+        VALUES (new.news_item_id, new.title, new.keywords);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS news_items_delete AFTER DELETE ON news_items BEGIN
+        INSERT INTO news_item_text (news_item_text, rowid, title, keywords)
+        VALUES ('delete', old.news_item_id, old.title, old.keywords);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS news_items_update AFTER UPDATE ON news_items BEGIN
+        INSERT INTO news_item_text (news_item_text, rowid, title, keywords)
+        VALUES ('delete', old.news_item_id, old.title, old.keywords);
+        INSERT INTO news_item_text (rowid, title, keywords)
+        VALUES (new.news_item_id, new.title, new.keywords);
+    END'''
+]
+UPSERT = '''
+    INSERT INTO news_items (news_item_id, title, keywords, url, score, created_at,
+                            created_at_date, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (news_item_id) DO UPDATE SET
+        title = excluded.title, keywords = excluded.keywords, url = excluded.url,
+        score = excluded.score, created_at = excluded.created_at,
+        created_at_date = excluded.created_at_date, updated_at = excluded.updated_at
+    WHERE excluded.updated_at >= news_items.updated_at
+'''
+SEARCH = '''
+    SELECT n.news_item_id, n.title, n.keywords, n.url, n.score, n.created_at, n.created_at_date
+    FROM news_item_text JOIN news_items n ON n.news_item_id = news_item_text.rowid
+    WHERE news_item_text MATCH ? AND n.created_at >= ? AND n.score >= ?
+    ORDER BY news_item_text.rank
+    LIMIT ?
+'''
+
+
+def connect(path: str, triggers: bool = True) -> sqlite3.Connection:
+    connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SECONDS)
+    connection.execute('PRAGMA journal_mode = WAL')
+    connection.execute('PRAGMA synchronous = NORMAL')
+    for statement in TABLE_SCHEMA + (TRIGGER_SCHEMA if triggers else []):
+        connection.execute(statement)
+    return connection
+
+
+def update_search_index(news_items: List[Dict[str, Any]], path: Optional[str]) -> int:
+    if path is None or len(news_items) == 0:
+        return 0
+    connection = connect(path)
+    try:
+        with connection:
+            connection.executemany(UPSERT, [to_row(news_item) for news_item in news_items])
+    finally:
+        connection.close()
+    return len(news_items)
+
+
+def rebuild_search_index(batches: Iterable[List[Dict[str, Any]]], path: str) -> int:
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    connection = connect(tmp_path, triggers=False)
+    count = 0
+    try:
+        connection.execute('PRAGMA journal_mode = OFF')
+        for batch in batches:
+            with connection:
+                connection.executemany(UPSERT, [to_row(news_item) for news_item in batch])
+            count += len(batch)
+            logger.info(f'Loaded {count} news items into {tmp_path}')
+        with connection:
+            connection.execute("INSERT INTO news_item_text (news_item_text) VALUES ('rebuild')")
+            connection.execute("INSERT INTO news_item_text (news_item_text) VALUES ('optimize')")
+            for statement in TRIGGER_SCHEMA:
+                connection.execute(statement)
+    finally:
+        connection.close()
+    os.replace(tmp_path, path)
+    return count
+
+
+def rebuild_search_index_from_table(path: str, news_item_table_name: str,
+                                    export_paths: Optional[List[str]] = None) -> int:
+    if export_paths:
+        batches = read_table_export(export_paths)
+    else:
+        batches = ([unshard_item(item) for item in page] for page in scan_items(news_item_table_name))
+    count = rebuild_search_index(batches, path)
+    logger.info(f'Rebuilt search index {path} with {count} news items')
+    return count
+
+
+def search_news_items(path: str, query: str, since: Optional[datetime] = None,
+                      min_score: int = 0, limit: int = DEFAULT_LIMIT) -> List[Dict[str, Any]]:
+    match = to_match_query(query)
+    if match is None or not os.path.exists(path):
+        return []
+    created_at_from = int(since.timestamp()) if since is not None else 0
+    connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SECONDS)
+    try:
+        rows = connection.execute(SEARCH, (match, created_at_from, min_score, limit)).fetchall()
+    finally:
+        connection.close()
+    return [
+        {
+            'news_item_id': str(news_item_id),
+            'title': title,
+            'keywords': keywords.split(),
+            'url': url,
+            'score': score,
+            'created_at': created_at,
+            'created_at_date': created_at_date
+        }
+        for news_item_id, title, keywords, url, score, created_at, created_at_date in rows
+    ]
+
+
+def to_match_query(query: str) -> Optional[str]:
+    phrases = [' '.join(TOKEN_PATTERN.findall(term)) for term in query.split()]
+    phrases = [phrase for phrase in phrases if phrase]
+    if not phrases:
+        return None
+    return ' '.join(f'"{phrase}"' for phrase in phrases)
+
+
+def to_row(news_item: Dict[str, Any]) -> tuple:
+    created_at = int(news_item['created_at'])
+    return (
+        int(news_item['news_item_id']),
+        news_item.get('title') or '',
+        ' '.join(news_item.get('keywords') or []),
+        news_item.get('url'),
+        int(news_item.get('score') or 0),
+        created_at,
+        news_item.get('created_at_date') or datetime.fromtimestamp(created_at).strftime('%Y-%m-%d'),
+        int(news_item.get('updated_at') or created_at)
+    )
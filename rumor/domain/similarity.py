@@ -0,0 +1,139 @@
+import json
+import math
+import os
+import re
+import zlib
+from collections import Counter, OrderedDict, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from logzero import logger
+
+FEATURE_DIMENSIONS = 2 ** 18
+TOKEN_PATTERN = re.compile('[a-z0-9][a-z0-9+#-]+')
+NGRAM_SIZE = 3
+WORD_WEIGHT = 2.0
+MIN_SIMILARITY = 0.45
+MAX_DOCUMENTS = 10000
+
+Columns = Dict[int, List[Tuple[int, float]]]
+
+
+class IdfStatistics:
+    def __init__(self, documents: Optional[Dict[str, List[int]]] = None,
+                 max_documents: int = MAX_DOCUMENTS) -> None:
+        self.documents = OrderedDict()
+        self.document_frequencies = Counter()
+        self.max_documents = max_documents
+        for news_item_id, features in (documents or {}).items():
+            self._add(news_item_id, features)
+
+    def update(self, news_items: List[Dict[str, Any]]) -> List[List[int]]:
+        rows = []
+        added = 0
+        for news_item in news_items:
+            news_item_id = str(news_item['news_item_id'])
+            features = self.documents.get(news_item_id)
+            if features is None:
+                features = get_features(news_item)
+                self._add(news_item_id, features)
+                added += 1
+            rows.append(features)
+        logger.info('Updated IDF statistics with {} of {} news items ({} documents)'.format(
+            added, len(news_items), len(self.documents)))
+        return rows
+
+    def idf(self, feature: int) -> float:
+        return math.log((1.0 + len(self.documents)) /
+                        (1.0 + self.document_frequencies[feature])) + 1.0
+
+    def _add(self, news_item_id: str, features: List[int]) -> None:
+        self.documents[news_item_id] = features
+        self.document_frequencies.update(features)
+        while len(self.documents) > self.max_documents:
+            _, evicted = self.documents.popitem(last=False)
+            self.document_frequencies.subtract(evicted)
+            for feature in evicted:
+                if self.document_frequencies[feature] <= 0:
+                    del self.document_frequencies[feature]
+
+
+def get_features(news_item: Dict[str, Any]) -> List[int]:
+    tokens = set(TOKEN_PATTERN.findall(news_item.get('title', '').lower()))
+    tokens.update(keyword.lower() for keyword in news_item.get('keywords', []))
+    return sorted({feature for token in tokens for feature, _ in get_token_features(token)})
+
+
+def get_token_features(token: str) -> List[Tuple[int, float]]:
+    padded = f'<{token}>'
+    features = [(_hash(f'w:{token}'), WORD_WEIGHT)]
+    features.extend((_hash(f'c:{padded[i:i + NGRAM_SIZE]}'), 1.0)
+                    for i in range(len(padded) - NGRAM_SIZE + 1))
+    return features
+
+
+def get_preference_columns(preferences: List[Dict[str, Any]],
+                           statistics: IdfStatistics) -> Columns:
+    columns = defaultdict(list)
+    for j, preference in enumerate(preferences):
+        weights = defaultdict(float)
+        for feature, boost in get_token_features(preference['preference_key'].lower()):
+            weights[feature] = max(weights[feature], boost * statistics.idf(feature))
+        norm = sum(weight * weight for weight in weights.values())
+        for feature, weight in weights.items():
+            columns[feature].append((j, weight * weight / norm))
+    return dict(columns)
+
+
+def multiply(rows: List[List[int]], columns: Columns) -> List[Dict[int, float]]:
+    products = []
+    for row in rows:
+        product = defaultdict(float)
+        for feature in row:
+            for j, value in columns.get(feature, ()):
+                product[j] += value
+        products.append(product)
+    return products
+
+
+def get_similarity_modifiers(news_items: List[Dict[str, Any]],
+                             preferences: List[Dict[str, Any]],
+                             statistics: IdfStatistics,
+                             min_similarity: float = MIN_SIMILARITY) -> List[float]:
+    rows = statistics.update(news_items)
+    similarities = multiply(rows, get_preference_columns(preferences, statistics))
+    weights = [max(float(preference['preference_weight']), 0.0) for preference in preferences]
+    modifiers = []
+    for news_item, similarity in zip(news_items, similarities):
+        modifier = 1.0
+        for j, value in similarity.items():
+            if value >= min_similarity:
+                modifier *= weights[j] ** min(value, 1.0)
+                logger.info('Found {:.2f} match for {} in news item {}'.format(
+                    value, preferences[j]['preference_key'], news_item['news_item_id']))
+        modifiers.append(modifier)
+    return modifiers
+
+
+def load_idf_statistics(path: Optional[str]) -> IdfStatistics:
+    if path is None or not os.path.exists(path):
+        return IdfStatistics()
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        return IdfStatistics(data['documents'])
+    except (ValueError, KeyError) as e:
+        logger.warning(f'Ignoring unreadable IDF statistics file {path}: {e}')
+        return IdfStatistics()
+
+
+def save_idf_statistics(statistics: IdfStatistics, path: Optional[str]) -> None:
+    if path is None:
+        return
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'documents': statistics.documents}, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def _hash(feature: str) -> int:
+    return zlib.crc32(feature.encode('utf-8')) & (FEATURE_DIMENSIONS - 1)
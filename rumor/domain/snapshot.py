@@ -0,0 +1,214 @@
+import fcntl
+import json
+import mmap
+import os
+import threading
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from logzero import logger
+
+SNAPSHOT_FORMAT = 'rumor-snapshot-1'
+META_FILE = 'meta.json'
+KEYWORDS_FILE = 'keywords.txt'
+LOCK_FILE = '.lock'
+INTEGER_COLUMNS = ['news_item_id', 'created_at', 'updated_at', 'score']
+STRING_COLUMNS = ['url', 'title']
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_lock = threading.Lock()
+
+
+def _column_files() -> Dict[str, str]:
+    files = {name: 'q' for name in INTEGER_COLUMNS}
+    files['keyword_offsets'] = 'q'
+    files['keyword_ids'] = 'i'
+    for name in STRING_COLUMNS:
+        files[f'{name}_offsets'] = 'q'
+        files[f'{name}.bin'] = 'B'
+    return files
+
+
+COLUMN_FILES = _column_files()
+
+
+def append_to_snapshot(news_items: List[Dict[str, Any]], path: Optional[str]) -> None:
+    if path is None or len(news_items) == 0:
+        return
+    with _lock_snapshot(path):
+        meta = _load_meta(path)
+        keywords = _load_keywords(path, meta['keywords'])
+        keyword_index = {keyword: i for i, keyword in enumerate(keywords)}
+        new_keywords = []
+
+        columns = {name: array(typecode) for name, typecode in COLUMN_FILES.items()}
+        keyword_count = meta['lengths']['keyword_ids'] // columns['keyword_ids'].itemsize
+        string_sizes = {name: meta['lengths'][f'{name}.bin'] for name in STRING_COLUMNS}
+        for news_item in news_items:
+            for name in INTEGER_COLUMNS:
+                columns[name].append(int(news_item[name]))
+            for keyword in news_item.get('keywords', []):
+                if keyword not in keyword_index:
+                    keyword_index[keyword] = len(keyword_index)
+                    new_keywords.append(keyword)
+                columns['keyword_ids'].append(keyword_index[keyword])
+                keyword_count += 1
+            columns['keyword_offsets'].append(keyword_count)
+            for name in STRING_COLUMNS:
+                encoded = (news_item.get(name) or '').encode('utf-8')
+                columns[f'{name}.bin'].frombytes(encoded)
+                string_sizes[name] += len(encoded)
+                columns[f'{name}_offsets'].append(string_sizes[name])
+
+        for name, column in columns.items():
+            with open(os.path.join(path, name), 'r+b') as f:
+                f.seek(meta['lengths'][name])
+                column.tofile(f)
+                meta['lengths'][name] = f.tell()
+        if new_keywords:
+            with open(os.path.join(path, KEYWORDS_FILE), 'r+b') as f:
+                f.seek(meta['lengths'][KEYWORDS_FILE])
+                f.write(''.join(f'{keyword}\n' for keyword in new_keywords).encode('utf-8'))
+                meta['lengths'][KEYWORDS_FILE] = f.tell()
+        meta['rows'] += len(news_items)
+        meta['keywords'] += len(new_keywords)
+        _save_meta(path, meta)
+    logger.info('Appended {} news items to snapshot {}'.format(len(news_items), path))
+
+
+class Snapshot:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        meta = _load_meta(path, create=False)
+        self.rows = meta['rows']
+        self.keywords = _load_keywords(path, meta['keywords'])
+        self._maps = []
+        self.columns = {}
+        for name, typecode in COLUMN_FILES.items():
+            self.columns[name] = self._map(name, meta['lengths'][name], typecode)
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __enter__(self) -> 'Snapshot':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for column in self.columns.values():
+            column.release()
+        self.columns = {}
+        for mapped in self._maps:
+            mapped.close()
+        self._maps = []
+
+    def rows_between(self, created_at_from: datetime,
+                     created_at_to: datetime) -> List[int]:
+        ts_from = created_at_from.timestamp()
+        ts_to = created_at_to.timestamp()
+        return [row for row, created_at in enumerate(self.columns['created_at'])
+                if ts_from <= created_at <= ts_to]
+
+    def keyword_ids(self, row: int) -> memoryview:
+        offsets = self.columns['keyword_offsets']
+        start = offsets[row - 1] if row > 0 else 0
+        return self.columns['keyword_ids'][start:offsets[row]]
+
+    def string(self, name: str, row: int) -> str:
+        offsets = self.columns[f'{name}_offsets']
+        start = offsets[row - 1] if row > 0 else 0
+        return bytes(self.columns[f'{name}.bin'][start:offsets[row]]).decode('utf-8')
+
+    def keyword_counts(self, rows: List[int]) -> Counter:
+        counts = Counter()
+        for row in rows:
+            counts.update(self.keyword_ids(row))
+        return Counter({self.keywords[i]: n for i, n in counts.items()})
+
+    def news_item(self, row: int) -> Dict[str, Any]:
+        news_item = {name: self.columns[name][row] for name in INTEGER_COLUMNS}
+        news_item['news_item_id'] = str(news_item['news_item_id'])
+        for name in STRING_COLUMNS:
+            news_item[name] = self.string(name, row)
+        news_item['keywords'] = [self.keywords[i] for i in self.keyword_ids(row)]
+        return news_item
+
+    def news_items(self, created_at_from: datetime,
+                   created_at_to: datetime) -> List[Dict[str, Any]]:
+        return [self.news_item(row)
+                for row in self.rows_between(created_at_from, created_at_to)]
+
+    def _map(self, name: str, length: int, typecode: str) -> memoryview:
+        if length == 0:
+            return memoryview(array(typecode))
+        with open(os.path.join(self.path, name), 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), length, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        return memoryview(mapped).cast(typecode)
+
+
+def _get_lock(path: str) -> threading.Lock:
+    with _locks_lock:
+        if path not in _locks:
+            _locks[path] = threading.Lock()
+        return _locks[path]
+
+
+@contextmanager
+def _lock_snapshot(path: str) -> Iterator[None]:
+    with _get_lock(path):
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, LOCK_FILE), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _load_meta(path: str, create: bool = True) -> Dict[str, Any]:
+    meta_path = os.path.join(path, META_FILE)
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get('format') != SNAPSHOT_FORMAT:
+            raise ValueError(f'Unsupported snapshot format in {path}')
+        if create:
+            _truncate(path, meta['lengths'])
+        return meta
+    if not create:
+        raise FileNotFoundError(meta_path)
+    os.makedirs(path, exist_ok=True)
+    meta = {
+        'format': SNAPSHOT_FORMAT,
+        'rows': 0,
+        'keywords': 0,
+        'lengths': {name: 0 for name in [*COLUMN_FILES, KEYWORDS_FILE]}
+    }
+    _truncate(path, meta['lengths'])
+    _save_meta(path, meta)
+    return meta
+
+
+def _truncate(path: str, lengths: Dict[str, int]) -> None:
+    for name, length in lengths.items():
+        with open(os.path.join(path, name), 'a+b') as f:
+            f.truncate(length)
+
+
+def _save_meta(path: str, meta: Dict[str, Any]) -> None:
+    meta_path = os.path.join(path, META_FILE)
+    tmp_path = f'{meta_path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+
+def _load_keywords(path: str, count: int) -> List[str]:
+    with open(os.path.join(path, KEYWORDS_FILE), encoding='utf-8') as f:
+        return [line.rstrip('\n') for _, line in zip(range(count), f)]
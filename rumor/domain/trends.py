@@ -0,0 +1,233 @@
+import json
+import threading
+import zlib
+from array import array
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+from logzero import logger
+
+from rumor.exceptions import UpstreamError
+from rumor.upstreams.aws import get_trend_buckets, store_trend_bucket
+
+SKETCH_WIDTH = 1024
+SKETCH_DEPTH = 4
+HEAVY_HITTERS = 200
+MAX_FLUSH_ATTEMPTS = 5
+
+
+class CountMinSketch:
+    def __init__(self, width: int = SKETCH_WIDTH, depth: int = SKETCH_DEPTH,
+                 counts: Optional[array] = None) -> None:
+        self.width = width
+        self.depth = depth
+        self.counts = counts if counts is not None else array('d', bytes(8 * width * depth))
+
+    def add(self, key: str, value: float = 1.0) -> None:
+        for index in self._indexes(key):
+            self.counts[index] += value
+
+    def estimate(self, key: str) -> float:
+        return min(self.counts[index] for index in self._indexes(key))
+
+    def merge(self, other: 'CountMinSketch') -> None:
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError('Cannot merge sketches of different dimensions')
+        self.counts = array('d', map(float.__add__, self.counts, other.counts))
+
+    def to_bytes(self) -> bytes:
+        return zlib.compress(self.counts.tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes, width: int = SKETCH_WIDTH,
+                   depth: int = SKETCH_DEPTH) -> 'CountMinSketch':
+        counts = array('d')
+        counts.frombytes(zlib.decompress(data))
+        return cls(width, depth, counts)
+
+    def _indexes(self, key: str) -> List[int]:
+        encoded = key.encode('utf-8')
+        return [row * self.width + zlib.crc32(encoded, row) % self.width
+                for row in range(self.depth)]
+
+
+class SpaceSaving:
+    def __init__(self, capacity: int = HEAVY_HITTERS,
+                 counters: Optional[Dict[str, List[float]]] = None) -> None:
+        self.capacity = capacity
+        self.counters = counters or {}
+
+    def add(self, key: str, value: float = 1.0) -> None:
+        if key in self.counters:
+            self.counters[key][0] += value
+        elif len(self.counters) < self.capacity:
+            self.counters[key] = [value, 0.0]
+        else:
+            evicted = min(self.counters, key=lambda k: self.counters[k][0])
+            count = self.counters.pop(evicted)[0]
+            self.counters[key] = [count + value, count]
+
+    def merge(self, other: 'SpaceSaving') -> None:
+        floor, other_floor = self._floor(), other._floor()
+        merged = {}
+        for key in set(self.counters) | set(other.counters):
+            count, error = self.counters.get(key, [floor, floor])
+            other_count, other_error = other.counters.get(key, [other_floor, other_floor])
+            merged[key] = [count + other_count, error + other_error]
+        self.counters = dict(sorted(merged.items(), key=lambda kv: -kv[1][0])[:self.capacity])
+
+    def top(self, n: int) -> List[Tuple[str, float]]:
+        return sorted(((key, counter[0]) for key, counter in self.counters.items()),
+                      key=lambda kv: (-kv[1], kv[0]))[:n]
+
+    def _floor(self) -> float:
+        if len(self.counters) < self.capacity:
+            return 0.0
+        return min(counter[0] for counter in self.counters.values())
+
+
+class TrendSketch:
+    def __init__(self, mentions: Optional[CountMinSketch] = None,
+                 score: Optional[CountMinSketch] = None,
+                 heavy_hitters: Optional[SpaceSaving] = None,
+                 items: int = 0, version: int = 0) -> None:
+        self.mentions = mentions or CountMinSketch()
+        self.score = score or CountMinSketch()
+        self.heavy_hitters = heavy_hitters or SpaceSaving()
+        self.items = items
+        self.version = version
+
+    def add(self, keywords: List[str], score: float, mention: bool = True) -> None:
+        for keyword in keywords:
+            self.score.add(keyword, score)
+            if mention:
+                self.mentions.add(keyword)
+                self.heavy_hitters.add(keyword)
+        if mention:
+            self.items += 1
+
+    def merge(self, other: 'TrendSketch') -> None:
+        self.mentions.merge(other.mentions)
+        self.score.merge(other.score)
+        self.heavy_hitters.merge(other.heavy_hitters)
+        self.items += other.items
+
+    def to_item(self, trend_date: str) -> Dict[str, Any]:
+        return {
+            'trend_date': trend_date,
+            'version': self.version,
+            'items': self.items,
+            'width': self.mentions.width,
+            'depth': self.mentions.depth,
+            'mentions': self.mentions.to_bytes(),
+            'score': self.score.to_bytes(),
+            'heavy_hitters': json.dumps({'capacity': self.heavy_hitters.capacity,
+                                         'counters': self.heavy_hitters.counters})
+        }
+
+    @classmethod
+    def from_item(cls, item: Dict[str, Any]) -> 'TrendSketch':
+        width, depth = int(item['width']), int(item['depth'])
+        heavy_hitters = json.loads(item['heavy_hitters'])
+        return cls(
+            mentions=CountMinSketch.from_bytes(_get_bytes(item['mentions']), width, depth),
+            score=CountMinSketch.from_bytes(_get_bytes(item['score']), width, depth),
+            heavy_hitters=SpaceSaving(heavy_hitters['capacity'], heavy_hitters['counters']),
+            items=int(item['items']),
+            version=int(item['version'])
+        )
+
+
+class TrendRecorder:
+    def __init__(self) -> None:
+        self.buckets: Dict[str, TrendSketch] = {}
+        self._lock = threading.Lock()
+
+    def add(self, news_item: Dict[str, Any], previous_score: Optional[float] = None) -> None:
+        score = float(news_item['score'])
+        if previous_score is not None and score == previous_score:
+            return
+        with self._lock:
+            bucket = self.buckets.setdefault(news_item['created_at_date'], TrendSketch())
+            if previous_score is None:
+                bucket.add(news_item['keywords'], score)
+            else:
+                bucket.add(news_item['keywords'], score - previous_score, mention=False)
+
+
+def flush_trends(recorder: TrendRecorder, trend_table_name: str,
+                 max_attempts: int = MAX_FLUSH_ATTEMPTS) -> int:
+    flushed = 0
+    for trend_date, delta in sorted(recorder.buckets.items()):
+        try:
+            if _merge_bucket(trend_date, delta, trend_table_name, max_attempts):
+                flushed += 1
+            else:
+                logger.warning(f'Gave up merging trends for {trend_date} after '
+                               f'{max_attempts} conflicting writes')
+        except (ClientError, UpstreamError) as e:
+            logger.warning(f'Failed to merge trends for {trend_date}: {e}')
+    logger.info('Merged {} trend bucket(s) into {}'.format(flushed, trend_table_name))
+    return flushed
+
+
+def load_trends(trend_table_name: str, trend_dates: List[str]) -> TrendSketch:
+    merged = TrendSketch()
+    for item in get_trend_buckets(trend_table_name, trend_dates):
+        merged.merge(TrendSketch.from_item(item))
+    return merged
+
+
+def get_trend_dates(days: int, end: Optional[date] = None) -> List[str]:
+    end = end or datetime.now().date()
+    return [str(end - timedelta(days=offset)) for offset in range(days)]
+
+
+def get_trending(trend_table_name: str, days: int = 1, baseline_days: int = 7,
+                 top: int = 10, end: Optional[date] = None) -> List[Dict[str, Any]]:
+    trend_dates = get_trend_dates(days + baseline_days, end)
+    recent = load_trends(trend_table_name, trend_dates[:days])
+    baseline = load_trends(trend_table_name, trend_dates[days:])
+    return rank_trending(recent, baseline, days, baseline_days, top)
+
+
+def rank_trending(recent: TrendSketch, baseline: TrendSketch, days: int,
+                  baseline_days: int, top: int) -> List[Dict[str, Any]]:
+    trending = []
+    for keyword, _ in recent.heavy_hitters.top(recent.heavy_hitters.capacity):
+        mentions = recent.mentions.estimate(keyword)
+        baseline_mentions = baseline.mentions.estimate(keyword) if baseline_days > 0 else 0.0
+        rate = mentions / days
+        baseline_rate = baseline_mentions / baseline_days if baseline_days > 0 else 0.0
+        trending.append({
+            'keyword': keyword,
+            'mentions': mentions,
+            'score': recent.score.estimate(keyword),
+            'baseline_mentions': baseline_mentions,
+            'rise': (rate + 1.0) / (baseline_rate + 1.0)
+        })
+    trending.sort(key=lambda row: (-row['rise'], -row['mentions'], row['keyword']))
+    return trending[:top]
+
+
+def _merge_bucket(trend_date: str, delta: TrendSketch, trend_table_name: str,
+                  max_attempts: int) -> bool:
+    for _ in range(max_attempts):
+        items = get_trend_buckets(trend_table_name, [trend_date])
+        if items:
+            bucket = TrendSketch.from_item(items[0])
+            previous_version = bucket.version
+        else:
+            bucket = TrendSketch()
+            previous_version = None
+        bucket.merge(delta)
+        bucket.version += 1
+        if store_trend_bucket(bucket.to_item(trend_date), trend_table_name,
+                              previous_version=previous_version):
+            return True
+    return False
+
+
+def _get_bytes(value: Any) -> bytes:
+    return bytes(getattr(value, 'value', value))
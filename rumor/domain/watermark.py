@@ -0,0 +1,87 @@
+import json
+import os
+import threading
+from bisect import bisect_left
+from typing import Dict, Optional
+
+from logzero import logger
+
+SAFETY_MARGIN_SECONDS = 3600
+MAX_SAMPLES = 256
+
+
+class WatermarkIndex:
+    def __init__(self, samples: Optional[Dict[int, int]] = None,
+                 max_samples: int = MAX_SAMPLES,
+                 safety_margin_seconds: int = SAFETY_MARGIN_SECONDS) -> None:
+        self.samples = dict(samples or {})
+        self.max_samples = max_samples
+        self.safety_margin_seconds = safety_margin_seconds
+        self.skipped = 0
+        self._ids = None
+        self._suffix_min_times = None
+        self._lock = threading.Lock()
+
+    def observe(self, news_item_id: int, created_at: int) -> None:
+        news_item_id = int(news_item_id)
+        with self._lock:
+            if self.samples.get(news_item_id) == created_at:
+                return
+            self.samples[news_item_id] = int(created_at)
+            if len(self.samples) > self.max_samples:
+                self._downsample()
+            self._ids = None
+
+    def is_older_than(self, news_item_id: int, created_at_threshold: float) -> bool:
+        with self._lock:
+            if self._ids is None:
+                self._build()
+            i = bisect_left(self._ids, int(news_item_id))
+            if i == len(self._ids):
+                return False
+            upper_bound = self._suffix_min_times[i] + self.safety_margin_seconds
+        return upper_bound <= created_at_threshold
+
+    def skip(self, news_item_id: int, created_at_threshold: float) -> bool:
+        if not self.is_older_than(news_item_id, created_at_threshold):
+            return False
+        with self._lock:
+            self.skipped += 1
+        return True
+
+    def _build(self) -> None:
+        self._ids = sorted(self.samples)
+        self._suffix_min_times = [0] * len(self._ids)
+        current = None
+        for i in range(len(self._ids) - 1, -1, -1):
+            created_at = self.samples[self._ids[i]]
+            current = created_at if current is None else min(current, created_at)
+            self._suffix_min_times[i] = current
+
+    def _downsample(self) -> None:
+        ids = sorted(self.samples)
+        step = len(ids) / float(self.max_samples - 1)
+        keep = {ids[int(k * step)] for k in range(self.max_samples - 1)}
+        keep.add(ids[-1])
+        self.samples = {i: self.samples[i] for i in keep}
+
+
+def load_watermarks(path: Optional[str]) -> WatermarkIndex:
+    if path is None or not os.path.exists(path):
+        return WatermarkIndex()
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        return WatermarkIndex({int(k): int(v) for k, v in data['samples'].items()})
+    except (ValueError, KeyError) as e:
+        logger.warning(f'Ignoring unreadable watermark file {path}: {e}')
+        return WatermarkIndex()
+
+
+def save_watermarks(index: WatermarkIndex, path: Optional[str]) -> None:
+    if path is None:
+        return
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'samples': {str(k): v for k, v in index.samples.items()}}, f)
+    os.replace(tmp_path, path)
@@ -1,2 +1,10 @@
 class UpstreamError(Exception):
     pass
+
+
+class ThrottledError(UpstreamError):
+    pass
+
+
+class CircuitOpenError(UpstreamError):
+    pass
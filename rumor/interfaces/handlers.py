@@ -1,7 +1,9 @@
 import os
-from typing import Any, Dict
+from typing import Any, Dict, List
 
-from rumor.domain import classify, discover, evaluate, inspect, send_reports
+from rumor.domain import (classify, classify_records, discover, evaluate,
+                          inspect, inspect_records, refresh, send_reports)
+from rumor.upstreams.metrics import flush_metrics
 
 
 def discovery_handler(event: Dict[str, Any], context: Dict[str, Any]) -> None:
@@ -30,12 +32,39 @@ def inspection_handler(event: Dict[str, Any], context: Dict[str, Any]) -> None:
     target_api_url = event.get('target_api_url', os.environ.get(
         'RUMOR_DISCOVERY_TARGET_API_URL', 'https://hacker-news.firebaseio.com'
     ))
+    watermark_path = os.environ.get('RUMOR_WATERMARK_PATH',
+                                    '/tmp/rumor-watermarks.json')
 
     inspect(collection_queue_name=collection_queue_name,
             classification_queue_name=classification_queue_name,
             batch_size=batch_size,
             news_item_max_age_hours=news_item_max_age_hours,
-            target_api_url=target_api_url)
+            target_api_url=target_api_url,
+            watermark_path=watermark_path)
+    emit_metrics()
+
+
+def inspection_event_handler(event: Dict[str, Any],
+                             context: Dict[str, Any]) -> Dict[str, Any]:
+    classification_queue_name = os.environ.get(
+        'RUMOR_CLASSIFICATION_QUEUE_NAME', 'rumor-dev-classification-queue')
+    news_item_max_age_hours = int(os.environ.get(
+        'RUMOR_NEWS_ITEM_MAX_AGE_HOURS', '48'))
+    target_api_url = os.environ.get(
+        'RUMOR_DISCOVERY_TARGET_API_URL', 'https://hacker-news.firebaseio.com')
+    concurrency = int(os.environ.get('RUMOR_INSPECTION_CONCURRENCY', '10'))
+    watermark_path = os.environ.get('RUMOR_WATERMARK_PATH',
+                                    '/tmp/rumor-watermarks.json')
+
+    failed_message_ids = inspect_records(
+        records=event.get('Records', []),
+        classification_queue_name=classification_queue_name,
+        news_item_max_age_hours=news_item_max_age_hours,
+        target_api_url=target_api_url,
+        max_workers=concurrency,
+        watermark_path=watermark_path)
+    emit_metrics()
+    return batch_response(failed_message_ids)
 
 
 def classification_handler(event: Dict[str, Any], context: Dict[str, Any]) -> None:
@@ -49,10 +78,67 @@ def classification_handler(event: Dict[str, Any], context: Dict[str, Any]) -> No
     news_item_max_age_hours = event.get(
         'news_item_max_age_hours', int(os.environ.get(
             'RUMOR_NEWS_ITEM_MAX_AGE_HOURS', '48')))
+    snapshot_path = os.environ.get('RUMOR_SNAPSHOT_PATH')
+    shards = event.get('news_item_shards', int(os.environ.get(
+        'RUMOR_NEWS_ITEM_SHARDS', '1')))
+    fingerprint_path = os.environ.get('RUMOR_FINGERPRINT_PATH',
+                                      '/tmp/rumor-fingerprints.json')
+    trend_table_name = os.environ.get('RUMOR_TREND_TABLE_NAME')
+    enrichment_timeout = float(os.environ.get('RUMOR_ENRICHMENT_TIMEOUT', '0'))
+    search_index_path = os.environ.get('RUMOR_SEARCH_INDEX_PATH')
     classify(classification_queue_name=classification_queue_name,
              batch_size=batch_size,
              news_item_max_age_hours=news_item_max_age_hours,
-             news_item_table_name=news_item_table_name)
+             news_item_table_name=news_item_table_name,
+             snapshot_path=snapshot_path,
+             shards=shards,
+             fingerprint_path=fingerprint_path,
+             trend_table_name=trend_table_name,
+             enrichment_timeout=enrichment_timeout,
+             search_index_path=search_index_path)
+    emit_metrics()
+
+
+def classification_event_handler(event: Dict[str, Any],
+                                 context: Dict[str, Any]) -> Dict[str, Any]:
+    news_item_table_name = os.environ.get(
+        'RUMOR_NEWS_ITEM_TABLE_NAME', 'rumor-dev-news-items')
+    news_item_max_age_hours = int(os.environ.get(
+        'RUMOR_NEWS_ITEM_MAX_AGE_HOURS', '48'))
+    concurrency = int(os.environ.get('RUMOR_CLASSIFICATION_CONCURRENCY', '10'))
+    snapshot_path = os.environ.get('RUMOR_SNAPSHOT_PATH')
+    shards = int(os.environ.get('RUMOR_NEWS_ITEM_SHARDS', '1'))
+    fingerprint_path = os.environ.get('RUMOR_FINGERPRINT_PATH',
+                                      '/tmp/rumor-fingerprints.json')
+    trend_table_name = os.environ.get('RUMOR_TREND_TABLE_NAME')
+    enrichment_timeout = float(os.environ.get('RUMOR_ENRICHMENT_TIMEOUT', '0'))
+    search_index_path = os.environ.get('RUMOR_SEARCH_INDEX_PATH')
+
+    failed_message_ids = classify_records(
+        records=event.get('Records', []),
+        news_item_max_age_hours=news_item_max_age_hours,
+        news_item_table_name=news_item_table_name,
+        max_workers=concurrency,
+        snapshot_path=snapshot_path,
+        shards=shards,
+        fingerprint_path=fingerprint_path,
+        trend_table_name=trend_table_name,
+        enrichment_timeout=enrichment_timeout,
+        search_index_path=search_index_path)
+    emit_metrics()
+    return batch_response(failed_message_ids)
+
+
+def emit_metrics() -> None:
+    flush_metrics(emit=os.environ.get('RUMOR_EMF_METRICS', 'true').lower() == 'true')
+
+
+def batch_response(failed_message_ids: List[str]) -> Dict[str, Any]:
+    return {
+        'batchItemFailures': [
+            {'itemIdentifier': message_id} for message_id in failed_message_ids
+        ]
+    }
 
 
 def evaluation_handler(event: Dict[str, Any], context: Dict[str, Any]) -> None:
@@ -77,6 +163,14 @@ def evaluation_handler(event: Dict[str, Any], context: Dict[str, Any]) -> None:
     preference_table_name = event.get(
         'preference_table_name', os.environ.get(
             'RUMOR_PREFERENCE_TABLE_NAME', 'rumor-dev-preferences'))
+    snapshot_path = event.get('snapshot_path', os.environ.get('RUMOR_SNAPSHOT_PATH'))
+    include_report_snapshot = event.get(
+        'include_report_snapshot', os.environ.get(
+            'RUMOR_REPORT_SNAPSHOT', 'false').lower() == 'true')
+    shards = event.get('news_item_shards', int(os.environ.get(
+        'RUMOR_NEWS_ITEM_SHARDS', '1')))
+    scoring_mode = event.get('scoring_mode', os.environ.get('RUMOR_SCORING_MODE', 'exact'))
+    idf_path = os.environ.get('RUMOR_IDF_PATH', '/tmp/rumor-idf.json')
 
     evaluate(news_item_max_age_hours=news_item_max_age_hours,
              evaluation_period_hours=evaluation_period_hours,
@@ -84,7 +178,42 @@ def evaluation_handler(event: Dict[str, Any], context: Dict[str, Any]) -> None:
              qualification_limit=qualification_limit,
              news_item_table_name=news_item_table_name,
              evaluation_report_table_name=evaluation_report_table_name,
-             preference_table_name=preference_table_name)
+             preference_table_name=preference_table_name,
+             snapshot_path=snapshot_path,
+             include_report_snapshot=include_report_snapshot,
+             shards=shards,
+             scoring_mode=scoring_mode,
+             idf_path=idf_path)
+
+
+def refresh_handler(event: Dict[str, Any], context: Dict[str, Any]) -> None:
+    news_item_table_name = event.get(
+        'news_item_table_name', os.environ.get(
+            'RUMOR_NEWS_ITEM_TABLE_NAME', 'rumor-dev-news-items'))
+    target_api_url = event.get('target_api_url', os.environ.get(
+        'RUMOR_DISCOVERY_TARGET_API_URL', 'https://hacker-news.firebaseio.com'
+    ))
+    news_item_max_age_hours = event.get(
+        'news_item_max_age_hours', int(os.environ.get(
+            'RUMOR_NEWS_ITEM_MAX_AGE_HOURS', '48')))
+    evaluation_period_hours = event.get(
+        'evaluation_period_hours', int(os.environ.get(
+            'RUMOR_EVALUATION_PERIOD_HOURS', '72')))
+    qualification_threshold = event.get(
+        'qualification_threshold', float(os.environ.get(
+            'RUMOR_QUALIFICATION_THRESHOLD', '1.5')))
+    fetch_budget = event.get('fetch_budget', int(os.environ.get(
+        'RUMOR_REFRESH_FETCH_BUDGET', '20')))
+    shards = event.get('news_item_shards', int(os.environ.get(
+        'RUMOR_NEWS_ITEM_SHARDS', '1')))
+
+    refresh(news_item_table_name=news_item_table_name,
+            target_api_url=target_api_url,
+            news_item_max_age_hours=news_item_max_age_hours,
+            evaluation_period_hours=evaluation_period_hours,
+            qualification_threshold=qualification_threshold,
+            fetch_budget=fetch_budget,
+            shards=shards)
 
 
 def report_handler(event: Dict[str, Any], context: Dict[str, Any]) -> None:
@@ -95,7 +224,25 @@ def report_handler(event: Dict[str, Any], context: Dict[str, Any]) -> None:
             'RUMOR_EVALUATION_REPORT_TABLE_NAME', 'rumor-dev-evaluation-reports'))
     topic_arn_hint = event.get('topic_arn_hint', os.environ.get(
         'RUMOR_NOTIFICATION_TOPIC_NAME', 'rumor-dev-notification-topic'))
+    preference_table_name = event.get(
+        'preference_table_name', os.environ.get(
+            'RUMOR_PREFERENCE_TABLE_NAME', 'rumor-dev-preferences'))
+    personalized_topic_arn_hint = event.get(
+        'personalized_topic_arn_hint', os.environ.get(
+            'RUMOR_PERSONALIZED_TOPIC_NAME', 'rumor-dev-personalized-topic'))
+    news_item_table_name = event.get(
+        'news_item_table_name', os.environ.get(
+            'RUMOR_NEWS_ITEM_TABLE_NAME', 'rumor-dev-news-items'))
+    shards = event.get('news_item_shards', int(os.environ.get(
+        'RUMOR_NEWS_ITEM_SHARDS', '1')))
+    html = event.get('html', os.environ.get(
+        'RUMOR_REPORT_HTML', 'false').lower() == 'true')
 
     send_reports(report_period_hours=report_period_hours,
                  evaluation_report_table_name=evaluation_report_table_name,
-                 topic_arn_hint=topic_arn_hint)
+                 topic_arn_hint=topic_arn_hint,
+                 preference_table_name=preference_table_name,
+                 personalized_topic_arn_hint=personalized_topic_arn_hint,
+                 news_item_table_name=news_item_table_name,
+                 shards=shards,
+                 html=html)
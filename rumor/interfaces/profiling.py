@@ -0,0 +1,115 @@
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Callable, Dict, TextIO
+
+PROFILERS = ['sampling', 'cprofile']
+SAMPLING_INTERVAL_SECONDS = 0.001
+MAX_STACK_DEPTH = 128
+TOP_ALLOCATIONS = 10
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = SAMPLING_INTERVAL_SECONDS) -> None:
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_id:
+                    self.stacks[collapse_frame(frame)] += 1
+
+
+class ThreadProfiler:
+    def __init__(self) -> None:
+        self.profiles = []
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        threading.setprofile(self._profile_thread)
+        self._profile_thread()
+
+    def stop(self) -> None:
+        threading.setprofile(None)
+        for profile in self.profiles:
+            profile.disable()
+
+    def stats(self) -> pstats.Stats:
+        return pstats.Stats(*self.profiles)
+
+    def _profile_thread(self, *args: Any) -> None:
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return
+        with self._lock:
+            self.profiles.append(profile)
+
+
+def collapse_frame(frame: Any) -> str:
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def profile_call(run: Callable[[], Any], profiler: str = 'sampling') -> Dict[str, Any]:
+    sampler = SamplingProfiler() if profiler == 'sampling' else None
+    tracer = ThreadProfiler() if profiler == 'cprofile' else None
+
+    tracemalloc.start()
+    started_at = time.perf_counter()
+    started_cpu = time.process_time()
+    if sampler is not None:
+        sampler.start()
+    if tracer is not None:
+        tracer.start()
+    try:
+        run()
+    finally:
+        if tracer is not None:
+            tracer.stop()
+        if sampler is not None:
+            sampler.stop()
+        wall_seconds = time.perf_counter() - started_at
+        cpu_seconds = time.process_time() - started_cpu
+        snapshot = tracemalloc.take_snapshot()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    allocations = [
+        (str(stat.traceback[0]), stat.size, stat.count)
+        for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]
+    ]
+    return {
+        'wall_seconds': wall_seconds,
+        'cpu_seconds': cpu_seconds,
+        'peak_bytes': peak_bytes,
+        'allocations': allocations,
+        'stacks': sampler.stacks if sampler is not None else None,
+        'stats': tracer.stats() if tracer is not None else None
+    }
+
+
+def write_collapsed(stacks: Counter, f: TextIO) -> None:
+    for stack, count in sorted(stacks.items()):
+        f.write(f'{stack} {count}\n')
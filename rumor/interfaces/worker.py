@@ -0,0 +1,325 @@
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import boto3
+from logzero import logger
+
+from rumor.domain import classify_records, inspect_records
+from rumor.domain.fingerprints import load_fingerprints, save_fingerprints
+from rumor.domain.watermark import load_watermarks, save_watermarks
+from rumor.upstreams.metrics import flush_metrics
+from rumor.upstreams.tracing import SENT_TIMESTAMP_ATTRIBUTE, TRACE_ATTRIBUTE
+
+STAGES = ['inspect', 'classify']
+COUNTERS = ['batches', 'records', 'failed']
+MAX_BATCH_SIZE = 10
+SAVE_EVERY_BATCHES = 20
+SUPERVISOR_INTERVAL_SECONDS = 0.5
+SHUTDOWN_GRACE_SECONDS = 10
+RESTART_DELAY_SECONDS = 5
+
+
+def load_config(stage: str, **overrides: Any) -> Dict[str, Any]:
+    queue_names = {
+        'inspect': os.environ.get('RUMOR_COLLECTION_QUEUE_NAME', 'rumor-dev-collection-queue'),
+        'classify': os.environ.get('RUMOR_CLASSIFICATION_QUEUE_NAME',
+                                   'rumor-dev-classification-queue')
+    }
+    concurrency = {
+        'inspect': os.environ.get('RUMOR_INSPECTION_CONCURRENCY', '10'),
+        'classify': os.environ.get('RUMOR_CLASSIFICATION_CONCURRENCY', '10')
+    }
+    config = {
+        'stage': stage,
+        'queue_name': queue_names[stage],
+        'classification_queue_name': queue_names['classify'],
+        'news_item_table_name': os.environ.get('RUMOR_NEWS_ITEM_TABLE_NAME',
+                                               'rumor-dev-news-items'),
+        'news_item_max_age_hours': int(os.environ.get('RUMOR_NEWS_ITEM_MAX_AGE_HOURS', '48')),
+        'target_api_url': os.environ.get('RUMOR_DISCOVERY_TARGET_API_URL',
+                                         'https://hacker-news.firebaseio.com'),
+        'shards': int(os.environ.get('RUMOR_NEWS_ITEM_SHARDS', '1')),
+        'snapshot_path': os.environ.get('RUMOR_SNAPSHOT_PATH'),
+        'watermark_path': os.environ.get('RUMOR_WATERMARK_PATH', '/tmp/rumor-watermarks.json'),
+        'fingerprint_path': os.environ.get('RUMOR_FINGERPRINT_PATH',
+                                           '/tmp/rumor-fingerprints.json'),
+        'trend_table_name': os.environ.get('RUMOR_TREND_TABLE_NAME'),
+        'enrichment_timeout': float(os.environ.get('RUMOR_ENRICHMENT_TIMEOUT', '0')),
+        'search_index_path': os.environ.get('RUMOR_SEARCH_INDEX_PATH'),
+        'emf_metrics': os.environ.get('RUMOR_EMF_METRICS', 'true').lower() == 'true',
+        'concurrency': int(concurrency[stage]),
+        'batch_size': MAX_BATCH_SIZE,
+        'prefetch': 1,
+        'wait_seconds': 20,
+        'visibility_timeout': 120
+    }
+    config.update({k: v for k, v in overrides.items() if v is not None})
+    return config
+
+
+def get_sqs_client() -> Any:
+    return boto3.client('sqs')
+
+
+def create_caches(config: Dict[str, Any], index: int) -> Dict[str, Any]:
+    paths = {name: f'{config[name]}.worker-{index}' if config.get(name) else None
+             for name in ('watermark_path', 'fingerprint_path')}
+    return {
+        'paths': paths,
+        'watermarks': load_watermarks(paths['watermark_path']),
+        'fingerprints': load_fingerprints(paths['fingerprint_path'])
+    }
+
+
+def save_caches(caches: Dict[str, Any]) -> None:
+    save_watermarks(caches['watermarks'], caches['paths']['watermark_path'])
+    save_fingerprints(caches['fingerprints'], caches['paths']['fingerprint_path'])
+
+
+def process_inspect(records: List[Dict[str, Any]], config: Dict[str, Any],
+                    caches: Dict[str, Any]) -> List[str]:
+    return inspect_records(records=records,
+                           classification_queue_name=config['classification_queue_name'],
+                           news_item_max_age_hours=config['news_item_max_age_hours'],
+                           target_api_url=config['target_api_url'],
+                           max_workers=config['concurrency'],
+                           watermarks=caches['watermarks'])
+
+
+def process_classify(records: List[Dict[str, Any]], config: Dict[str, Any],
+                     caches: Dict[str, Any]) -> List[str]:
+    return classify_records(records=records,
+                            news_item_max_age_hours=config['news_item_max_age_hours'],
+                            news_item_table_name=config['news_item_table_name'],
+                            max_workers=config['concurrency'],
+                            snapshot_path=config['snapshot_path'],
+                            shards=config['shards'],
+                            fingerprints=caches['fingerprints'],
+                            trend_table_name=config['trend_table_name'],
+                            enrichment_timeout=config['enrichment_timeout'],
+                            search_index_path=config['search_index_path'])
+
+
+PROCESSORS = {
+    'inspect': process_inspect,
+    'classify': process_classify
+}
+
+
+class VisibilityExtender:
+    def __init__(self, client: Any, queue_url: str, visibility_timeout: int) -> None:
+        self.client = client
+        self.queue_url = queue_url
+        self.visibility_timeout = visibility_timeout
+        self.receipt_handles = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def add(self, messages: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self.receipt_handles.update((m['MessageId'], m['ReceiptHandle']) for m in messages)
+
+    def remove(self, messages: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            for message in messages:
+                self.receipt_handles.pop(message['MessageId'], None)
+
+    def release(self, messages: List[Dict[str, Any]]) -> None:
+        self.remove(messages)
+        change_visibility(self.client, self.queue_url, messages, 0)
+
+    def extend(self) -> None:
+        with self._lock:
+            messages = [{'MessageId': k, 'ReceiptHandle': v}
+                        for k, v in self.receipt_handles.items()]
+        change_visibility(self.client, self.queue_url, messages, self.visibility_timeout)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.visibility_timeout / 2.0):
+            try:
+                self.extend()
+            except Exception as e:
+                logger.warning(f'Failed to extend message visibility: {e}')
+
+
+class Prefetcher:
+    def __init__(self, client: Any, queue_url: str, config: Dict[str, Any],
+                 extender: VisibilityExtender) -> None:
+        self.client = client
+        self.queue_url = queue_url
+        self.config = config
+        self.extender = extender
+        self.batches = queue.Queue(maxsize=max(1, config['prefetch']))
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> List[Dict[str, Any]]:
+        self._stopped.set()
+        self._thread.join(self.config['wait_seconds'] + SHUTDOWN_GRACE_SECONDS)
+        pending = []
+        while True:
+            try:
+                pending.extend(self.batches.get_nowait())
+            except queue.Empty:
+                return pending
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                messages = self.client.receive_message(
+                    QueueUrl=self.queue_url,
+                    MaxNumberOfMessages=self.config['batch_size'],
+                    WaitTimeSeconds=self.config['wait_seconds'],
+                    VisibilityTimeout=self.config['visibility_timeout'],
+                    AttributeNames=[SENT_TIMESTAMP_ATTRIBUTE],
+                    MessageAttributeNames=[TRACE_ATTRIBUTE]
+                ).get('Messages', [])
+            except Exception as e:
+                logger.warning(f'Failed to receive messages: {e}')
+                self._stopped.wait(1.0)
+                continue
+            if not messages:
+                continue
+            self.extender.add(messages)
+            while True:
+                try:
+                    self.batches.put(messages, timeout=SUPERVISOR_INTERVAL_SECONDS)
+                    break
+                except queue.Full:
+                    if self._stopped.is_set():
+                        self.extender.release(messages)
+                        return
+
+
+def run_worker(index: int, config: Dict[str, Any], stop_event: Any, counters: Any,
+               client_factory: Callable[[], Any] = get_sqs_client,
+               processor: Optional[Callable[..., List[str]]] = None) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    serve(index, config, stop_event, counters, client_factory, processor)
+
+
+def serve(index: int, config: Dict[str, Any], stop_event: Any, counters: Any,
+          client_factory: Callable[[], Any] = get_sqs_client,
+          processor: Optional[Callable[..., List[str]]] = None) -> None:
+    process = processor or PROCESSORS[config['stage']]
+    client = client_factory()
+    queue_url = client.get_queue_url(QueueName=config['queue_name'])['QueueUrl']
+    caches = create_caches(config, index)
+    extender = VisibilityExtender(client, queue_url, config['visibility_timeout'])
+    prefetcher = Prefetcher(client, queue_url, config, extender)
+    extender.start()
+    prefetcher.start()
+    logger.info(f'Worker {index} polling {config["queue_name"]}')
+
+    batches = 0
+    while not stop_event.is_set():
+        try:
+            messages = prefetcher.batches.get(timeout=SUPERVISOR_INTERVAL_SECONDS)
+        except queue.Empty:
+            continue
+        records = [{'messageId': m['MessageId'], 'receiptHandle': m['ReceiptHandle'],
+                    'body': m['Body'], 'attributes': m.get('Attributes', {}),
+                    'messageAttributes': m.get('MessageAttributes', {})} for m in messages]
+        try:
+            failed = set(process(records, config, caches))
+        except Exception as e:
+            logger.warning(f'Worker {index} failed to process batch: {e}')
+            failed = {m['MessageId'] for m in messages}
+        delete_messages(client, queue_url, [m for m in messages if m['MessageId'] not in failed])
+        extender.remove(messages)
+        flush_metrics(emit=config['emf_metrics'])
+        with counters.get_lock():
+            counters[0] += 1
+            counters[1] += len(messages)
+            counters[2] += len(failed)
+        batches += 1
+        if batches % SAVE_EVERY_BATCHES == 0:
+            save_caches(caches)
+
+    logger.info(f'Worker {index} shutting down')
+    pending = prefetcher.stop()
+    if pending:
+        extender.release(pending)
+    extender.stop()
+    save_caches(caches)
+
+
+def supervise(config: Dict[str, Any], workers: int, duration: Optional[float] = None,
+              max_records: Optional[int] = None,
+              client_factory: Callable[[], Any] = get_sqs_client,
+              processor: Optional[Callable[..., List[str]]] = None) -> Dict[str, int]:
+    context = multiprocessing.get_context('spawn')
+    stop_event = context.Event()
+    counters = context.Array('q', len(COUNTERS))
+
+    started_at = {}
+
+    def start(index: int) -> Any:
+        process = context.Process(target=run_worker, name=f'rumor-worker-{index}',
+                                  args=(index, config, stop_event, counters,
+                                        client_factory, processor))
+        process.start()
+        started_at[index] = time.monotonic()
+        return process
+
+    handlers = {signum: signal.signal(signum, lambda signum, frame: stop_event.set())
+                for signum in (signal.SIGINT, signal.SIGTERM)}
+    try:
+        processes = [start(index) for index in range(workers)]
+        deadline = None if duration is None else time.monotonic() + duration
+        while not stop_event.wait(SUPERVISOR_INTERVAL_SECONDS):
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            if max_records is not None and counters[1] >= max_records:
+                break
+            for index, process in enumerate(processes):
+                if not process.is_alive() and \
+                        time.monotonic() - started_at[index] >= RESTART_DELAY_SECONDS:
+                    logger.warning(f'Worker {index} exited with {process.exitcode}, restarting')
+                    processes[index] = start(index)
+        stop_event.set()
+        for process in processes:
+            process.join(config['wait_seconds'] + SHUTDOWN_GRACE_SECONDS)
+            if process.is_alive():
+                logger.warning(f'Terminating {process.name}')
+                process.terminate()
+                process.join()
+    finally:
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+    return dict(zip(COUNTERS, counters[:]))
+
+
+def change_visibility(client: Any, queue_url: str, messages: List[Dict[str, Any]],
+                      visibility_timeout: int) -> None:
+    for i in range(0, len(messages), MAX_BATCH_SIZE):
+        client.change_message_visibility_batch(QueueUrl=queue_url, Entries=[
+            {'Id': str(j), 'ReceiptHandle': m['ReceiptHandle'],
+             'VisibilityTimeout': visibility_timeout}
+            for j, m in enumerate(messages[i:i + MAX_BATCH_SIZE])
+        ])
+
+
+def delete_messages(client: Any, queue_url: str, messages: List[Dict[str, Any]]) -> None:
+    for i in range(0, len(messages), MAX_BATCH_SIZE):
+        client.delete_message_batch(QueueUrl=queue_url, Entries=[
+            {'Id': str(j), 'ReceiptHandle': m['ReceiptHandle']}
+            for j, m in enumerate(messages[i:i + MAX_BATCH_SIZE])
+        ])
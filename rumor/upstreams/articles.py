@@ -0,0 +1,108 @@
+import codecs
+import threading
+import time
+from typing import Callable, Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from logzero import logger
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+
+from rumor.exceptions import UpstreamError
+
+CONNECT_TIMEOUT_SECONDS = 2.0
+READ_TIMEOUT_SECONDS = 2.0
+CHUNK_BYTES = 8192
+POOL_CONNECTIONS = 16
+POOL_MAXSIZE = 32
+PER_DOMAIN_CONCURRENCY = 2
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+HEADERS = {'User-Agent': 'rumor-enrichment/1.0', 'Accept': 'text/html'}
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_domain_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+_domain_semaphores_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
+
+
+def get_domain_semaphore(host: str) -> threading.BoundedSemaphore:
+    with _domain_semaphores_lock:
+        if host not in _domain_semaphores:
+            _domain_semaphores[host] = threading.BoundedSemaphore(PER_DOMAIN_CONCURRENCY)
+        return _domain_semaphores[host]
+
+
+def reset_article_session() -> None:
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+    with _domain_semaphores_lock:
+        _domain_semaphores.clear()
+
+
+def stream_article(url: str, max_bytes: int, deadline: float,
+                   consume: Callable[[str], bool]) -> int:
+    parts = urlparse(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        return 0
+    semaphore = get_domain_semaphore(parts.hostname)
+    if not semaphore.acquire(timeout=max(0.0, deadline - time.monotonic())):
+        raise UpstreamError(f'GET {url} skipped: budget exhausted waiting for {parts.hostname}')
+    try:
+        return _stream(url, max_bytes, deadline, consume)
+    finally:
+        semaphore.release()
+
+
+def _stream(url: str, max_bytes: int, deadline: float,
+            consume: Callable[[str], bool]) -> int:
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise UpstreamError(f'GET {url} skipped: budget exhausted')
+    timeout = (min(CONNECT_TIMEOUT_SECONDS, remaining), min(READ_TIMEOUT_SECONDS, remaining))
+    read = 0
+    try:
+        with get_session().get(url, headers=HEADERS, stream=True, timeout=timeout) as response:
+            if response.status_code != 200:
+                raise UpstreamError(f'GET {url} returned status code {response.status_code}')
+            content_type = response.headers.get('Content-Type', '')
+            if content_type.split(';')[0].strip().lower() not in HTML_CONTENT_TYPES:
+                return 0
+            decoder = codecs.getincrementaldecoder(_get_encoding(content_type))(errors='replace')
+            for chunk in response.iter_content(CHUNK_BYTES):
+                chunk = chunk[:max_bytes - read]
+                read += len(chunk)
+                if not consume(decoder.decode(chunk)):
+                    break
+                if read >= max_bytes or time.monotonic() >= deadline:
+                    break
+            consume(decoder.decode(b'', final=True))
+    except RequestException as e:
+        logger.info(f'GET {url} failed: {e}')
+        raise UpstreamError(f'GET {url} failed: {e}')
+    return read
+
+
+def _get_encoding(content_type: str) -> str:
+    for parameter in content_type.split(';')[1:]:
+        name, _, value = parameter.partition('=')
+        if name.strip().lower() == 'charset':
+            try:
+                return codecs.lookup(value.strip().strip('"\'')).name
+            except LookupError:
+                break
+    return 'utf-8'
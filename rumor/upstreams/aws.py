@@ -1,36 +1,85 @@
+import gzip
 import json
-import math
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from decimal import Decimal
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List, Optional, Set
 
 import boto3
 import boto3.dynamodb.types
-from boto3.dynamodb.conditions import Attr
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
 from logzero import logger
 
+from rumor.exceptions import UpstreamError
+from rumor.upstreams.packing import MAX_MESSAGE_BYTES, pack_messages
+from rumor.upstreams.query_planning import plan_day_queries, plan_range_queries
+from rumor.upstreams.rate_control import get_rate_controller
+from rumor.upstreams.sharding import unshard_item
+from rumor.upstreams.tracing import SENT_TIMESTAMP_ATTRIBUTE, TRACE_ATTRIBUTE
 
-def send_messages(messages: List[Dict[str, str]], queue_name: str,
-                  batch_size: int = 10) -> None:
+DYNAMODB_RATE_LIMIT = {'rate': 1.0, 'burst': 5.0, 'max_rate': 40.0}
+DYNAMODB_CONFIG = Config(retries={'max_attempts': 0, 'mode': 'standard'})
+
+
+def send_messages(messages: List[Dict[str, Any]], queue_name: str,
+                  batch_size: int = 10, pack: bool = False,
+                  compress: bool = False,
+                  message_attributes: Optional[Dict[str, Any]] = None) -> None:
     sqs = boto3.resource('sqs')
     client = boto3.client('sqs')
     queue = sqs.get_queue_by_name(QueueName=queue_name)
 
+    attribute_bytes = get_attribute_bytes(message_attributes)
+    if pack:
+        bodies = pack_messages(messages, max_bytes=MAX_MESSAGE_BYTES - attribute_bytes,
+                               compress=compress)
+    else:
+        bodies = [json.dumps(msg) for msg in messages]
     entries = [{
         'Id': f'{i}',
-        'MessageBody': json.dumps(msg)
-    } for i, msg in enumerate(messages)]
+        'MessageBody': body
+    } for i, body in enumerate(bodies)]
+    if message_attributes:
+        for entry in entries:
+            entry['MessageAttributes'] = message_attributes
 
-    num_segments = math.ceil(len(messages)/float(batch_size))
-    for k in range(num_segments):
-        i = k*batch_size
-        j = i+batch_size
+    for batch in batch_entries(entries, batch_size):
         client.send_message_batch(
             QueueUrl=queue.url,
-            Entries=entries[i:j]
+            Entries=batch
         )
 
 
+def batch_entries(entries: List[Dict[str, Any]], batch_size: int,
+                  max_bytes: int = MAX_MESSAGE_BYTES,
+                  body_key: str = 'MessageBody',
+                  entry_bytes: int = 0) -> List[List[Dict[str, Any]]]:
+    batches = []
+    batch = []
+    batch_bytes = 0
+    for entry in entries:
+        size = len(entry[body_key].encode('utf-8')) + entry_bytes + \
+            get_attribute_bytes(entry.get('MessageAttributes'))
+        if batch and (len(batch) >= batch_size or batch_bytes + size > max_bytes):
+            batches.append(batch)
+            batch = []
+            batch_bytes = 0
+        batch.append(entry)
+        batch_bytes += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def get_attribute_bytes(message_attributes: Optional[Dict[str, Any]]) -> int:
+    if not message_attributes:
+        return 0
+    return sum(len(name.encode('utf-8')) + len(attribute['DataType'].encode('utf-8')) +
+               len(attribute.get('StringValue', '').encode('utf-8'))
+               for name, attribute in message_attributes.items())
+
+
 def get_messages(queue_name: str, batch_size: int = 10) -> List[Dict[str, Any]]:
     sqs = boto3.resource('sqs')
     client = boto3.client('sqs')
@@ -38,7 +87,9 @@ def get_messages(queue_name: str, batch_size: int = 10) -> List[Dict[str, Any]]:
 
     response = client.receive_message(QueueUrl=queue.url,
                                       MaxNumberOfMessages=batch_size,
-                                      WaitTimeSeconds=0)
+                                      WaitTimeSeconds=0,
+                                      AttributeNames=[SENT_TIMESTAMP_ATTRIBUTE],
+                                      MessageAttributeNames=[TRACE_ATTRIBUTE])
     return response.get('Messages', [])
 
 
@@ -52,44 +103,144 @@ def delete_messages(messages: List[Dict[str, Any]], queue_name: str):
 
 
 def store_item(item: Dict[str, Any], table_name: str) -> None:
-    dynamodb = boto3.resource('dynamodb')
+    dynamodb = boto3.resource('dynamodb', config=DYNAMODB_CONFIG)
     table = dynamodb.Table(table_name)
-    table.put_item(Item=item)
+    controller = get_table_rate_controller(table_name)
+    controller.call(table.put_item, Item=item, ReturnConsumedCapacity='TOTAL')
+
+
+def update_news_item(item: Dict[str, Any], attribute_names: List[str], fingerprint: str,
+                     news_item_table_name: str,
+                     previous_fingerprint: Optional[str] = None) -> bool:
+    dynamodb = boto3.resource('dynamodb', config=DYNAMODB_CONFIG)
+    table = dynamodb.Table(news_item_table_name)
+    controller = get_table_rate_controller(news_item_table_name)
+    names = {f'#a{i}': name for i, name in enumerate(attribute_names)}
+    values = {f':a{i}': item[name] for i, name in enumerate(attribute_names)}
+    names['#fingerprint'] = 'fingerprint'
+    values[':fingerprint'] = fingerprint
+    if previous_fingerprint is None:
+        condition = 'attribute_not_exists(#fingerprint) OR #fingerprint <> :fingerprint'
+    else:
+        condition = '#fingerprint = :previous_fingerprint'
+        values[':previous_fingerprint'] = previous_fingerprint
+    try:
+        controller.call(
+            table.update_item,
+            Key={'created_at_date': item['created_at_date'], 'news_item_id': item['news_item_id']},
+            UpdateExpression='SET {}'.format(', '.join(
+                [f'{name} = {name.replace("#", ":")}' for name in names])),
+            ConditionExpression=condition,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ReturnConsumedCapacity='TOTAL'
+        )
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+            return False
+        raise
+    return True
 
 
 def get_news_items(news_item_table_name: str, created_at_from: datetime,
-                   created_at_to: datetime) -> List[Dict[str, Any]]:
-    client = boto3.client('dynamodb')
-    paginator = client.get_paginator('query')
-    number_of_queries = math.ceil((created_at_to - created_at_from).total_seconds() / 86400.0) + 1
-    _now = datetime.now()
-    partition_keys = [str((_now - timedelta(days=d)).date()) for d in range(number_of_queries)]
+                   created_at_to: datetime, shards: int = 1,
+                   max_workers: int = 8) -> List[Dict[str, Any]]:
+    client = boto3.client('dynamodb', config=DYNAMODB_CONFIG)
     operation_parameters_list = [{
         'TableName': news_item_table_name,
         'IndexName': 'LSI',
         'KeyConditionExpression': ('created_at_date = :created_at_date AND '
                                    'created_at BETWEEN :ca_from AND :ca_to'),
         'ExpressionAttributeValues': {
-            ':created_at_date': {'S': pk},
-            ':ca_from': {'N': str(created_at_from.timestamp())},
-            ':ca_to': {'N': str(created_at_to.timestamp())},
+            ':created_at_date': {'S': query['partition_key']},
+            ':ca_from': {'N': str(query['range_from'])},
+            ':ca_to': {'N': str(query['range_to'])},
         }
-    } for pk in partition_keys]
-    items = []
+    } for query in plan_day_queries(created_at_from, created_at_to, shards)]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(lambda parameters: list(query_items(client, parameters)),
+                               operation_parameters_list)
+        items = [unshard_item(item) for result in results for item in result]
+
+    logger.info('Found {} news items to evaluate in {} queries'.format(
+        len(items), len(operation_parameters_list)))
+    return items
+
+
+def scan_items(table_name: str) -> Iterator[List[Dict[str, Any]]]:
+    dynamodb = boto3.resource('dynamodb', config=DYNAMODB_CONFIG)
+    table = dynamodb.Table(table_name)
+    controller = get_table_rate_controller(table_name)
+    parameters = {'ReturnConsumedCapacity': 'TOTAL'}
+    while True:
+        page = controller.call(table.scan, **parameters)
+        yield page['Items']
+        if 'LastEvaluatedKey' not in page:
+            break
+        parameters['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+
+def read_table_export(paths: List[str], batch_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
     deserializer = boto3.dynamodb.types.TypeDeserializer()
-    for operation_parameters in operation_parameters_list:
-        page_iterator = paginator.paginate(**operation_parameters)
-        for page in page_iterator:
-            for item in page['Items']:
-                items.append(deserializer.deserialize({'M': item}))
+    batch = []
+    for path in paths:
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                batch.append(unshard_item(deserializer.deserialize({'M': record.get('Item', record)})))
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+    if batch:
+        yield batch
+
 
-    logger.info('Found {} news items to evaluate'.format(len(items)))
+def get_items_by_keys(table_name: str, keys: List[Dict[str, Any]],
+                      batch_size: int = 100) -> List[Dict[str, Any]]:
+    dynamodb = boto3.resource('dynamodb', config=DYNAMODB_CONFIG)
+    controller = get_table_rate_controller(table_name)
+    items = []
+    for i in range(0, len(keys), batch_size):
+        pending = keys[i:i + batch_size]
+        for _ in range(controller.max_attempts):
+            response = controller.call(
+                dynamodb.batch_get_item,
+                RequestItems={table_name: {'Keys': pending}},
+                ReturnConsumedCapacity='TOTAL'
+            )
+            items.extend(response['Responses'].get(table_name, []))
+            pending = response.get('UnprocessedKeys', {}).get(table_name, {}).get('Keys', [])
+            if not pending:
+                break
+            controller.on_throttle()
+        else:
+            raise UpstreamError(f'{len(pending)} keys still unprocessed in {table_name}')
     return items
 
 
+def query_items(client: Any, operation_parameters: Dict[str, Any]
+                ) -> Iterator[Dict[str, Any]]:
+    controller = get_table_rate_controller(operation_parameters['TableName'])
+    deserializer = boto3.dynamodb.types.TypeDeserializer()
+    parameters = dict(operation_parameters, ReturnConsumedCapacity='TOTAL')
+    while True:
+        page = controller.call(client.query, **parameters)
+        for item in page['Items']:
+            yield deserializer.deserialize({'M': item})
+        if 'LastEvaluatedKey' not in page:
+            break
+        parameters['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+
+def get_table_rate_controller(table_name: str):
+    return get_rate_controller(f'dynamodb:{table_name}', **DYNAMODB_RATE_LIMIT)
+
+
 def get_preferences(preference_table_name: str):
-    client = boto3.client('dynamodb')
-    paginator = client.get_paginator('query')
+    client = boto3.client('dynamodb', config=DYNAMODB_CONFIG)
     operation_parameters = {
         'TableName': preference_table_name,
         'KeyConditionExpression': 'preference_type = :preference_type',
@@ -97,12 +248,7 @@ def get_preferences(preference_table_name: str):
             ':preference_type': {'S': 'KEYWORD'}
         }
     }
-    items = []
-    deserializer = boto3.dynamodb.types.TypeDeserializer()
-    page_iterator = paginator.paginate(**operation_parameters)
-    for page in page_iterator:
-        for item in page['Items']:
-            items.append(deserializer.deserialize({'M': item}))
+    items = list(query_items(client, operation_parameters))
 
     logger.info('Found {} keywords'.format(len(items)))
     return items
@@ -117,15 +263,130 @@ def store_preference(keyword: str, weight: float, preference_table_name: str):
     return store_item(preference_item, preference_table_name)
 
 
-def send_notification(msg: str, topic_arn_hint: str, subject: str) -> None:
+def store_preferences(weights: Dict[str, Decimal], preference_table_name: str,
+                      max_workers: int = 4) -> None:
+    write_requests = [{'PutRequest': {'Item': {
+        'preference_type': 'KEYWORD',
+        'preference_key': keyword,
+        'preference_weight': weight
+    }}} for keyword, weight in weights.items()]
+    batch_write_items(write_requests, preference_table_name, max_workers=max_workers)
+
+
+def delete_preferences(keywords: List[str], preference_table_name: str,
+                       max_workers: int = 4) -> None:
+    write_requests = [{'DeleteRequest': {'Key': {
+        'preference_type': 'KEYWORD',
+        'preference_key': keyword
+    }}} for keyword in keywords]
+    batch_write_items(write_requests, preference_table_name, max_workers=max_workers)
+
+
+def batch_write_items(write_requests: List[Dict[str, Any]], table_name: str,
+                      batch_size: int = 25, max_workers: int = 4) -> None:
+    dynamodb = boto3.resource('dynamodb', config=DYNAMODB_CONFIG)
+    controller = get_table_rate_controller(table_name)
+
+    def write(batch: List[Dict[str, Any]]) -> None:
+        for _ in range(controller.max_attempts):
+            response = controller.call(
+                dynamodb.batch_write_item,
+                RequestItems={table_name: batch},
+                ReturnConsumedCapacity='TOTAL'
+            )
+            batch = response.get('UnprocessedItems', {}).get(table_name, [])
+            if not batch:
+                return
+            controller.on_throttle()
+        raise UpstreamError(f'{len(batch)} writes still unprocessed in {table_name}')
+
+    batches = [write_requests[i:i + batch_size]
+               for i in range(0, len(write_requests), batch_size)]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(write, batches))
+
+
+def get_subscriber_preferences(preference_table_name: str) -> List[Dict[str, Any]]:
+    client = boto3.client('dynamodb', config=DYNAMODB_CONFIG)
+    operation_parameters = {
+        'TableName': preference_table_name,
+        'KeyConditionExpression': 'preference_type = :preference_type',
+        'ExpressionAttributeValues': {
+            ':preference_type': {'S': 'SUBSCRIBER_KEYWORD'}
+        }
+    }
+    items = list(query_items(client, operation_parameters))
+
+    logger.info('Found {} subscriber keywords'.format(len(items)))
+    return items
+
+
+def store_subscriber_preference(subscriber: str, keyword: str, weight: float,
+                                preference_table_name: str):
+    preference_item = {
+        'preference_type': 'SUBSCRIBER_KEYWORD',
+        'preference_key': f'{subscriber}#{keyword}',
+        'subscriber': subscriber,
+        'keyword': keyword,
+        'preference_weight': Decimal(str(weight))
+    }
+    return store_item(preference_item, preference_table_name)
+
+
+def send_notification(msg: str, topic_arn_hint: str, subject: str,
+                      message_attributes: Optional[Dict[str, Any]] = None) -> None:
     client = boto3.client('sns')
-    topics = client.list_topics()['Topics']
-    topic_arn = get_topic_arn(topics, topic_arn_hint)
-    client.publish(
-        Subject=subject,
-        Message=msg,
-        TopicArn=topic_arn
-    )
+    topic_arn = resolve_topic_arn(topic_arn_hint)
+    publish_parameters = {
+        'Subject': subject,
+        'Message': msg,
+        'TopicArn': topic_arn
+    }
+    if message_attributes:
+        publish_parameters['MessageAttributes'] = message_attributes
+    client.publish(**publish_parameters)
+
+
+def publish_notifications(entries: List[Dict[str, Any]], topic_arn: str,
+                          max_workers: int = 4) -> Set[str]:
+    client = boto3.client('sns')
+    batches = batch_entries(entries, batch_size=10, body_key='Message')
+
+    def publish(batch: List[Dict[str, Any]]) -> List[str]:
+        try:
+            response = client.publish_batch(TopicArn=topic_arn,
+                                            PublishBatchRequestEntries=batch)
+        except (ClientError, BotoCoreError) as e:
+            logger.warning('Failed to publish {} entries to {}: {}'.format(
+                len(batch), topic_arn, e))
+            return []
+        for failure in response.get('Failed', []):
+            logger.warning('Failed to publish {}: {}'.format(
+                failure['Id'], failure.get('Message', failure.get('Code'))))
+        return [success['Id'] for success in response.get('Successful', [])]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(publish, batches)
+        return {entry_id for ids in results for entry_id in ids}
+
+
+_topic_arns: Dict[str, str] = {}
+
+
+def resolve_topic_arn(topic_arn_hint: str) -> str:
+    if topic_arn_hint not in _topic_arns:
+        client = boto3.client('sns')
+        paginator = client.get_paginator('list_topics')
+        topics = [topic for page in paginator.paginate() for topic in page['Topics']]
+        topic_arn = get_topic_arn(topics, topic_arn_hint)
+        if topic_arn is None:
+            raise UpstreamError(f'No topic matching "{topic_arn_hint}"')
+        _topic_arns[topic_arn_hint] = topic_arn
+    return _topic_arns[topic_arn_hint]
+
+
+def reset_topic_arns() -> None:
+    _topic_arns.clear()
 
 
 def get_topic_arn(topics: List[Dict[str, Any]], topic_arn_hint: str) -> str:
@@ -134,16 +395,60 @@ def get_topic_arn(topics: List[Dict[str, Any]], topic_arn_hint: str) -> str:
             return topic['TopicArn']
 
 
-def get_reports(evaluation_report_table_name: str, created_at_from: datetime,
-                created_at_to: datetime) -> List[Dict[str, Any]]:
-    dynamodb = boto3.resource('dynamodb')
+def mark_report_delivered(report: Dict[str, Any], delivery_keys: Set[str],
+                          evaluation_report_table_name: str) -> None:
+    dynamodb = boto3.resource('dynamodb', config=DYNAMODB_CONFIG)
     table = dynamodb.Table(evaluation_report_table_name)
-
-    response = table.scan(
-        FilterExpression=(
-            Attr('created_at').gte(Decimal(created_at_from.timestamp())) &
-            Attr('created_at').lt(Decimal(created_at_to.timestamp()))
-        )
+    controller = get_table_rate_controller(evaluation_report_table_name)
+    controller.call(
+        table.update_item,
+        Key={'version': report['version'], 'created_at': report['created_at']},
+        UpdateExpression='ADD delivered :delivery_keys',
+        ExpressionAttributeValues={':delivery_keys': set(delivery_keys)},
+        ReturnConsumedCapacity='TOTAL'
     )
 
-    return response['Items']
+
+def get_reports(evaluation_report_table_name: str, created_at_from: datetime,
+                created_at_to: datetime, versions: List[str]) -> List[Dict[str, Any]]:
+    client = boto3.client('dynamodb', config=DYNAMODB_CONFIG)
+    items = []
+    for query in plan_range_queries(versions, created_at_from, created_at_to, inclusive=False):
+        items.extend(query_items(client, {
+            'TableName': evaluation_report_table_name,
+            'KeyConditionExpression': ('version = :version AND '
+                                       'created_at BETWEEN :ca_from AND :ca_to'),
+            'ExpressionAttributeValues': {
+                ':version': {'S': query['partition_key']},
+                ':ca_from': {'N': str(query['range_from'])},
+                ':ca_to': {'N': str(query['range_to'])},
+            }
+        }))
+    return items
+
+
+def get_trend_buckets(trend_table_name: str, trend_dates: List[str]) -> List[Dict[str, Any]]:
+    if not trend_dates:
+        return []
+    return get_items_by_keys(trend_table_name,
+                             [{'trend_date': trend_date} for trend_date in trend_dates])
+
+
+def store_trend_bucket(item: Dict[str, Any], trend_table_name: str,
+                       previous_version: Optional[int] = None) -> bool:
+    dynamodb = boto3.resource('dynamodb', config=DYNAMODB_CONFIG)
+    table = dynamodb.Table(trend_table_name)
+    controller = get_table_rate_controller(trend_table_name)
+    if previous_version is None:
+        condition = {'ConditionExpression': 'attribute_not_exists(trend_date)'}
+    else:
+        condition = {'ConditionExpression': '#version = :previous_version',
+                     'ExpressionAttributeNames': {'#version': 'version'},
+                     'ExpressionAttributeValues': {':previous_version': previous_version}}
+    try:
+        controller.call(table.put_item, Item=item, ReturnConsumedCapacity='TOTAL', **condition)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+            return False
+        raise
+    return True
@@ -1,32 +1,104 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List
 
 import requests
 from logzero import logger
+from requests.exceptions import RequestException
 
-from rumor.exceptions import UpstreamError
+from rumor.exceptions import ThrottledError, UpstreamError
+from rumor.upstreams.rate_control import get_rate_controller
+from rumor.upstreams.resilience import (CircuitBreaker, LatencyTracker,
+                                        hedged_call)
+
+HACKER_NEWS_RATE_LIMIT = {'rate': 10.0, 'burst': 10.0, 'max_rate': 50.0}
+REQUEST_TIMEOUT_SECONDS = 3.0
+HEDGE_PERCENTILE = 95
+HEDGE_MIN_SAMPLES = 20
+HEDGE_DEFAULT_SECONDS = 1.0
+HEDGE_WORKERS_PER_CALLER = 2
+DEFAULT_CALLER_CONCURRENCY = 10
+
+_executor_workers = HEDGE_WORKERS_PER_CALLER * DEFAULT_CALLER_CONCURRENCY
+_executor = ThreadPoolExecutor(max_workers=_executor_workers)
+_executor_lock = threading.Lock()
+_latency_tracker = LatencyTracker()
+_circuit_breakers: Dict[str, CircuitBreaker] = {}
+_circuit_breakers_lock = threading.Lock()
 
 
 def get_news_items(target_api_url: str) -> List[int]:
     endpoint = '/v0/topstories'
     api_url = f'{target_api_url}{endpoint}.json'
-    response = requests.get(api_url)
-    status_code = response.status_code
-    if status_code != 200:
-        error_msg = f"GET {api_url} returned status code {status_code}"
-        logger.info(error_msg)
-        raise UpstreamError(error_msg)
-    return response.json()
+    return _get_json(api_url, target_api_url)
 
 
 def news_item_source_request(news_item_id: str,
                              target_api_url: str) -> Dict[str, Any]:
     endpoint = f'/v0/item/{news_item_id}'
     api_url = f'{target_api_url}{endpoint}.json'
-    response = requests.get(api_url)
+    return _get_json(api_url, target_api_url)
+
+
+def get_latency_stats() -> Dict[str, Any]:
+    stats = _latency_tracker.stats()
+    stats['circuits'] = {url: breaker.state
+                         for url, breaker in _circuit_breakers.items()}
+    return stats
+
+
+def set_caller_concurrency(concurrency: int) -> None:
+    global _executor, _executor_workers
+    max_workers = HEDGE_WORKERS_PER_CALLER * max(concurrency, 1)
+    with _executor_lock:
+        if max_workers == _executor_workers:
+            return
+        previous = _executor
+        _executor = ThreadPoolExecutor(max_workers=max_workers)
+        _executor_workers = max_workers
+    previous.shutdown(wait=False)
+
+
+def get_circuit_breaker(target_api_url: str) -> CircuitBreaker:
+    with _circuit_breakers_lock:
+        if target_api_url not in _circuit_breakers:
+            _circuit_breakers[target_api_url] = CircuitBreaker()
+        return _circuit_breakers[target_api_url]
+
+
+def reset_circuit_breakers() -> None:
+    with _circuit_breakers_lock:
+        _circuit_breakers.clear()
+
+
+def _get_json(api_url: str, target_api_url: str) -> Any:
+    controller = get_rate_controller(f'hacker_news:{target_api_url}',
+                                     **HACKER_NEWS_RATE_LIMIT)
+    breaker = get_circuit_breaker(target_api_url)
+    response = breaker.call(controller.call, _hedged_get, api_url)
+    return response.json()
+
+
+def _hedged_get(api_url: str) -> requests.Response:
+    hedge_after = _latency_tracker.percentile(HEDGE_PERCENTILE,
+                                              default=HEDGE_DEFAULT_SECONDS,
+                                              min_samples=HEDGE_MIN_SAMPLES)
+    return hedged_call(_executor, _get, api_url, hedge_after=hedge_after,
+                       tracker=_latency_tracker)
+
+
+def _get(api_url: str) -> requests.Response:
+    try:
+        response = requests.get(api_url, timeout=REQUEST_TIMEOUT_SECONDS)
+    except RequestException as e:
+        error_msg = f"GET {api_url} failed: {e}"
+        logger.info(error_msg)
+        raise UpstreamError(error_msg)
     status_code = response.status_code
+    if status_code == 429:
+        raise ThrottledError(f"GET {api_url} was throttled")
     if status_code != 200:
         error_msg = f"GET {api_url} returned status code {status_code}"
         logger.info(error_msg)
         raise UpstreamError(error_msg)
-
-    return response.json()
+    return response
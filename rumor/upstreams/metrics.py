@@ -0,0 +1,126 @@
+import json
+import math
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, TextIO, Tuple
+
+NAMESPACE = 'Rumor'
+MAX_EMF_VALUES = 100
+BUCKET_BASE = 0.001
+BUCKET_RATIO = 1.25
+
+_lock = threading.Lock()
+_pending: Dict[Tuple[str, str], List[float]] = defaultdict(list)
+_histograms: Dict[Tuple[str, str], 'Histogram'] = {}
+
+
+class Histogram:
+    def __init__(self) -> None:
+        self.buckets = Counter()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        self.buckets[get_bucket(value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, p: float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = max(1, math.ceil(p / 100.0 * self.count))
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(get_bucket_bound(bucket), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max
+        }
+
+
+def get_bucket(value: float) -> int:
+    if value <= BUCKET_BASE:
+        return 0
+    return math.ceil(math.log(value / BUCKET_BASE) / math.log(BUCKET_RATIO))
+
+
+def get_bucket_bound(bucket: int) -> float:
+    return BUCKET_BASE * BUCKET_RATIO ** bucket
+
+
+def record_metric(stage: str, name: str, value: Optional[float]) -> None:
+    if value is None:
+        return
+    value = max(0.0, float(value))
+    with _lock:
+        _pending[(stage, name)].append(value)
+        _histograms.setdefault((stage, name), Histogram()).add(value)
+
+
+def flush_metrics(emit: bool = True, namespace: str = NAMESPACE,
+                  stream: Optional[TextIO] = None) -> int:
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+    if not emit or not pending:
+        return 0
+    documents = get_emf_documents(pending, namespace, int(time.time() * 1000))
+    stream = stream or sys.stdout
+    for document in documents:
+        stream.write(json.dumps(document, separators=(',', ':')) + '\n')
+    stream.flush()
+    return len(documents)
+
+
+def get_emf_documents(pending: Dict[Tuple[str, str], List[float]], namespace: str,
+                      timestamp: int) -> List[Dict[str, Any]]:
+    stages = defaultdict(dict)
+    for (stage, name), values in pending.items():
+        stages[stage][name] = values
+    documents = []
+    for stage, metrics in sorted(stages.items()):
+        chunks = max(math.ceil(len(values) / MAX_EMF_VALUES) for values in metrics.values())
+        for chunk in range(chunks):
+            document = {'Stage': stage}
+            for name, values in sorted(metrics.items()):
+                chunk_values = values[chunk * MAX_EMF_VALUES:(chunk + 1) * MAX_EMF_VALUES]
+                if chunk_values:
+                    document[name] = [round(value, 3) for value in chunk_values]
+            document['_aws'] = {
+                'Timestamp': timestamp,
+                'CloudWatchMetrics': [{
+                    'Namespace': namespace,
+                    'Dimensions': [['Stage']],
+                    'Metrics': [{'Name': name, 'Unit': 'Seconds'}
+                                for name in sorted(document) if name != 'Stage']
+                }]
+            }
+            documents.append(document)
+    return documents
+
+
+def get_metrics_report() -> Dict[str, Dict[str, Dict[str, float]]]:
+    report = defaultdict(dict)
+    with _lock:
+        for (stage, name), histogram in sorted(_histograms.items()):
+            report[stage][name] = histogram.summary()
+    return dict(report)
+
+
+def reset_metrics() -> None:
+    with _lock:
+        _pending.clear()
+        _histograms.clear()
@@ -0,0 +1,69 @@
+import base64
+import json
+import zlib
+from typing import Any, Dict, List, Optional
+
+MAX_MESSAGE_BYTES = 256 * 1024
+MAX_ITEMS_PER_MESSAGE = 10
+PACKED_FORMAT = 'rumor-packed-1'
+COMPRESSED_ENCODING = 'zlib+base64'
+COMPRESSION_HEADROOM = 4
+
+
+def pack_messages(messages: List[Dict[str, Any]],
+                  max_bytes: int = MAX_MESSAGE_BYTES,
+                  max_items: Optional[int] = MAX_ITEMS_PER_MESSAGE,
+                  compress: bool = False) -> List[str]:
+    raw_limit = max_bytes * COMPRESSION_HEADROOM if compress else max_bytes
+    overhead = len(_encode([], compress=False))
+    bodies = []
+    chunk = []
+    chunk_size = overhead
+    for message in messages:
+        size = len(_dumps(message).encode('utf-8')) + 1
+        chunk_full = max_items is not None and len(chunk) >= max_items
+        if chunk and (chunk_full or chunk_size + size > raw_limit):
+            bodies.extend(_fit(chunk, max_bytes, compress))
+            chunk = []
+            chunk_size = overhead
+        chunk.append(message)
+        chunk_size += size
+    if chunk:
+        bodies.extend(_fit(chunk, max_bytes, compress))
+    return bodies
+
+
+def unpack_body(body: str) -> List[Dict[str, Any]]:
+    data = json.loads(body)
+    if not isinstance(data, dict) or data.get('format') != PACKED_FORMAT:
+        return [data]
+    if data.get('encoding') == COMPRESSED_ENCODING:
+        payload = zlib.decompress(base64.b64decode(data['data']))
+        return json.loads(payload.decode('utf-8'))
+    return data['items']
+
+
+def _fit(items: List[Dict[str, Any]], max_bytes: int,
+         compress: bool) -> List[str]:
+    body = _encode(items, compress)
+    if len(body.encode('utf-8')) <= max_bytes:
+        return [body]
+    if len(items) == 1:
+        raise ValueError(f'Message exceeds {max_bytes} bytes')
+    middle = len(items) // 2
+    return _fit(items[:middle], max_bytes, compress) + _fit(items[middle:], max_bytes, compress)
+
+
+def _encode(items: List[Dict[str, Any]], compress: bool) -> str:
+    if not compress:
+        return _dumps({'format': PACKED_FORMAT, 'items': items})
+    payload = zlib.compress(_dumps(items).encode('utf-8'), 9)
+    return _dumps({
+        'format': PACKED_FORMAT,
+        'encoding': COMPRESSED_ENCODING,
+        'data': base64.b64encode(payload).decode('ascii')
+    })
+
+
+def _dumps(data: Any) -> str:
+    return json.dumps(data, separators=(',', ':'))
@@ -0,0 +1,68 @@
+import math
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List
+
+from rumor.upstreams.sharding import get_partition_keys
+
+READ_UNIT_BYTES = 4096
+EVENTUALLY_CONSISTENT_READ_UNITS = 0.5
+
+
+def plan_day_queries(created_at_from: datetime, created_at_to: datetime,
+                     shards: int = 1) -> List[Dict[str, Any]]:
+    range_from, range_to = get_range_bounds(created_at_from, created_at_to)
+    queries = []
+    day = created_at_from.date()
+    while day <= created_at_to.date():
+        day_from = max(range_from, math.ceil(get_day_start(day)))
+        day_to = min(range_to, math.ceil(get_day_start(day + timedelta(days=1))) - 1)
+        if day_from <= day_to:
+            queries.extend({
+                'partition_key': partition_key,
+                'range_from': day_from,
+                'range_to': day_to
+            } for partition_key in get_partition_keys(str(day), shards))
+        day += timedelta(days=1)
+    return queries
+
+
+def plan_range_queries(partition_keys: List[str], created_at_from: datetime,
+                       created_at_to: datetime,
+                       inclusive: bool = True) -> List[Dict[str, Any]]:
+    range_from, range_to = get_range_bounds(created_at_from, created_at_to, inclusive)
+    if range_from > range_to:
+        return []
+    return [{'partition_key': partition_key, 'range_from': range_from, 'range_to': range_to}
+            for partition_key in partition_keys]
+
+
+def get_range_bounds(created_at_from: datetime, created_at_to: datetime,
+                     inclusive: bool = True) -> tuple:
+    range_from = math.ceil(created_at_from.timestamp())
+    if inclusive:
+        return range_from, math.floor(created_at_to.timestamp())
+    return range_from, math.ceil(created_at_to.timestamp()) - 1
+
+
+def get_day_start(day: date) -> float:
+    return datetime.combine(day, time.min).timestamp()
+
+
+def estimate_cost(queries: List[Dict[str, Any]], items_per_hour: float,
+                  item_bytes: int = 1024) -> Dict[str, Any]:
+    fan_out = Counter((query['range_from'], query['range_to']) for query in queries)
+    items = 0.0
+    read_units = 0.0
+    for (range_from, range_to), count in fan_out.items():
+        window_items = items_per_hour * (range_to - range_from + 1) / 3600.0
+        query_bytes = window_items / count * item_bytes
+        items += window_items
+        read_units += count * max(1, math.ceil(query_bytes / READ_UNIT_BYTES)) * \
+            EVENTUALLY_CONSISTENT_READ_UNITS
+    return {
+        'queries': len(queries),
+        'seconds': sum(range_to - range_from + 1 for range_from, range_to in fan_out),
+        'items': round(items),
+        'read_units': read_units
+    }
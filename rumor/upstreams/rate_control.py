@@ -0,0 +1,133 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from botocore.exceptions import ClientError
+from logzero import logger
+
+from rumor.exceptions import ThrottledError, UpstreamError
+
+SHARED_RATE_LIMITS = ('rate', 'burst', 'min_rate', 'max_rate')
+THROTTLING_ERROR_CODES = {
+    'ProvisionedThroughputExceededException',
+    'RequestLimitExceeded',
+    'ThrottlingException',
+    'Throttling',
+}
+
+
+class AdaptiveRateController:
+    def __init__(self, rate: float = 1.0, burst: float = 1.0,
+                 min_rate: float = 0.1, max_rate: float = 100.0,
+                 increase: float = 0.5, decrease: float = 0.5,
+                 max_attempts: int = 8,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.max_attempts = max_attempts
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = burst
+        self.cost_estimate = 1.0
+        self.updated_at = clock()
+        self.throttle_count = 0
+        self.success_count = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, cost: float = 1.0) -> float:
+        with self._lock:
+            self._refill()
+            self.tokens -= cost
+            wait = max(0.0, -self.tokens / self.rate)
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+    def on_success(self, consumed: Optional[float] = None,
+                   charged: float = 1.0) -> None:
+        with self._lock:
+            self.success_count += 1
+            if consumed is not None:
+                self.tokens -= consumed - charged
+                if consumed > self.cost_estimate:
+                    self.cost_estimate = consumed
+                else:
+                    self.cost_estimate = 0.8 * self.cost_estimate + 0.2 * consumed
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def on_throttle(self) -> None:
+        with self._lock:
+            self.throttle_count += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.tokens = min(self.tokens, 0.0)
+
+    def call(self, func: Callable[..., Any], *args,
+             cost: Optional[float] = None, **kwargs) -> Any:
+        for attempt in range(1, self.max_attempts + 1):
+            charged = self.cost_estimate if cost is None else cost
+            self.acquire(charged)
+            try:
+                response = func(*args, **kwargs)
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') not in THROTTLING_ERROR_CODES:
+                    raise
+                self.on_throttle()
+                logger.info(f'Throttled (attempt {attempt}), rate lowered to {self.rate:.2f}/s')
+                continue
+            except ThrottledError:
+                self.on_throttle()
+                logger.info(f'Throttled (attempt {attempt}), rate lowered to {self.rate:.2f}/s')
+                continue
+            self.on_success(consumed_capacity(response), charged=charged)
+            return response
+        raise UpstreamError(f'Still throttled after {self.max_attempts} attempts')
+
+    def _refill(self) -> None:
+        now = self.clock()
+        elapsed = max(0.0, now - self.updated_at)
+        self.updated_at = now
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+
+
+def consumed_capacity(response: Any) -> Optional[float]:
+    if not isinstance(response, dict):
+        return None
+    capacity = response.get('ConsumedCapacity')
+    if isinstance(capacity, list):
+        return sum(float(c.get('CapacityUnits', 0)) for c in capacity) or None
+    if isinstance(capacity, dict) and 'CapacityUnits' in capacity:
+        return float(capacity['CapacityUnits'])
+    return None
+
+
+_controllers: Dict[str, AdaptiveRateController] = {}
+_controllers_lock = threading.Lock()
+_rate_share = 1.0
+
+
+def get_rate_controller(key: str, **kwargs) -> AdaptiveRateController:
+    with _controllers_lock:
+        if key not in _controllers:
+            _controllers[key] = AdaptiveRateController(**{
+                name: value * _rate_share if name in SHARED_RATE_LIMITS else value
+                for name, value in kwargs.items()
+            })
+        return _controllers[key]
+
+
+def set_rate_share(share: float) -> None:
+    global _rate_share
+    with _controllers_lock:
+        if share != _rate_share:
+            _rate_share = share
+            _controllers.clear()
+
+
+def reset_rate_controllers() -> None:
+    with _controllers_lock:
+        _controllers.clear()
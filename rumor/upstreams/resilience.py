@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Executor, wait
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from rumor.exceptions import CircuitOpenError
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 512) -> None:
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, hedge_won: bool = False) -> None:
+        with self._lock:
+            self.samples.append(seconds)
+            self.count += 1
+            self.hedge_wins += int(hedge_won)
+
+    def record_hedge(self) -> None:
+        with self._lock:
+            self.hedged += 1
+
+    def percentile(self, p: float, default: Optional[float] = None,
+                   min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self.samples)
+        if len(samples) < max(min_samples, 1):
+            return default
+        index = min(len(samples) - 1, int(round(p / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'max': self.percentile(100),
+            'hedged': self.hedged,
+            'hedge_wins': self.hedge_wins,
+        }
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                return
+            raise CircuitOpenError(f'Circuit is {self.state}, failing fast')
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = self.clock()
+
+    def call(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        self.before_call()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+
+def hedged_call(executor: Executor, func: Callable[..., Any], *args,
+                hedge_after: Optional[float] = None,
+                tracker: Optional[LatencyTracker] = None, **kwargs) -> Any:
+    started = threading.Event()
+    started_at = []
+
+    def attempt(first: bool) -> Tuple[Any, float]:
+        attempt_started_at = time.monotonic()
+        if first:
+            started_at.append(attempt_started_at)
+            started.set()
+        result = func(*args, **kwargs)
+        return result, time.monotonic() - attempt_started_at
+
+    futures = [executor.submit(attempt, True)]
+    if hedge_after is not None:
+        started.wait()
+        remaining = hedge_after - (time.monotonic() - started_at[0])
+        done, _ = wait(futures, timeout=max(remaining, 0.0))
+        if not done:
+            futures.append(executor.submit(attempt, False))
+            if tracker is not None:
+                tracker.record_hedge()
+
+    pending = set(futures)
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is not None:
+                error = future.exception()
+                continue
+            result, seconds = future.result()
+            if tracker is not None:
+                tracker.record(seconds, hedge_won=future is not futures[0])
+            return result
+    raise error
@@ -0,0 +1,44 @@
+import zlib
+from typing import Any, Dict, List
+
+SHARD_SEPARATOR = '#'
+PARTITION_KEY = 'created_at_date'
+
+
+def get_shard(news_item_id: Any, shards: int) -> int:
+    return zlib.crc32(str(news_item_id).encode('utf-8')) % shards
+
+
+def get_partition_key(created_at_date: str, news_item_id: Any, shards: int) -> str:
+    if shards <= 1:
+        return created_at_date
+    return f'{created_at_date}{SHARD_SEPARATOR}{get_shard(news_item_id, shards)}'
+
+
+def get_partition_keys(created_at_date: str, shards: int) -> List[str]:
+    if shards <= 1:
+        return [created_at_date]
+    return [created_at_date] + [f'{created_at_date}{SHARD_SEPARATOR}{shard}'
+                                for shard in range(shards)]
+
+
+def get_created_at_date(partition_key: str) -> str:
+    return partition_key.split(SHARD_SEPARATOR, 1)[0]
+
+
+def shard_item(item: Dict[str, Any], shards: int) -> Dict[str, Any]:
+    created_at_date = get_created_at_date(item[PARTITION_KEY])
+    return dict(item, **{PARTITION_KEY: get_partition_key(created_at_date,
+                                                          item['news_item_id'], shards)})
+
+
+def unshard_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    if PARTITION_KEY in item:
+        item[PARTITION_KEY] = get_created_at_date(item[PARTITION_KEY])
+    return item
+
+
+def shard_key(key: Dict[str, Any], shards: int) -> Dict[str, Any]:
+    return {'news_item_id': key['news_item_id'],
+            PARTITION_KEY: get_partition_key(get_created_at_date(key[PARTITION_KEY]),
+                                             key['news_item_id'], shards)}
@@ -0,0 +1,60 @@
+import json
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+TRACE_ATTRIBUTE = 'rumor_trace'
+SENT_TIMESTAMP_ATTRIBUTE = 'SentTimestamp'
+
+
+def new_trace_context(discovered_at: Optional[float] = None) -> Dict[str, Any]:
+    return {
+        'trace_id': uuid.uuid4().hex,
+        'discovered_at': discovered_at if discovered_at is not None else time.time(),
+        'hops': []
+    }
+
+
+def add_hop(context: Dict[str, Any], stage: str, queue_wait: Optional[float],
+            processing: float) -> Dict[str, Any]:
+    hop = {'stage': stage, 'queue_wait': _round(queue_wait), 'processing': _round(processing)}
+    return dict(context, hops=context.get('hops', []) + [hop])
+
+
+def merge_trace_contexts(contexts: List[Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    contexts = [context for context in contexts if context is not None]
+    if not contexts:
+        return None
+    return min(contexts, key=lambda context: context['discovered_at'])
+
+
+def get_trace_attributes(context: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if context is None:
+        return None
+    return {TRACE_ATTRIBUTE: {'DataType': 'String',
+                              'StringValue': json.dumps(context, separators=(',', ':'))}}
+
+
+def get_trace_context(message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    attributes = message.get('MessageAttributes') or message.get('messageAttributes') or {}
+    attribute = attributes.get(TRACE_ATTRIBUTE)
+    if attribute is None:
+        return None
+    try:
+        context = json.loads(attribute.get('StringValue') or attribute.get('stringValue'))
+        float(context['discovered_at'])
+    except (TypeError, ValueError, KeyError):
+        return None
+    return context
+
+
+def get_sent_at(message: Dict[str, Any]) -> Optional[float]:
+    attributes = message.get('Attributes') or message.get('attributes') or {}
+    sent_timestamp = attributes.get(SENT_TIMESTAMP_ATTRIBUTE)
+    if sent_timestamp is None:
+        return None
+    return int(sent_timestamp) / 1000.0
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 3)
@@ -0,0 +1,158 @@
+import itertools
+import json
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from multiprocessing.managers import BaseManager
+from socketserver import ThreadingMixIn
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StubServer:
+    def __init__(self):
+        self.routes = {}
+        self.delays = {}
+        self.statuses = {}
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f'http://{host}:{port}'
+
+    def route(self, path, body, delays=None, statuses=None,
+              content_type='application/json'):
+        if not isinstance(body, (bytes, str)):
+            body = json.dumps(body)
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.routes[path] = (body, content_type)
+        self.delays[path] = list(delays or [])
+        self.statuses[path] = list(statuses or [])
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _next(self, path):
+        with self._lock:
+            self.requests.append(path)
+            delay = self.delays[path].pop(0) if self.delays.get(path) else 0
+            status = self.statuses[path].pop(0) if self.statuses.get(path) else 200
+        return delay, status
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in stub.routes:
+                    self.send_error(404)
+                    return
+                delay, status = stub._next(self.path)
+                time.sleep(delay)
+                body, content_type = stub.routes[self.path]
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', content_type)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+class LocalSQS:
+    def __init__(self):
+        self.queues = {}
+        self.deleted = 0
+        self._ids = itertools.count()
+        self._condition = threading.Condition()
+
+    def get_queue_url(self, QueueName):
+        with self._condition:
+            self.queues.setdefault(QueueName, OrderedDict())
+        return {'QueueUrl': QueueName}
+
+    def send_message_batch(self, QueueUrl, Entries):
+        with self._condition:
+            for entry in Entries:
+                message_id = f'message-{next(self._ids)}'
+                self.queues[QueueUrl][message_id] = {
+                    'Body': entry['MessageBody'], 'ReceiptHandle': None, 'visible_at': 0.0}
+            self._condition.notify_all()
+        return {'Successful': [{'Id': entry['Id']} for entry in Entries]}
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, WaitTimeSeconds=0,
+                        VisibilityTimeout=30, **kwargs):
+        deadline = time.monotonic() + WaitTimeSeconds
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                messages = []
+                for message_id, message in self.queues[QueueUrl].items():
+                    if len(messages) >= MaxNumberOfMessages:
+                        break
+                    if message['visible_at'] <= now:
+                        message['visible_at'] = now + VisibilityTimeout
+                        message['ReceiptHandle'] = f'{message_id}#{next(self._ids)}'
+                        messages.append({'MessageId': message_id, 'Body': message['Body'],
+                                         'ReceiptHandle': message['ReceiptHandle']})
+                if messages or now >= deadline:
+                    return {'Messages': messages}
+                self._condition.wait(min(deadline - now, 0.1))
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        with self._condition:
+            for entry in Entries:
+                message_id = entry['ReceiptHandle'].split('#')[0]
+                message = self.queues[QueueUrl].get(message_id)
+                if message is not None and message['ReceiptHandle'] == entry['ReceiptHandle']:
+                    del self.queues[QueueUrl][message_id]
+                    self.deleted += 1
+        return {'Successful': [{'Id': entry['Id']} for entry in Entries]}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        with self._condition:
+            for entry in Entries:
+                message_id = entry['ReceiptHandle'].split('#')[0]
+                message = self.queues[QueueUrl].get(message_id)
+                if message is not None and message['ReceiptHandle'] == entry['ReceiptHandle']:
+                    message['visible_at'] = time.monotonic() + entry['VisibilityTimeout']
+            self._condition.notify_all()
+        return {'Successful': [{'Id': entry['Id']} for entry in Entries]}
+
+    def count(self, QueueUrl):
+        with self._condition:
+            return len(self.queues.get(QueueUrl, {}))
+
+    def get_deleted(self):
+        return self.deleted
+
+
+class LocalSQSManager(BaseManager):
+    pass
+
+
+LocalSQSManager.register('LocalSQS', LocalSQS)
+
+
+def local_sqs_client(proxy):
+    return proxy
@@ -1,14 +1,21 @@
 import json
 from datetime import datetime, timedelta
-from unittest.mock import patch
+from unittest.mock import ANY, patch
 
 import pytest
 
-from rumor.domain import classify
-from rumor.domain.classification import extract_keywords
+from rumor.domain import classify, classify_records
+from rumor.domain.classification import extract_keywords, store_news_item
+from rumor.domain.fingerprints import (FingerprintCache,
+                                       get_attribute_fingerprints,
+                                       get_fingerprint)
+from rumor.domain.search import search_news_items
+from rumor.domain.trends import TrendRecorder
+from rumor.upstreams.metrics import get_metrics_report, reset_metrics
+from rumor.upstreams.packing import pack_messages
 
 
-@patch('rumor.domain.classification.store_item')
+@patch('rumor.domain.classification.update_news_item')
 @patch('rumor.domain.classification.delete_messages')
 @patch('rumor.domain.classification.get_messages')
 class TestClassification:
@@ -43,6 +50,30 @@ class TestClassification:
         mock_delete.assert_called_once_with(messages=messages,
                                             queue_name=classification_queue_name)
 
+    def test_classification_packed_messages(self, mock_get, mock_delete, mock_store):
+        news_items = [
+            {
+                'id': f'{i}',
+                'url': f'url-{i}',
+                'title': 'This is some title',
+                'score': i,
+                'time': int((datetime.now() - timedelta(hours=1)).timestamp())
+            }
+            for i in range(5)
+        ]
+        messages = [{'Body': body}
+                    for body in pack_messages(news_items, max_items=3, compress=True)]
+        mock_get.return_value = messages
+
+        classify(classification_queue_name='classification-queue',
+                 batch_size=5,
+                 news_item_max_age_hours=12,
+                 news_item_table_name='news-items-table')
+
+        assert mock_store.call_count == 5
+        mock_delete.assert_called_once_with(messages=messages,
+                                            queue_name='classification-queue')
+
     @pytest.mark.parametrize('batch_size', [-1, 0, 11])
     def test_classification_invalid_batch_size(self, mock_get, mock_delete,
                                                mock_store, batch_size):
@@ -78,6 +109,52 @@ class TestClassification:
         mock_store.assert_not_called()
 
 
+@patch('rumor.domain.classification.update_news_item')
+def test_classify_records_partial_failure(mock_store):
+    created_at = int((datetime.now() - timedelta(hours=1)).timestamp())
+    records = [
+        {
+            'messageId': f'message-{i}',
+            'body': json.dumps({'id': i, 'url': f'url-{i}', 'score': i,
+                                'title': 'Some title', 'time': created_at})
+        } for i in range(3)
+    ]
+    records[1]['body'] = json.dumps({'id': 1})
+
+    failed = classify_records(records=records, news_item_max_age_hours=12,
+                              news_item_table_name='news-items-table')
+
+    assert failed == ['message-1']
+    assert mock_store.call_count == 2
+
+
+@patch('rumor.domain.classification.update_news_item')
+def test_classify_records_records_freshness(mock_update):
+    reset_metrics()
+    created_at = int((datetime.now() - timedelta(hours=1)).timestamp())
+    trace = {'trace_id': 'trace', 'discovered_at': created_at + 600, 'hops': []}
+    records = [{
+        'messageId': 'message-1',
+        'body': json.dumps({'id': 1, 'url': 'url-1', 'score': 1,
+                            'title': 'Some title', 'time': created_at}),
+        'attributes': {'SentTimestamp': str((created_at + 1200) * 1000)},
+        'messageAttributes': {'rumor_trace': {'dataType': 'String',
+                                              'stringValue': json.dumps(trace)}}
+    }]
+
+    classify_records(records=records, news_item_max_age_hours=12,
+                     news_item_table_name='news-items-table')
+    classify_records(records=records, news_item_max_age_hours=12,
+                     news_item_table_name='news-items-table')
+
+    report = get_metrics_report()['classify']
+    assert report['Freshness']['count'] == 2
+    assert report['DiscoveryDelay']['max'] == 600
+    assert report['QueueWait']['count'] == 2
+    assert report['PipelineLatency']['max'] >= 3000
+    reset_metrics()
+
+
 @pytest.mark.parametrize('sentence, keywords', [
     ('this is a Keyword', ['keyword']),
     ('(this is a Keyword)', ['keyword']),
@@ -91,3 +168,191 @@ class TestClassification:
 def test_extract_keywords(sentence, keywords):
     results = extract_keywords(sentence)
     assert set(results) == set(keywords)
+
+
+@patch('rumor.domain.classification.append_to_snapshot')
+@patch('rumor.domain.classification.update_news_item')
+def test_classify_records_appends_to_snapshot(mock_store, mock_append_to_snapshot):
+    created_at = int((datetime.now() - timedelta(hours=1)).timestamp())
+    records = [{
+        'messageId': 'message-1',
+        'body': json.dumps({'id': 1, 'url': 'url-1', 'score': 1,
+                            'title': 'Some title', 'time': created_at})
+    }]
+
+    classify_records(records=records, news_item_max_age_hours=12,
+                     news_item_table_name='news-items-table',
+                     snapshot_path='/tmp/snapshot')
+
+    stored_news_item = mock_store.call_args[0][0]
+    mock_append_to_snapshot.assert_called_once_with([stored_news_item], '/tmp/snapshot')
+
+
+@patch('rumor.domain.classification.update_search_index')
+@patch('rumor.domain.classification.append_to_snapshot')
+@patch('rumor.domain.classification.update_news_item')
+def test_classify_records_appends_only_written_items(mock_update, mock_append_to_snapshot,
+                                                     mock_update_search_index):
+    created_at = int((datetime.now() - timedelta(hours=1)).timestamp())
+    records = [{
+        'messageId': f'message-{i}',
+        'body': json.dumps({'id': i, 'url': f'url-{i}', 'score': i,
+                            'title': 'Some title', 'time': created_at})
+    } for i in range(2)]
+    fingerprints = FingerprintCache()
+    classify_records(records=records[:1], news_item_max_age_hours=12,
+                     news_item_table_name='news-items-table', fingerprints=fingerprints)
+    mock_append_to_snapshot.reset_mock()
+
+    classify_records(records=records, news_item_max_age_hours=12,
+                     news_item_table_name='news-items-table', max_workers=1,
+                     snapshot_path='/tmp/snapshot', fingerprints=fingerprints)
+
+    appended, _ = mock_append_to_snapshot.call_args[0]
+    assert [ni['news_item_id'] for ni in appended] == ['1']
+    assert mock_update_search_index.call_args[0][0] == appended
+
+
+@patch('rumor.domain.classification.update_news_item', return_value=True)
+def test_classify_records_updates_search_index(mock_store, tmp_path):
+    created_at = int((datetime.now() - timedelta(hours=1)).timestamp())
+    records = [{
+        'messageId': 'message-1',
+        'body': json.dumps({'id': 1, 'url': 'url-1', 'score': 42,
+                            'title': 'Running WebAssembly on the server', 'time': created_at})
+    }]
+    search_index_path = str(tmp_path / 'search.db')
+
+    classify_records(records=records, news_item_max_age_hours=12,
+                     news_item_table_name='news-items-table',
+                     search_index_path=search_index_path)
+
+    results = search_news_items(search_index_path, 'webassembly')
+    assert [(ni['news_item_id'], ni['score']) for ni in results] == [('1', 42)]
+
+
+def hacker_news_item(**kwargs):
+    news_item = {'id': 1, 'url': 'url-1', 'score': 1, 'title': 'Some title',
+                 'time': int((datetime.now() - timedelta(hours=1)).timestamp())}
+    news_item.update(kwargs)
+    return news_item
+
+
+@patch('rumor.domain.classification.update_news_item')
+def test_store_news_item_writes_unknown_item(mock_update):
+    fingerprints = FingerprintCache()
+
+    stored = store_news_item(hacker_news_item(), 12, 'news-items', fingerprints=fingerprints)
+
+    attribute_fingerprints = get_attribute_fingerprints(stored)
+    mock_update.assert_called_once_with(
+        stored, ['score', 'url', 'title', 'created_at', 'updated_at', 'ttl', 'keywords'],
+        get_fingerprint(attribute_fingerprints), 'news-items')
+    assert fingerprints.get('1') == dict(attribute_fingerprints, ttl=str(stored['ttl']),
+                                         last_score=str(stored['score']))
+    assert (fingerprints.written, fingerprints.skipped) == (1, 0)
+
+
+@patch('rumor.domain.classification.update_news_item')
+def test_store_news_item_skips_cached_unchanged_item(mock_update):
+    fingerprints = FingerprintCache()
+    store_news_item(hacker_news_item(), 12, 'news-items', fingerprints=fingerprints)
+    mock_update.reset_mock()
+
+    stored = store_news_item(hacker_news_item(), 12, 'news-items', fingerprints=fingerprints)
+
+    assert stored is None
+    mock_update.assert_not_called()
+    assert (fingerprints.written, fingerprints.skipped) == (1, 1)
+
+
+@patch('rumor.domain.classification.update_news_item')
+def test_store_news_item_renews_ttl_of_unchanged_item(mock_update):
+    fingerprints = FingerprintCache()
+    previous = store_news_item(hacker_news_item(), 12, 'news-items', fingerprints=fingerprints)
+    fingerprints.put('1', dict(fingerprints.get('1'), ttl=str(previous['updated_at'] + 3600)))
+    mock_update.reset_mock()
+
+    stored = store_news_item(hacker_news_item(), 12, 'news-items', fingerprints=fingerprints)
+
+    assert stored is None
+    fingerprint = get_fingerprint(get_attribute_fingerprints(previous))
+    mock_update.assert_called_once_with(ANY, ['ttl'], fingerprint, 'news-items',
+                                        previous_fingerprint=fingerprint)
+    renewed_ttl = mock_update.call_args[0][0]['ttl']
+    assert renewed_ttl >= previous['ttl']
+    assert fingerprints.get('1')['ttl'] == str(renewed_ttl)
+    assert (fingerprints.written, fingerprints.skipped) == (1, 1)
+
+
+@patch('rumor.domain.classification.update_news_item')
+def test_store_news_item_updates_changed_attributes(mock_update):
+    fingerprints = FingerprintCache()
+    previous = store_news_item(hacker_news_item(), 12, 'news-items', fingerprints=fingerprints)
+    mock_update.reset_mock()
+
+    stored = store_news_item(hacker_news_item(score=2), 12, 'news-items',
+                             fingerprints=fingerprints)
+
+    mock_update.assert_called_once_with(
+        stored, ['score', 'updated_at', 'ttl'], get_fingerprint(get_attribute_fingerprints(stored)),
+        'news-items', previous_fingerprint=get_fingerprint(get_attribute_fingerprints(previous)))
+
+
+@patch('rumor.domain.classification.update_news_item')
+def test_store_news_item_falls_back_to_full_update(mock_update):
+    fingerprints = FingerprintCache()
+    store_news_item(hacker_news_item(), 12, 'news-items', fingerprints=fingerprints)
+    mock_update.reset_mock()
+    mock_update.side_effect = [False, False]
+
+    stored = store_news_item(hacker_news_item(score=2), 12, 'news-items', fingerprints=fingerprints)
+
+    assert stored is None
+    assert mock_update.call_count == 2
+    assert 'previous_fingerprint' not in mock_update.call_args[1]
+    assert (fingerprints.written, fingerprints.skipped) == (1, 1)
+
+
+@patch('rumor.domain.classification.update_news_item')
+def test_store_news_item_records_trends_for_written_items(mock_update):
+    fingerprints = FingerprintCache()
+    trends = TrendRecorder()
+    store_news_item(hacker_news_item(), 12, 'news-items', fingerprints=fingerprints,
+                    trends=trends)
+    store_news_item(hacker_news_item(), 12, 'news-items', fingerprints=fingerprints,
+                    trends=trends)
+    mock_update.return_value = False
+    store_news_item(hacker_news_item(id=2), 12, 'news-items', fingerprints=fingerprints,
+                    trends=trends)
+
+    bucket, = trends.buckets.values()
+    assert bucket.items == 1
+
+
+@patch('rumor.domain.classification.update_news_item')
+def test_store_news_item_counts_rescored_item_once(mock_update):
+    fingerprints = FingerprintCache()
+    trends = TrendRecorder()
+    for score in [10, 20, 30]:
+        store_news_item(hacker_news_item(title='Rust is great', score=score), 12, 'news-items',
+                        fingerprints=fingerprints, trends=trends)
+
+    bucket, = trends.buckets.values()
+    assert bucket.items == 1
+    assert bucket.mentions.estimate('rust') == 1.0
+    assert bucket.score.estimate('rust') == 30.0
+    assert mock_update.call_count == 3
+
+
+@patch('rumor.domain.classification.update_news_item')
+def test_classify_records_persists_fingerprints(mock_update, tmp_path):
+    fingerprint_path = str(tmp_path / 'fingerprints.json')
+    records = [{'messageId': 'message-1', 'body': json.dumps(hacker_news_item())}]
+
+    classify_records(records=records, news_item_max_age_hours=12,
+                     news_item_table_name='news-items', fingerprint_path=fingerprint_path)
+    classify_records(records=records, news_item_max_age_hours=12,
+                     news_item_table_name='news-items', fingerprint_path=fingerprint_path)
+
+    assert mock_update.call_count == 1
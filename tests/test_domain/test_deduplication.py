@@ -0,0 +1,74 @@
+import pytest
+
+from rumor.domain.deduplication import (canonicalize_url, collapse_duplicates,
+                                        jaccard, minhash, title_shingles)
+
+
+@pytest.mark.parametrize('url,expected', [
+    ('https://www.example.com/a/b/', 'example.com/a/b'),
+    ('http://example.com/a/b?utm_source=hn&utm_medium=social', 'example.com/a/b'),
+    ('https://m.example.com/a/b/index.html#comments', 'example.com/a/b'),
+    ('https://example.com/watch?v=1&fbclid=abc&list=2', 'example.com/watch?list=2&v=1'),
+    ('https://EXAMPLE.com/Path', 'example.com/Path'),
+    ('https://example.com/?p=42&utm_source=hn', 'example.com?p=42'),
+    ('https://example.com/post?ref=rss&source=feed', 'example.com/post?ref=rss&source=feed'),
+    ('https://github.com/', None),
+    ('https://www.github.com/index.html?utm_source=hn', None),
+    ('', None),
+    (None, None),
+])
+def test_canonicalize_url(url, expected):
+    assert canonicalize_url(url) == expected
+
+
+def test_minhash_estimates_similarity():
+    a = title_shingles('Show HN: A fast static site generator written in Rust')
+    b = title_shingles('Show HN: A fast static site generator written in Rust (2020)')
+    c = title_shingles('The unreasonable effectiveness of recurrent neural networks')
+
+    matching = sum(x == y for x, y in zip(minhash(a), minhash(b)))
+    assert jaccard(a, b) >= 0.8
+    assert matching > sum(x == y for x, y in zip(minhash(a), minhash(c)))
+
+
+def test_title_shingles_short_titles():
+    assert title_shingles('Ask HN') == set()
+    assert title_shingles(None) == set()
+
+
+def test_collapse_duplicates():
+    news_items = [
+        {'news_item_id': '1', 'score': 10, 'url': 'https://example.com/post?utm_source=x',
+         'title': 'Why SQLite is so great for embedded databases'},
+        {'news_item_id': '2', 'score': 30, 'url': 'https://www.example.com/post/',
+         'title': 'Something completely different about databases'},
+        {'news_item_id': '3', 'score': 20, 'url': 'https://mirror.example.org/sqlite',
+         'title': 'Why SQLite is so great for embedded databases [video]'},
+        {'news_item_id': '4', 'score': 5, 'url': 'https://another.example.org/',
+         'title': 'A completely unrelated story about compilers'},
+        {'news_item_id': '5', 'score': 1, 'title': 'Ask HN'},
+        {'news_item_id': '6', 'score': 2, 'title': 'Ask HN'},
+    ]
+
+    results = collapse_duplicates(news_items)
+
+    assert [ni['news_item_id'] for ni in results] == ['2', '4', '5', '6']
+
+
+def test_collapse_duplicates_keeps_bare_domains_apart():
+    news_items = [
+        {'news_item_id': '1', 'score': 10, 'url': 'https://github.com/',
+         'title': 'Show HN: My new tool for managing dotfiles'},
+        {'news_item_id': '2', 'score': 20, 'url': 'https://github.com',
+         'title': 'GitHub is down'},
+        {'news_item_id': '3', 'score': 30, 'url': 'https://www.github.com/',
+         'title': 'Show HN: My new tool for managing dotfiles (2020)'},
+    ]
+
+    results = collapse_duplicates(news_items)
+
+    assert [ni['news_item_id'] for ni in results] == ['2', '3']
+
+
+def test_collapse_duplicates_empty():
+    assert collapse_duplicates([]) == []
@@ -3,10 +3,13 @@ from unittest.mock import patch
 from rumor.domain import discover
 
 
+@patch('rumor.domain.discovery.new_trace_context')
 @patch('rumor.domain.discovery.send_messages')
 @patch('rumor.domain.discovery.get_news_items')
-def test_discover_ok(mock_get_news_items, mock_send_messages):
+def test_discover_ok(mock_get_news_items, mock_send_messages, mock_new_trace_context):
     mock_get_news_items.return_value = [3, 42, 4753, 5, 7]
+    mock_new_trace_context.return_value = {'trace_id': 'trace', 'discovered_at': 1.5,
+                                           'hops': []}
     target_api_url = 'https://hacker-news.firebaseio.com'
     queue_name = 'TestQueue'
 
@@ -18,4 +21,9 @@ def test_discover_ok(mock_get_news_items, mock_send_messages):
     expected_entries = [{
         'news_item_id': f'{news_item_id}'
     } for i, news_item_id in enumerate([3, 42, 4753])]
-    mock_send_messages.assert_called_once_with(expected_entries, queue_name)
+    mock_send_messages.assert_called_once_with(expected_entries, queue_name, pack=True,
+                                               message_attributes={'rumor_trace': {
+                                                   'DataType': 'String',
+                                                   'StringValue': '{"trace_id":"trace",'
+                                                                  '"discovered_at":1.5,"hops":[]}'
+                                               }})
@@ -0,0 +1,91 @@
+import re
+from unittest.mock import patch
+
+from rumor.domain.classification import classify_news_item
+from rumor.domain.enrichment import (ArticleCache, ArticleEnricher,
+                                     ArticleTextParser)
+from tests.stubs import StubServer
+
+KEYWORD_PATTERN = re.compile("[a-zA-Z-]{2,}")
+ARTICLE = ('<html><head><title>Ignored title</title><style>rust { color: red }</style></head>'
+           '<body><nav>python python python</nav><p>Rust compilers and rust &amp; '
+           'wasm.</p><script>var rust = 1;</script><p>The compilers for wasm.</p>'
+           '<p>Databases once.</p></body></html>')
+
+
+def test_article_text_parser_handles_split_chunks():
+    parser = ArticleTextParser(KEYWORD_PATTERN, {'the', 'and', 'for'})
+    for i in range(0, len(ARTICLE), 7):
+        parser.feed_chunk(ARTICLE[i:i + 7])
+    parser.close()
+
+    assert parser.keywords(5) == ['rust', 'compilers', 'wasm']
+    assert 'python' not in parser.counts
+    assert 'ignored' not in parser.counts
+
+
+def test_article_text_parser_bounds_distinct_words():
+    parser = ArticleTextParser(KEYWORD_PATTERN, set(), max_words=3)
+    parser.feed_chunk('<p>aa bb cc dd ee aa</p>')
+
+    assert dict(parser.counts) == {'aa': 2, 'bb': 1, 'cc': 1}
+
+
+def test_enricher_fetches_once_per_url():
+    cache = ArticleCache()
+    with StubServer() as server:
+        server.route('/article', ARTICLE, content_type='text/html')
+        news_items = [{'id': 1, 'url': f'{server.url}/article'}, {'id': 2}]
+
+        ArticleEnricher(5.0, KEYWORD_PATTERN, {'the', 'and', 'for'}, cache=cache).enrich(news_items)
+        ArticleEnricher(5.0, KEYWORD_PATTERN, {'the', 'and', 'for'}, cache=cache).enrich(news_items)
+
+    assert news_items[0]['body_keywords'] == ['rust', 'compilers', 'wasm']
+    assert 'body_keywords' not in news_items[1]
+    assert server.requests == ['/article']
+
+
+def test_enricher_skips_failed_articles_without_caching():
+    cache = ArticleCache()
+    with StubServer() as server:
+        server.route('/article', 'error', statuses=[500], content_type='text/html')
+        news_items = [{'id': 1, 'url': f'{server.url}/article'}]
+
+        ArticleEnricher(5.0, KEYWORD_PATTERN, set(), cache=cache).enrich(news_items)
+
+    assert news_items[0]['body_keywords'] == []
+    assert cache.get(f'{server.url}/article') is None
+
+
+def test_enricher_with_exhausted_budget():
+    cache = ArticleCache()
+    with StubServer() as server:
+        server.route('/article', ARTICLE, content_type='text/html')
+        news_items = [{'id': 1, 'url': f'{server.url}/article'}]
+
+        ArticleEnricher(0.0, KEYWORD_PATTERN, set(), cache=cache).enrich(news_items)
+
+    assert news_items[0]['body_keywords'] == []
+    assert server.requests == []
+
+
+def test_article_cache_evicts_least_recently_used():
+    cache = ArticleCache(max_entries=2)
+    cache.put('a', ['x'])
+    cache.put('b', ['y'])
+    cache.get('a')
+    cache.put('c', ['z'])
+
+    assert cache.get('b') is None
+    assert cache.get('a') == ['x']
+
+
+@patch('rumor.domain.classification.get_excluded_words')
+def test_classify_news_item_merges_body_keywords(mock_get_excluded_words):
+    mock_get_excluded_words.return_value = ['a']
+
+    news_item = classify_news_item({'title': 'A Rust compiler',
+                                    'body_keywords': ['rust', 'wasm']})
+
+    assert sorted(news_item['keywords'][:2]) == ['compiler', 'rust']
+    assert news_item['keywords'][2:] == ['wasm']
@@ -1,20 +1,42 @@
+import copy
+import json
+import os
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
 from operator import itemgetter
 from unittest.mock import ANY, patch
 
+import pytest
+
 from rumor.domain import evaluate
+from rumor.domain.evaluation import (finalize_news_item_qualification,
+                                     get_partition_windows,
+                                     map_news_item_partition, map_news_items,
+                                     merge_partials,
+                                     perform_news_item_qualification,
+                                     perform_profile_qualification,
+                                     split_news_items)
+from rumor.domain.personalization import profile_id
+from rumor.domain.report_references import (create_profile_items,
+                                            create_reference_report)
+from rumor.domain.similarity import load_idf_statistics
+from rumor.domain.snapshot import append_to_snapshot
 
 
+@patch('rumor.domain.evaluation.get_subscriber_preferences', return_value=[])
 @patch('rumor.domain.evaluation.get_preferences')
 @patch('rumor.domain.evaluation.store_item')
 @patch('rumor.domain.evaluation.get_news_items')
 def test_evaluate_ok(mock_get_news_items, mock_store_item,
-                     mock_get_preferences):
+                     mock_get_preferences, mock_get_subscriber_preferences):
     news_items = [
         {
             'news_item_id': f'{i}',
             'score': 1000 + i if i % 2 == 0 else 100 + i,
             'keywords': [f'keyword-{i}'],
-            'url': f'https://example.com/id/{i}'
+            'url': f'https://example.com/id/{i}',
+            'created_at_date': '2020-01-01'
         }
         for i in range(5)
     ]
@@ -22,7 +44,8 @@ def test_evaluate_ok(mock_get_news_items, mock_store_item,
         'news_item_id': '1',
         'score': 200,
         'keywords': ['keyword-1'],
-        'url': f'https://example.com/id/1'
+        'url': f'https://example.com/id/1',
+        'created_at_date': '2020-01-01'
     })
 
     preferences = [
@@ -54,10 +77,14 @@ def test_evaluate_ok(mock_get_news_items, mock_store_item,
                                  key=itemgetter('modified_score'), reverse=True)
 
     expected_report = {
-        'news_items': expected_news_items,
+        'news_items': [
+            {'news_item_id': ni['news_item_id'], 'modified_score': ni['modified_score']}
+            for ni in expected_news_items
+        ],
+        'news_item_keys': {ni['news_item_id']: '2020-01-01' for ni in expected_news_items},
         'config': ANY,
         'created_at': ANY,
-        'version': '1'
+        'version': '2'
     }
 
     results = evaluate(news_item_table_name=news_item_table_name,
@@ -69,7 +96,258 @@ def test_evaluate_ok(mock_get_news_items, mock_store_item,
                        qualification_limit=qualification_limit)
 
     assert results == expected_report
-    mock_get_news_items.assert_called_once_with(news_item_table_name, ANY, ANY)
+    mock_get_news_items.assert_called_once_with(news_item_table_name, ANY, ANY, shards=1)
     mock_get_preferences.assert_called_once_with(preference_table_name)
     mock_store_item.assert_called_once_with(item=expected_report,
                                             table_name=evaluation_report_table_name)
+
+
+@patch('rumor.domain.evaluation.batch_write_items')
+@patch('rumor.domain.evaluation.get_subscriber_preferences')
+@patch('rumor.domain.evaluation.get_preferences', return_value=[])
+@patch('rumor.domain.evaluation.store_item')
+@patch('rumor.domain.evaluation.get_news_items')
+def test_evaluate_subscriber_profiles(mock_get_news_items, mock_store_item,
+                                      mock_get_preferences,
+                                      mock_get_subscriber_preferences,
+                                      mock_batch_write_items):
+    mock_get_news_items.return_value = [
+        {'news_item_id': f'{i}', 'score': 100, 'keywords': [f'keyword-{i}'],
+         'created_at_date': '2020-01-01'}
+        for i in range(5)
+    ]
+    mock_get_subscriber_preferences.return_value = [
+        {'subscriber': 'a@example.com', 'keyword': 'keyword-3',
+         'preference_weight': Decimal('2')}
+    ]
+
+    results = evaluate(news_item_table_name='news-items',
+                       preference_table_name='preferences',
+                       evaluation_report_table_name='evaluation-reports')
+
+    pid = profile_id({'keyword-3': Decimal('2')})
+    assert results['news_items'] == []
+    assert results['profile_groups'] == 1
+    assert results['news_item_keys'] == {'3': '2020-01-01'}
+    assert 'profiles' not in results and 'profile_news_items' not in results
+    mock_batch_write_items.assert_called_once_with([{'PutRequest': {'Item': {
+        'version': f'profile#{pid}',
+        'created_at': results['created_at'],
+        'news_items': [{'news_item_id': '3', 'modified_score': Decimal('200.0')}]
+    }}}], 'evaluation-reports')
+    mock_store_item.assert_called_once_with(item=results,
+                                            table_name='evaluation-reports')
+
+
+@patch('rumor.domain.evaluation.get_subscriber_preferences', return_value=[])
+@patch('rumor.domain.evaluation.get_preferences', return_value=[])
+@patch('rumor.domain.evaluation.store_item')
+@patch('rumor.domain.evaluation.get_news_items')
+def test_evaluate_from_snapshot(mock_get_news_items, mock_store_item,
+                                mock_get_preferences,
+                                mock_get_subscriber_preferences, tmp_path):
+    created_at = int((datetime.now() - timedelta(hours=30)).timestamp())
+    snapshot_path = str(tmp_path / 'snapshot')
+    append_to_snapshot([
+        {'news_item_id': f'{i}', 'score': 1000 if i == 0 else 10, 'url': f'url-{i}',
+         'title': f'title {i}', 'created_at': created_at, 'updated_at': created_at,
+         'keywords': []}
+        for i in range(5)
+    ], snapshot_path)
+
+    results = evaluate(news_item_table_name='news-items',
+                       preference_table_name='preferences',
+                       evaluation_report_table_name='evaluation-reports',
+                       snapshot_path=snapshot_path)
+
+    mock_get_news_items.assert_not_called()
+    assert [ni['news_item_id'] for ni in results['news_items']] == ['0']
+
+
+@patch('rumor.domain.evaluation.get_subscriber_preferences', return_value=[])
+@patch('rumor.domain.evaluation.get_preferences')
+@patch('rumor.domain.evaluation.store_item')
+@patch('rumor.domain.evaluation.get_news_items')
+def test_evaluate_tfidf_scoring(mock_get_news_items, mock_store_item,
+                                mock_get_preferences,
+                                mock_get_subscriber_preferences, tmp_path):
+    mock_get_news_items.return_value = [
+        {'news_item_id': '0', 'score': 100, 'title': 'Postgres internals',
+         'url': 'url-0', 'keywords': ['postgres', 'internals'],
+         'created_at_date': '2020-01-01'},
+        {'news_item_id': '1', 'score': 100, 'title': 'Tuning PostgreSQL',
+         'url': 'url-1', 'keywords': ['tuning', 'postgresql'],
+         'created_at_date': '2020-01-01'},
+    ] + [
+        {'news_item_id': f'{i}', 'score': 100, 'title': f'Unrelated story {i}',
+         'url': f'url-{i}', 'keywords': ['unrelated', 'story'],
+         'created_at_date': '2020-01-01'}
+        for i in range(2, 6)
+    ]
+    mock_get_preferences.return_value = [
+        {'preference_key': 'postgres', 'preference_weight': Decimal('4')}
+    ]
+    idf_path = str(tmp_path / 'idf.json')
+
+    results = evaluate(news_item_table_name='news-items',
+                       preference_table_name='preferences',
+                       evaluation_report_table_name='evaluation-reports',
+                       qualification_threshold=0.8,
+                       scoring_mode='tfidf',
+                       idf_path=idf_path)
+
+    assert [ni['news_item_id'] for ni in results['news_items']] == ['0', '1']
+    assert results['news_items'][0]['modified_score'] == Decimal('400')
+    assert 100 < results['news_items'][1]['modified_score'] < 400
+    assert results['config']['RUMOR_SCORING_MODE'] == 'tfidf'
+    assert len(load_idf_statistics(idf_path).documents) == 6
+
+
+@patch('rumor.domain.evaluation.get_subscriber_preferences', return_value=[])
+@patch('rumor.domain.evaluation.get_preferences')
+@patch('rumor.domain.evaluation.store_item')
+@patch('rumor.domain.evaluation.get_news_items')
+def test_evaluate_dry_run(mock_get_news_items, mock_store_item, mock_get_preferences,
+                          mock_get_subscriber_preferences, tmp_path):
+    mock_get_news_items.return_value = [
+        {'news_item_id': f'{i}', 'score': 1000 if i == 0 else 10, 'title': f'Story {i}',
+         'url': f'url-{i}', 'keywords': ['story'], 'created_at_date': '2020-01-01'}
+        for i in range(5)
+    ]
+    mock_get_preferences.return_value = [
+        {'preference_key': 'story', 'preference_weight': Decimal('2')}
+    ]
+    idf_path = str(tmp_path / 'idf.json')
+
+    results = evaluate(news_item_table_name='news-items',
+                       preference_table_name='preferences',
+                       evaluation_report_table_name='evaluation-reports',
+                       scoring_mode='tfidf',
+                       idf_path=idf_path,
+                       dry_run=True)
+
+    assert [ni['news_item_id'] for ni in results['news_items']] == ['0']
+    mock_store_item.assert_not_called()
+    assert not os.path.exists(idf_path)
+
+
+def test_evaluate_rejects_unknown_scoring_mode():
+    with pytest.raises(ValueError):
+        evaluate(news_item_table_name='news-items',
+                 preference_table_name='preferences',
+                 evaluation_report_table_name='evaluation-reports',
+                 scoring_mode='fuzzy')
+
+
+def create_news_items(count, seed=42):
+    rng = random.Random(seed)
+    return [
+        {'news_item_id': str(rng.randint(0, count // 2)), 'score': rng.randint(1, 500),
+         'title': f'story number {rng.randint(0, count)} about things',
+         'url': f'https://example.com/{rng.randint(0, count)}',
+         'keywords': [f'keyword-{rng.randint(0, 9)}', f'keyword-{rng.randint(0, 9)}'],
+         'created_at_date': '2020-01-01'}
+        for _ in range(count)
+    ]
+
+
+@pytest.mark.parametrize('scoring_mode', ['exact', 'tfidf'])
+def test_merged_partials_match_serial_qualification(scoring_mode):
+    news_items = create_news_items(200)
+    preferences = [{'preference_key': f'keyword-{i}', 'preference_weight': Decimal(i)}
+                   for i in range(2, 5)]
+
+    expected = perform_news_item_qualification(copy.deepcopy(news_items), 1.2, 20,
+                                               preferences, scoring_mode=scoring_mode)
+    partials = [map_news_items(chunk, preferences, scoring_mode)
+                for chunk in split_news_items(copy.deepcopy(news_items), 7)]
+    results = finalize_news_item_qualification(merge_partials(partials), 1.2, 20,
+                                               preferences, scoring_mode=scoring_mode)
+
+    assert len(partials) == 7
+    assert results == expected
+
+
+def test_merge_partials_is_associative():
+    partials = [map_news_items(chunk, []) for chunk in split_news_items(create_news_items(60), 3)]
+
+    left = partials[0].merge(partials[1]).merge(partials[2])
+    right = partials[0].merge(partials[1].merge(partials[2]))
+
+    assert list(left.news_items.items()) == list(right.news_items.items())
+    assert left.count == right.count == 60
+
+
+def test_get_partition_windows():
+    created_at_from = datetime(2020, 1, 1, 12)
+    created_at_to = datetime(2020, 1, 3, 6)
+
+    windows = get_partition_windows(created_at_from, created_at_to)
+
+    assert windows == [
+        (datetime(2020, 1, 1, 12), datetime(2020, 1, 1, 23, 59, 59)),
+        (datetime(2020, 1, 2), datetime(2020, 1, 2, 23, 59, 59)),
+        (datetime(2020, 1, 3), datetime(2020, 1, 3, 6)),
+    ]
+
+
+@patch('rumor.domain.evaluation.get_subscriber_preferences', return_value=[])
+@patch('rumor.domain.evaluation.get_preferences')
+@patch('rumor.domain.evaluation.store_item')
+def test_evaluate_with_workers_from_snapshot(mock_store_item, mock_get_preferences,
+                                             mock_get_subscriber_preferences, tmp_path):
+    created_at = int((datetime.now() - timedelta(hours=30)).timestamp())
+    news_items = create_news_items(100)
+    for news_item in news_items:
+        news_item.update(created_at=created_at, updated_at=created_at)
+    snapshot_path = str(tmp_path / 'snapshot')
+    append_to_snapshot(news_items, snapshot_path)
+    mock_get_preferences.return_value = [
+        {'preference_key': 'keyword-3', 'preference_weight': Decimal('2')}
+    ]
+
+    results = [evaluate(news_item_table_name='news-items',
+                        preference_table_name='preferences',
+                        evaluation_report_table_name='evaluation-reports',
+                        snapshot_path=snapshot_path,
+                        workers=workers)
+               for workers in (1, 3)]
+
+    assert results[0]['news_items']
+    assert results[0]['news_items'] == results[1]['news_items']
+
+
+@patch('rumor.domain.evaluation.set_rate_share')
+@patch('rumor.domain.evaluation.get_news_items', return_value=[])
+def test_map_news_item_partition_sets_rate_share(mock_get_news_items, mock_set_rate_share):
+    map_news_item_partition('news-items', datetime(2020, 1, 1), datetime(2020, 1, 2), 1, [],
+                            rate_share=0.25)
+
+    mock_set_rate_share.assert_called_once_with(0.25)
+    mock_get_news_items.assert_called_once_with('news-items', datetime(2020, 1, 1),
+                                                datetime(2020, 1, 2), shards=1)
+
+
+def test_profile_report_fits_in_a_dynamodb_item():
+    rng = random.Random(42)
+    vocabulary = [f'keyword-{i}' for i in range(200)]
+    news_items = [
+        {'news_item_id': f'{i}', 'score': rng.randint(1, 1000), 'url': f'url-{i}',
+         'title': f'Story number {i} about {" ".join(rng.sample(vocabulary, 3))}',
+         'keywords': rng.sample(vocabulary, 5), 'created_at_date': '2020-01-01'}
+        for i in range(500)
+    ]
+    subscriber_preferences = [
+        {'subscriber': f'subscriber-{s}@example.com', 'keyword': keyword,
+         'preference_weight': Decimal(rng.choice(['1.5', '2', '3']))}
+        for s in range(1500) for keyword in rng.sample(vocabulary, 3)
+    ]
+    report = dict(perform_profile_qualification(news_items, 1.0, 10, subscriber_preferences),
+                  version='1', created_at=1577880000, news_items=[])
+
+    profile_items = create_profile_items(report)
+    reference_report = create_reference_report(report)
+
+    assert len(profile_items) > 1000
+    assert len(json.dumps(reference_report, default=str)) < 100 * 1024
+    assert max(len(json.dumps(item, default=str)) for item in profile_items) < 4 * 1024
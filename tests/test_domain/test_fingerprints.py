@@ -0,0 +1,59 @@
+from rumor.domain.fingerprints import (FingerprintCache,
+                                       get_attribute_fingerprints,
+                                       get_changed_attributes, get_fingerprint,
+                                       load_fingerprints, save_fingerprints)
+
+
+def news_item(**kwargs):
+    item = {'news_item_id': '1', 'score': 10, 'title': 'Title', 'url': 'url',
+            'keywords': ['rust', 'python'], 'updated_at': 1}
+    item.update(kwargs)
+    return item
+
+
+def test_fingerprint_ignores_volatile_attributes_and_keyword_order():
+    fingerprints = get_attribute_fingerprints(news_item())
+
+    assert get_attribute_fingerprints(news_item(updated_at=2, ttl=3)) == fingerprints
+    assert get_attribute_fingerprints(news_item(keywords=['python', 'rust'])) == fingerprints
+    assert get_fingerprint(get_attribute_fingerprints(news_item(score=11))) != \
+        get_fingerprint(fingerprints)
+
+
+def test_get_changed_attributes():
+    cached = get_attribute_fingerprints(news_item())
+
+    assert get_changed_attributes(cached, get_attribute_fingerprints(news_item())) == []
+    assert get_changed_attributes(cached, get_attribute_fingerprints(
+        news_item(score=11, keywords=['go']))) == ['score', 'keywords']
+    assert get_changed_attributes(None, cached) == ['score', 'title', 'url', 'keywords']
+
+
+def test_fingerprint_cache_evicts_least_recently_put():
+    cache = FingerprintCache(max_entries=2)
+    cache.put('1', {})
+    cache.put('2', {})
+    cache.put('1', {})
+    cache.put('3', {})
+
+    assert list(cache.entries) == ['1', '3']
+    assert cache.get('2') is None
+
+
+def test_save_and_load_fingerprints(tmp_path):
+    path = str(tmp_path / 'fingerprints.json')
+    cache = FingerprintCache()
+    cache.put('1', get_attribute_fingerprints(news_item()))
+
+    save_fingerprints(cache, path)
+
+    assert load_fingerprints(path).entries == cache.entries
+    assert load_fingerprints(None).entries == {}
+    assert load_fingerprints(str(tmp_path / 'missing.json')).entries == {}
+
+
+def test_load_unreadable_fingerprints(tmp_path):
+    path = tmp_path / 'fingerprints.json'
+    path.write_text('not json')
+
+    assert load_fingerprints(str(path)).entries == {}
@@ -1,10 +1,15 @@
 import json
+import time
 from datetime import datetime, timedelta
 from unittest.mock import ANY, patch
 
 import pytest
 
-from rumor.domain import inspect
+from rumor.domain import inspect, inspect_records
+from rumor.domain.watermark import (WatermarkIndex, load_watermarks,
+                                    save_watermarks)
+from rumor.exceptions import UpstreamError
+from rumor.upstreams.tracing import get_trace_context
 
 
 @patch('rumor.domain.inspection.news_item_source_request')
@@ -47,7 +52,10 @@ class TestInspection:
                 'url': f'url-{i}',
                 'time': ANY
             } for i in range(5)],
-            queue_name=classification_queue_name
+            queue_name=classification_queue_name,
+            pack=True,
+            compress=True,
+            message_attributes=None
         )
         mock_delete.assert_called_once_with(messages=messages,
                                             queue_name=collection_queue_name)
@@ -151,3 +159,123 @@ class TestInspection:
         mock_delete.assert_called_with(messages=messages,
                                        queue_name=collection_queue_name)
         mock_send.assert_not_called()
+
+    def test_inspect_watermark_prefilter(self, mock_get, mock_send,
+                                         mock_delete, mock_get_news_item,
+                                         tmp_path):
+        old_created_at = int((datetime.now() - timedelta(hours=24)).timestamp())
+        watermark_path = str(tmp_path / 'watermarks.json')
+        save_watermarks(WatermarkIndex({100: old_created_at}), watermark_path)
+        messages = [
+            {'Body': json.dumps({'news_item_id': f'{i}'})}
+            for i in [10, 200]
+        ]
+        mock_get.return_value = messages
+        mock_get_news_item.return_value = {
+            'id': 200,
+            'url': 'some-url',
+            'time': int(datetime.now().timestamp())
+        }
+
+        inspect(collection_queue_name='collection-queue',
+                classification_queue_name='classification-queue',
+                batch_size=5,
+                news_item_max_age_hours=12,
+                target_api_url='https://some-url',
+                watermark_path=watermark_path)
+
+        mock_get_news_item.assert_called_once_with('200', 'https://some-url')
+        assert len(mock_send.call_args[1]['messages']) == 1
+        assert 200 in load_watermarks(watermark_path).samples
+
+
+@patch('rumor.domain.inspection.news_item_source_request')
+@patch('rumor.domain.inspection.send_messages')
+class TestInspectRecords:
+    def test_inspect_records_ok(self, mock_send, mock_get_news_item):
+        records = [
+            {'messageId': f'message-{i}',
+             'body': json.dumps({'news_item_id': f'{i}'})}
+            for i in range(3)
+        ]
+        created_at = int((datetime.now() - timedelta(hours=1)).timestamp())
+        mock_get_news_item.side_effect = lambda news_item_id, url: {
+            'id': news_item_id, 'url': f'url-{news_item_id}', 'time': created_at
+        }
+
+        failed = inspect_records(records=records,
+                                 classification_queue_name='classification-queue',
+                                 news_item_max_age_hours=12,
+                                 target_api_url='https://some-url')
+
+        assert failed == []
+        mock_send.assert_called_once_with(
+            messages=[{'id': f'{i}', 'url': f'url-{i}', 'time': created_at}
+                      for i in range(3)],
+            queue_name='classification-queue',
+            pack=True,
+            compress=True,
+            message_attributes=None
+        )
+
+    def test_inspect_records_carries_oldest_trace_context(self, mock_send, mock_get_news_item):
+        sent_at = time.time() - 5
+        records = [
+            {'messageId': f'message-{i}',
+             'body': json.dumps({'news_item_id': f'{i}'}),
+             'attributes': {'SentTimestamp': str(int(sent_at * 1000))},
+             'messageAttributes': {'rumor_trace': {'dataType': 'String', 'stringValue': json.dumps(
+                 {'trace_id': f'trace-{i}', 'discovered_at': sent_at - i, 'hops': []})}}}
+            for i in range(2)
+        ]
+        created_at = int((datetime.now() - timedelta(hours=1)).timestamp())
+        mock_get_news_item.side_effect = lambda news_item_id, url: {
+            'id': news_item_id, 'url': f'url-{news_item_id}', 'time': created_at
+        }
+
+        inspect_records(records=records,
+                        classification_queue_name='classification-queue',
+                        news_item_max_age_hours=12,
+                        target_api_url='https://some-url')
+
+        context = get_trace_context(
+            {'MessageAttributes': mock_send.call_args[1]['message_attributes']})
+        assert context['trace_id'] == 'trace-1'
+        hop, = context['hops']
+        assert hop['stage'] == 'inspect'
+        assert hop['queue_wait'] >= 5
+
+    def test_inspect_records_partial_failure(self, mock_send, mock_get_news_item):
+        records = [
+            {'messageId': f'message-{i}',
+             'body': json.dumps({'news_item_id': f'{i}'})}
+            for i in range(3)
+        ]
+        created_at = int((datetime.now() - timedelta(hours=1)).timestamp())
+
+        def get_news_item(news_item_id, url):
+            if news_item_id == '1':
+                raise UpstreamError('boom')
+            return {'id': news_item_id, 'url': 'some-url', 'time': created_at}
+        mock_get_news_item.side_effect = get_news_item
+
+        failed = inspect_records(records=records,
+                                 classification_queue_name='classification-queue',
+                                 news_item_max_age_hours=12,
+                                 target_api_url='https://some-url')
+
+        assert failed == ['message-1']
+        assert len(mock_send.call_args[1]['messages']) == 2
+
+    def test_inspect_records_nothing_to_send(self, mock_send, mock_get_news_item):
+        records = [{'messageId': 'message-1',
+                    'body': json.dumps({'news_item_id': '1'})}]
+        mock_get_news_item.return_value = {'id': 1}
+
+        failed = inspect_records(records=records,
+                                 classification_queue_name='classification-queue',
+                                 news_item_max_age_hours=12,
+                                 target_api_url='https://some-url')
+
+        assert failed == []
+        mock_send.assert_not_called()
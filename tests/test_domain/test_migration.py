@@ -0,0 +1,49 @@
+from unittest.mock import call, patch
+
+from rumor.domain.migration import migrate_news_item_shards
+from rumor.upstreams.sharding import get_partition_key
+
+
+def news_item(news_item_id, created_at_date='2020-01-01'):
+    return {'news_item_id': news_item_id, 'created_at_date': created_at_date, 'score': 1}
+
+
+@patch('rumor.domain.migration.batch_write_items')
+@patch('rumor.domain.migration.scan_items')
+def test_migrate_news_item_shards(mock_scan_items, mock_batch_write_items):
+    moved = news_item('1')
+    sharded_key = get_partition_key('2020-01-01', '2', 4)
+    in_place = news_item('2', sharded_key)
+    mock_scan_items.return_value = iter([[moved], [in_place]])
+
+    assert migrate_news_item_shards('news-items', 4, max_workers=2) == 1
+
+    target = dict(moved, created_at_date=get_partition_key('2020-01-01', '1', 4))
+    mock_batch_write_items.assert_has_calls([
+        call([{'PutRequest': {'Item': target}}], 'news-items', max_workers=2),
+        call([{'DeleteRequest': {'Key': {'created_at_date': '2020-01-01',
+                                         'news_item_id': '1'}}}],
+             'news-items', max_workers=2)
+    ])
+    assert mock_batch_write_items.call_count == 2
+
+
+@patch('rumor.domain.migration.batch_write_items')
+@patch('rumor.domain.migration.scan_items')
+def test_migrate_news_item_shards_back_to_unsharded(mock_scan_items, mock_batch_write_items):
+    mock_scan_items.return_value = iter([[news_item('1', '2020-01-01#3'), news_item('2')]])
+
+    assert migrate_news_item_shards('news-items', 1) == 1
+
+    put_requests = mock_batch_write_items.call_args_list[0][0][0]
+    assert put_requests == [{'PutRequest': {'Item': news_item('1')}}]
+
+
+@patch('rumor.domain.migration.batch_write_items')
+@patch('rumor.domain.migration.scan_items')
+def test_migrate_news_item_shards_dry_run(mock_scan_items, mock_batch_write_items):
+    mock_scan_items.return_value = iter([[news_item('1'), news_item('2')]])
+
+    assert migrate_news_item_shards('news-items', 4, dry_run=True) == 2
+
+    mock_batch_write_items.assert_not_called()
@@ -0,0 +1,76 @@
+import copy
+from decimal import Decimal
+
+import pytest
+
+from rumor.domain.evaluation import perform_news_item_qualification
+from rumor.domain.personalization import (build_profiles, evaluate_profiles,
+                                          group_profiles, profile_id)
+
+
+def subscriber_preference(subscriber, keyword, weight):
+    return {
+        'preference_type': 'SUBSCRIBER_KEYWORD',
+        'preference_key': f'{subscriber}#{keyword}',
+        'subscriber': subscriber,
+        'keyword': keyword,
+        'preference_weight': Decimal(str(weight))
+    }
+
+
+def test_group_profiles_shares_identical_profiles():
+    preferences = [
+        subscriber_preference('a@example.com', 'rust', 2),
+        subscriber_preference('b@example.com', 'rust', 2),
+        subscriber_preference('c@example.com', 'go', 2),
+    ]
+
+    groups = group_profiles(build_profiles(preferences))
+
+    assert len(groups) == 2
+    rust_profile = profile_id({'rust': Decimal('2')})
+    assert groups[rust_profile][1] == ['a@example.com', 'b@example.com']
+
+
+@pytest.mark.parametrize('profile', [
+    {'keyword-0': 1.5},
+    {'keyword-1': 3.0, 'keyword-2': 0.5},
+    {},
+])
+def test_evaluate_profiles_matches_single_profile_qualification(profile):
+    news_items = [
+        {
+            'news_item_id': f'{i}',
+            'score': 10 * i + (i % 7) * 13,
+            'keywords': [f'keyword-{i % 3}', 'common'],
+        }
+        for i in range(50)
+    ]
+    preferences = [{'preference_key': k, 'preference_weight': w}
+                   for k, w in profile.items()]
+    expected = perform_news_item_qualification(copy.deepcopy(news_items),
+                                               1.5, 10, preferences)
+    groups = {'pid': (profile, ['a@example.com'])}
+
+    results = evaluate_profiles(news_items, groups, threshold=1.5, limit=10)
+
+    assert [r['news_item_id'] for r in results['pid']] == \
+        [e['news_item_id'] for e in expected]
+    assert [float(r['modified_score']) for r in results['pid']] == \
+        pytest.approx([float(e['modified_score']) for e in expected])
+
+
+def test_evaluate_profiles_many_groups_single_pass():
+    news_items = [
+        {'news_item_id': f'{i}', 'score': 100, 'keywords': [f'keyword-{i}']}
+        for i in range(20)
+    ]
+    groups = {
+        f'pid-{i}': ({f'keyword-{i}': 3}, [f'subscriber-{i}'])
+        for i in range(20)
+    }
+
+    results = evaluate_profiles(news_items, groups, threshold=1.5, limit=3)
+
+    for i in range(20):
+        assert [r['news_item_id'] for r in results[f'pid-{i}']] == [f'{i}']
@@ -0,0 +1,78 @@
+import io
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+
+from rumor.domain.preferences import (diff_keywords, read_keywords,
+                                      sync_keywords, write_keywords)
+
+
+def test_diff_keywords():
+    current = {'rust': Decimal('2'), 'go': Decimal('1.5'), 'java': Decimal('0.5')}
+    desired = {'rust': Decimal('2.0'), 'go': Decimal('1.75'), 'zig': Decimal('3')}
+
+    assert diff_keywords(current, desired) == {
+        'created': ['zig'], 'updated': ['go'], 'deleted': [], 'unchanged': ['rust']
+    }
+    assert diff_keywords(current, desired, prune=True)['deleted'] == ['java']
+
+
+@pytest.mark.parametrize('content, fmt', [
+    ('keyword,weight\nRust,2\ngo, 1.5\n# comment\n\n', 'csv'),
+    ('{"rust": 2, "go": "1.5"}', 'json'),
+    ('[{"keyword": "rust", "weight": 2}, {"keyword": "go", "weight": 1.5}]', 'json'),
+])
+def test_read_keywords(content, fmt):
+    assert read_keywords(io.StringIO(content), fmt) == {'rust': Decimal('2'), 'go': Decimal('1.5')}
+
+
+def test_read_keywords_invalid_weight():
+    with pytest.raises(ValueError):
+        read_keywords(io.StringIO('rust,lots\n'), 'csv')
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'json'])
+def test_write_and_read_keywords(fmt):
+    preferences = [{'preference_key': 'rust', 'preference_weight': Decimal('2.5')},
+                   {'preference_key': 'go', 'preference_weight': Decimal('1')}]
+    f = io.StringIO()
+
+    write_keywords(preferences, f, fmt)
+    f.seek(0)
+
+    assert read_keywords(f, fmt) == {'go': Decimal('1'), 'rust': Decimal('2.5')}
+
+
+@patch('rumor.domain.preferences.delete_preferences')
+@patch('rumor.domain.preferences.store_preferences')
+@patch('rumor.domain.preferences.get_preferences')
+class TestSyncKeywords:
+    def setup_method(self, method):
+        self.current = [
+            {'preference_key': 'rust', 'preference_weight': Decimal('2')},
+            {'preference_key': 'java', 'preference_weight': Decimal('1')}
+        ]
+        self.desired = {'rust': Decimal('3'), 'go': Decimal('1.5')}
+
+    def test_sync_keywords(self, mock_get_preferences, mock_store_preferences,
+                           mock_delete_preferences):
+        mock_get_preferences.return_value = self.current
+
+        changes = sync_keywords(self.desired, 'preferences', prune=True)
+
+        assert changes['created'] == ['go']
+        assert changes['updated'] == ['rust']
+        mock_store_preferences.assert_called_once_with(
+            {'go': Decimal('1.5'), 'rust': Decimal('3')}, 'preferences', max_workers=4)
+        mock_delete_preferences.assert_called_once_with(['java'], 'preferences', max_workers=4)
+
+    def test_sync_keywords_dry_run(self, mock_get_preferences, mock_store_preferences,
+                                   mock_delete_preferences):
+        mock_get_preferences.return_value = self.current
+
+        changes = sync_keywords(self.desired, 'preferences', dry_run=True)
+
+        assert changes['deleted'] == []
+        mock_store_preferences.assert_not_called()
+        mock_delete_preferences.assert_not_called()
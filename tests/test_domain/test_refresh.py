@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta
+from unittest.mock import ANY, patch
+
+from rumor.domain import refresh
+from rumor.domain.fingerprints import (get_attribute_fingerprints,
+                                       get_fingerprint)
+from rumor.domain.refresh import schedule_refresh, score_velocity
+
+
+def news_item(news_item_id, score, age_hours, updated_hours_ago, **kwargs):
+    now = datetime.now()
+    item = {
+        'news_item_id': news_item_id,
+        'score': score,
+        'created_at': int((now - timedelta(hours=age_hours)).timestamp()),
+        'updated_at': int((now - timedelta(hours=updated_hours_ago)).timestamp()),
+        'ttl': 12345,
+    }
+    item.update(kwargs)
+    return item
+
+
+def test_score_velocity_prefers_observed_history():
+    item = news_item('1', 150, age_hours=10, updated_hours_ago=0,
+                     previous_score=50,
+                     previous_updated_at=int(datetime.now().timestamp()) - 100)
+
+    assert score_velocity(item) == 1.0
+
+
+def test_schedule_refresh_prioritizes_fast_movers_near_threshold():
+    now = datetime.now().timestamp()
+    items = [
+        news_item('slow', 10, age_hours=40, updated_hours_ago=1),
+        news_item('fresh', 100, age_hours=2, updated_hours_ago=1),
+        news_item('settled', 1000, age_hours=2, updated_hours_ago=0),
+        news_item('trending', 150, age_hours=3, updated_hours_ago=2),
+    ]
+
+    selected = schedule_refresh(items, now, fetch_budget=2,
+                                qualification_threshold=1.0)
+
+    assert [i['news_item_id'] for i in selected] == ['trending', 'fresh']
+
+
+@patch('rumor.domain.refresh.update_news_item')
+@patch('rumor.domain.refresh.news_item_source_request')
+@patch('rumor.domain.refresh.get_news_items')
+def test_refresh_ok(mock_get_news_items, mock_source_request, mock_update_news_item):
+    items = [news_item(f'{i}', 10 * i, age_hours=i + 1, updated_hours_ago=1,
+                       fingerprint=f'fingerprint-{i}')
+             for i in range(5)]
+    mock_get_news_items.return_value = items
+    mock_source_request.side_effect = lambda news_item_id, url: {
+        'id': news_item_id,
+        'score': 999,
+        'url': 'some-url',
+        'title': 'Some title',
+        'time': int(datetime.now().timestamp())
+    }
+
+    refreshed = refresh(news_item_table_name='news-items',
+                        target_api_url='https://some-url',
+                        news_item_max_age_hours=48,
+                        evaluation_period_hours=72,
+                        qualification_threshold=1.5,
+                        fetch_budget=2)
+
+    assert refreshed == 2
+    mock_get_news_items.assert_called_once_with('news-items', ANY, ANY, shards=1)
+    assert mock_source_request.call_count == 2
+    stored, attribute_names, fingerprint, table_name = mock_update_news_item.call_args[0]
+    assert stored['score'] == 999
+    assert stored['ttl'] == 12345
+    assert 'previous_score' in stored and 'previous_updated_at' in stored
+    assert {'previous_score', 'previous_updated_at', 'ttl'} <= set(attribute_names)
+    assert 'news_item_id' not in attribute_names and 'created_at_date' not in attribute_names
+    assert fingerprint == get_fingerprint(get_attribute_fingerprints(stored))
+    assert table_name == 'news-items'
+    assert mock_update_news_item.call_args[1] == {
+        'previous_fingerprint': f'fingerprint-{stored["news_item_id"]}'}
+
+
+@patch('rumor.domain.refresh.update_news_item')
+@patch('rumor.domain.refresh.news_item_source_request')
+@patch('rumor.domain.refresh.get_news_items')
+def test_refresh_skips_concurrently_updated_items(mock_get_news_items, mock_source_request,
+                                                  mock_update_news_item):
+    mock_get_news_items.return_value = [news_item('1', 10, age_hours=2, updated_hours_ago=1)]
+    mock_source_request.return_value = {
+        'id': '1', 'score': 999, 'url': 'some-url', 'title': 'Some title',
+        'time': int(datetime.now().timestamp())
+    }
+    mock_update_news_item.return_value = False
+
+    refreshed = refresh(news_item_table_name='news-items',
+                        target_api_url='https://some-url',
+                        news_item_max_age_hours=48,
+                        evaluation_period_hours=72,
+                        qualification_threshold=1.5,
+                        fetch_budget=2)
+
+    assert refreshed == 0
+    assert mock_update_news_item.call_args[1] == {'previous_fingerprint': None}
+
+
+@patch('rumor.domain.refresh.news_item_source_request')
+@patch('rumor.domain.refresh.get_news_items')
+def test_refresh_no_news_items(mock_get_news_items, mock_source_request):
+    mock_get_news_items.return_value = []
+
+    refreshed = refresh(news_item_table_name='news-items',
+                        target_api_url='https://some-url',
+                        news_item_max_age_hours=48,
+                        evaluation_period_hours=72,
+                        qualification_threshold=1.5,
+                        fetch_budget=2)
+
+    assert refreshed == 0
+    mock_source_request.assert_not_called()
@@ -0,0 +1,100 @@
+import json
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+
+from rumor.domain.rendering import (render_message, render_report,
+                                    reset_render_cache)
+
+
+@pytest.fixture(autouse=True)
+def render_cache():
+    reset_render_cache()
+
+
+def create_report(created_at=0):
+    return {
+        'version': '1',
+        'created_at': created_at,
+        'news_items': [
+            {'url': 'some-url-1', 'score': 10, 'title': 'Rust <3'},
+            {'url': 'some-url-2', 'score': 5, 'title': 'Go',
+             'modified_score': Decimal('7.5')}
+        ]
+    }
+
+
+def test_render_report_text():
+    rendered = render_report(create_report())
+
+    assert rendered['text'] == (
+        'Created 1970-01-01 00:00:00+00:00 (UTC)\n\n'
+        '[10 + 0] Rust <3\n'
+        'some-url-1\n'
+        '\n'
+        '[5 + 2.5] Go\n'
+        'some-url-2\n'
+        '\n'
+    )
+
+
+def test_render_report_decimal_created_at():
+    rendered = render_report(create_report(created_at=Decimal('60')))
+
+    assert rendered['text'].startswith('Created 1970-01-01 00:01:00+00:00 (UTC)')
+
+
+def test_render_report_html():
+    rendered = render_report(create_report(), html=True)
+
+    assert '<a href="some-url-1">Rust &lt;3</a> [10 + 0]' in rendered['html']
+    assert '<a href="some-url-2">Go</a> [5 + 2.5]' in rendered['html']
+
+
+def test_render_report_does_not_mutate_report():
+    report = create_report()
+    original = json.loads(json.dumps(report, default=str))
+
+    render_report(report)
+
+    assert json.loads(json.dumps(report, default=str)) == original
+
+
+def test_render_report_cache():
+    report = create_report()
+
+    rendered = render_report(report)
+    report['news_items'] = []
+
+    assert render_report(report) is rendered
+    assert render_report(report, 'profile#1') is not rendered
+    assert render_report(report, html=True) is not rendered
+    assert render_report(create_report(created_at=60)) is not rendered
+
+
+def test_render_message():
+    message = json.loads(render_message(create_report()))
+
+    assert set(message) == {'default'}
+    assert message['default'].startswith('Created ')
+
+
+def test_render_message_html():
+    message = json.loads(render_message(create_report(), html=True))
+
+    assert set(message) == {'default', 'https'}
+    assert message['default'].startswith('Created ')
+    assert message['https'].startswith('<!DOCTYPE html>')
+
+
+def test_render_message_falls_back_to_text():
+    report = create_report()
+    text_only = json.dumps({'default': render_report(report)['text']})
+    reset_render_cache()
+
+    with patch('rumor.domain.rendering.MAX_MESSAGE_BYTES', len(text_only) + 10):
+        message = json.loads(render_message(report, html=True))
+
+    assert set(message) == {'default'}
+    assert message['default'].startswith('Created ')
@@ -1,14 +1,32 @@
+import json
 from datetime import datetime
+from decimal import Decimal
 from unittest.mock import ANY, patch
 
+import pytest
+
 from rumor.domain import send_reports
+from rumor.domain.personalization import profile_id
+from rumor.domain.rendering import reset_render_cache
+from rumor.exceptions import UpstreamError
+from rumor.upstreams.sharding import get_partition_key
+
+
+@pytest.fixture(autouse=True)
+def render_cache():
+    reset_render_cache()
 
 
-@patch('rumor.domain.report.send_notification')
+@patch('rumor.domain.report.mark_report_delivered')
+@patch('rumor.domain.report.resolve_topic_arn', return_value='topic-arn')
+@patch('rumor.domain.report.publish_notifications')
 @patch('rumor.domain.report.get_reports')
 class TestReport:
-    def test_send_report_ok(self, mock_get_reports, mock_send_notification):
+    def test_send_report_ok(self, mock_get_reports, mock_publish_notifications,
+                            mock_resolve_topic_arn, mock_mark_report_delivered):
+        mock_publish_notifications.side_effect = lambda entries, _: {e['Id'] for e in entries}
         mock_report = {
+            'version': '1',
             'created_at': int(datetime.now().timestamp()),
             'news_items': [
                 {
@@ -28,10 +46,50 @@ class TestReport:
                      evaluation_report_table_name=evaluation_report_table_name,
                      topic_arn_hint=topic_arn_hint)
 
-        mock_get_reports.assert_called_once_with(evaluation_report_table_name, ANY, ANY)
-        mock_send_notification.assert_called_once_with(ANY, topic_arn_hint, 'Rumor Report')
+        mock_get_reports.assert_called_once_with(evaluation_report_table_name, ANY, ANY, ['1', '2'])
+        mock_resolve_topic_arn.assert_called_once_with(topic_arn_hint)
+        mock_publish_notifications.assert_called_once_with(
+            [{'Id': '0', 'Subject': 'Rumor Report', 'Message': ANY, 'MessageStructure': 'json'}],
+            'topic-arn')
+        mock_mark_report_delivered.assert_called_once_with(
+            mock_report, {'global'}, evaluation_report_table_name)
+
+    def test_send_report_skips_delivered(self, mock_get_reports, mock_publish_notifications,
+                                         mock_resolve_topic_arn, mock_mark_report_delivered):
+        mock_get_reports.return_value = [{
+            'version': '1',
+            'created_at': int(datetime.now().timestamp()),
+            'news_items': [{'url': 'some-url', 'score': 1, 'title': 'title'}],
+            'delivered': {'global'}
+        }]
+
+        send_reports(report_period_hours=24,
+                     evaluation_report_table_name='evaluation-reports',
+                     topic_arn_hint='topic-hint')
+
+        mock_publish_notifications.assert_not_called()
+        mock_mark_report_delivered.assert_not_called()
+
+    def test_send_report_partial_failure(self, mock_get_reports, mock_publish_notifications,
+                                         mock_resolve_topic_arn, mock_mark_report_delivered):
+        mock_publish_notifications.return_value = {'1'}
+        reports = [{
+            'version': '1',
+            'created_at': created_at,
+            'news_items': [{'url': 'some-url', 'score': 1, 'title': 'title'}]
+        } for created_at in [1000, 2000]]
+        mock_get_reports.return_value = reports
+
+        with pytest.raises(UpstreamError):
+            send_reports(report_period_hours=24,
+                         evaluation_report_table_name='evaluation-reports',
+                         topic_arn_hint='topic-hint')
+
+        mock_mark_report_delivered.assert_called_once_with(
+            reports[1], {'global'}, 'evaluation-reports')
 
-    def test_send_report_no_reports(self, mock_get_reports, mock_send_notification):
+    def test_send_report_no_reports(self, mock_get_reports, mock_publish_notifications,
+                                    mock_resolve_topic_arn, mock_mark_report_delivered):
         mock_get_reports.return_value = []
 
         report_period_hours = 24
@@ -42,5 +100,223 @@ class TestReport:
                      evaluation_report_table_name=evaluation_report_table_name,
                      topic_arn_hint=topic_arn_hint)
 
-        mock_get_reports.assert_called_once_with(evaluation_report_table_name, ANY, ANY)
-        mock_send_notification.assert_not_called()
+        mock_get_reports.assert_called_once_with(evaluation_report_table_name, ANY, ANY, ['1', '2'])
+        mock_publish_notifications.assert_not_called()
+
+
+@patch('rumor.domain.report.mark_report_delivered')
+@patch('rumor.domain.report.resolve_topic_arn', return_value='personalized-topic-arn')
+@patch('rumor.domain.report.publish_notifications')
+@patch('rumor.domain.report.get_subscriber_preferences')
+@patch('rumor.domain.report.get_reports')
+def test_send_personalized_reports(mock_get_reports, mock_get_subscriber_preferences,
+                                   mock_publish_notifications, mock_resolve_topic_arn,
+                                   mock_mark_report_delivered):
+    mock_publish_notifications.side_effect = lambda entries, _: {e['Id'] for e in entries}
+    mock_get_subscriber_preferences.return_value = [
+        {'subscriber': s, 'keyword': 'rust', 'preference_weight': Decimal('2')}
+        for s in ['a@example.com', 'b@example.com']
+    ]
+    pid = profile_id({'rust': Decimal('2')})
+    mock_report = {
+        'version': '1',
+        'created_at': int(datetime.now().timestamp()),
+        'news_items': [],
+        'profiles': {
+            pid: [{'news_item_id': '1', 'modified_score': Decimal('20')}],
+            'stale-profile': [{'news_item_id': '1', 'modified_score': Decimal('20')}],
+        },
+        'profile_news_items': {
+            '1': {'news_item_id': '1', 'score': 10, 'title': 'Rust', 'url': 'some-url'}
+        }
+    }
+    mock_get_reports.return_value = [mock_report]
+
+    send_reports(report_period_hours=24,
+                 evaluation_report_table_name='evaluation-reports',
+                 topic_arn_hint='topic-hint',
+                 preference_table_name='preferences',
+                 personalized_topic_arn_hint='personalized-topic-hint',
+                 html=True)
+
+    mock_resolve_topic_arn.assert_called_once_with('personalized-topic-hint')
+    mock_publish_notifications.assert_called_once_with([{
+        'Id': '0',
+        'Subject': 'Rumor Report',
+        'Message': ANY,
+        'MessageStructure': 'json',
+        'MessageAttributes': {'subscriber': {
+            'DataType': 'String.Array',
+            'StringValue': json.dumps(['a@example.com', 'b@example.com'])
+        }}
+    }], 'personalized-topic-arn')
+    message = json.loads(mock_publish_notifications.call_args[0][0][0]['Message'])
+    assert '[10 + 10] Rust' in message['default']
+    assert '<a href="some-url">Rust</a>' in message['https']
+    mock_mark_report_delivered.assert_called_once_with(
+        mock_report, {f'profile#{pid}#0'}, 'evaluation-reports')
+
+
+@patch('rumor.domain.report.mark_report_delivered')
+@patch('rumor.domain.report.resolve_topic_arn', return_value='personalized-topic-arn')
+@patch('rumor.domain.report.publish_notifications')
+@patch('rumor.domain.report.get_items_by_keys')
+@patch('rumor.domain.report.get_subscriber_preferences')
+@patch('rumor.domain.report.get_reports')
+def test_send_personalized_reference_reports(mock_get_reports, mock_get_subscriber_preferences,
+                                             mock_get_items_by_keys, mock_publish_notifications,
+                                             mock_resolve_topic_arn, mock_mark_report_delivered):
+    mock_publish_notifications.side_effect = lambda entries, _: {e['Id'] for e in entries}
+    mock_get_subscriber_preferences.return_value = [
+        {'subscriber': 'a@example.com', 'keyword': 'rust', 'preference_weight': Decimal('2')}
+    ]
+    pid = profile_id({'rust': Decimal('2')})
+    mock_get_reports.return_value = [{
+        'version': '2',
+        'created_at': 1000,
+        'news_items': [],
+        'news_item_keys': {'1': '2020-01-01'},
+        'profile_groups': Decimal(1)
+    }]
+    profile_items = [{'version': f'profile#{pid}', 'created_at': 1000,
+                      'news_items': [{'news_item_id': '1', 'modified_score': Decimal('20')}]}]
+    news_items = [{'news_item_id': '1', 'score': 10, 'title': 'Rust', 'url': 'some-url'}]
+    mock_get_items_by_keys.side_effect = lambda table_name, keys: (
+        profile_items if table_name == 'evaluation-reports' else news_items)
+
+    send_reports(report_period_hours=24,
+                 evaluation_report_table_name='evaluation-reports',
+                 topic_arn_hint='topic-hint',
+                 preference_table_name='preferences',
+                 personalized_topic_arn_hint='personalized-topic-hint',
+                 news_item_table_name='news-items')
+
+    mock_get_items_by_keys.assert_any_call(
+        'evaluation-reports', [{'version': f'profile#{pid}', 'created_at': 1000}])
+    entries = mock_publish_notifications.call_args[0][0]
+    assert len(entries) == 1
+    assert '[10 + 10] Rust' in json.loads(entries[0]['Message'])['default']
+    mock_mark_report_delivered.assert_called_once_with(
+        ANY, {f'profile#{pid}#0'}, 'evaluation-reports')
+
+
+def resolve_global_topic_only(topic_arn_hint):
+    if topic_arn_hint == 'personalized-topic-hint':
+        raise UpstreamError('No topic matching "personalized-topic-hint"')
+    return 'topic-arn'
+
+
+@patch('rumor.domain.report.mark_report_delivered')
+@patch('rumor.domain.report.resolve_topic_arn', side_effect=resolve_global_topic_only)
+@patch('rumor.domain.report.publish_notifications')
+@patch('rumor.domain.report.get_subscriber_preferences')
+@patch('rumor.domain.report.get_reports')
+def test_send_reports_marks_delivered_before_failing(mock_get_reports,
+                                                     mock_get_subscriber_preferences,
+                                                     mock_publish_notifications,
+                                                     mock_resolve_topic_arn,
+                                                     mock_mark_report_delivered):
+    mock_publish_notifications.side_effect = lambda entries, _: {e['Id'] for e in entries}
+    mock_get_subscriber_preferences.return_value = [
+        {'subscriber': 'a@example.com', 'keyword': 'rust', 'preference_weight': Decimal('2')}
+    ]
+    mock_report = {
+        'version': '1',
+        'created_at': int(datetime.now().timestamp()),
+        'news_items': [{'url': 'some-url', 'score': 1, 'title': 'title'}],
+        'profiles': {
+            profile_id({'rust': Decimal('2')}): [{'news_item_id': '1',
+                                                 'modified_score': Decimal('20')}]
+        },
+        'profile_news_items': {
+            '1': {'news_item_id': '1', 'score': 10, 'title': 'Rust', 'url': 'some-url'}
+        }
+    }
+    mock_get_reports.return_value = [mock_report]
+
+    with pytest.raises(UpstreamError):
+        send_reports(report_period_hours=24,
+                     evaluation_report_table_name='evaluation-reports',
+                     topic_arn_hint='topic-hint',
+                     preference_table_name='preferences',
+                     personalized_topic_arn_hint='personalized-topic-hint')
+
+    mock_mark_report_delivered.assert_called_once_with(
+        mock_report, {'global'}, 'evaluation-reports')
+
+
+@patch('rumor.domain.report.mark_report_delivered')
+@patch('rumor.domain.report.resolve_topic_arn', return_value='topic-arn')
+@patch('rumor.domain.report.publish_notifications')
+@patch('rumor.domain.report.get_items_by_keys')
+@patch('rumor.domain.report.get_reports')
+def test_send_reference_reports(mock_get_reports, mock_get_items_by_keys,
+                                mock_publish_notifications, mock_resolve_topic_arn,
+                                mock_mark_report_delivered):
+    mock_publish_notifications.side_effect = lambda entries, _: {e['Id'] for e in entries}
+    mock_get_reports.return_value = [
+        {
+            'version': '2',
+            'created_at': created_at,
+            'news_items': [{'news_item_id': '1', 'modified_score': Decimal('15')}],
+            'news_item_keys': {'1': '2020-01-01'}
+        } for created_at in [1000, 2000]
+    ]
+    mock_get_items_by_keys.return_value = [
+        {'news_item_id': '1', 'score': 10, 'title': 'Rust', 'url': 'some-url'}
+    ]
+
+    send_reports(report_period_hours=24,
+                 evaluation_report_table_name='evaluation-reports',
+                 topic_arn_hint='topic-hint',
+                 news_item_table_name='news-items')
+
+    mock_get_items_by_keys.assert_called_once_with(
+        'news-items', [{'created_at_date': '2020-01-01', 'news_item_id': '1'}])
+    entries = mock_publish_notifications.call_args[0][0]
+    assert len(entries) == 2
+    message = json.loads(entries[0]['Message'])
+    assert set(message) == {'default'}
+    assert '[10 + 5] Rust' in message['default']
+
+
+@patch('rumor.domain.report.mark_report_delivered')
+@patch('rumor.domain.report.resolve_topic_arn', return_value='topic-arn')
+@patch('rumor.domain.report.publish_notifications')
+@patch('rumor.domain.report.get_items_by_keys')
+@patch('rumor.domain.report.get_reports')
+def test_send_sharded_reference_reports_with_unsharded_items(
+        mock_get_reports, mock_get_items_by_keys, mock_publish_notifications,
+        mock_resolve_topic_arn, mock_mark_report_delivered):
+    mock_publish_notifications.side_effect = lambda entries, _: {e['Id'] for e in entries}
+    mock_get_reports.return_value = [{
+        'version': '2',
+        'created_at': 1000,
+        'news_items': [{'news_item_id': '1', 'modified_score': Decimal('15')},
+                       {'news_item_id': '2', 'modified_score': Decimal('25')}],
+        'news_item_keys': {'1': '2020-01-01', '2': '2020-01-01'}
+    }]
+    stored = {
+        (get_partition_key('2020-01-01', '1', 4), '1'):
+            {'news_item_id': '1', 'created_at_date': get_partition_key('2020-01-01', '1', 4),
+             'score': 10, 'title': 'Sharded', 'url': 'some-url'},
+        ('2020-01-01', '2'):
+            {'news_item_id': '2', 'created_at_date': '2020-01-01',
+             'score': 20, 'title': 'Unsharded', 'url': 'some-url'}
+    }
+    mock_get_items_by_keys.side_effect = lambda table_name, keys: [
+        stored[(k['created_at_date'], k['news_item_id'])] for k in keys
+        if (k['created_at_date'], k['news_item_id']) in stored]
+
+    send_reports(report_period_hours=24,
+                 evaluation_report_table_name='evaluation-reports',
+                 topic_arn_hint='topic-hint',
+                 news_item_table_name='news-items',
+                 shards=4)
+
+    assert mock_get_items_by_keys.call_count == 2
+    mock_get_items_by_keys.assert_called_with(
+        'news-items', [{'created_at_date': '2020-01-01', 'news_item_id': '2'}])
+    message = json.loads(mock_publish_notifications.call_args[0][0][0]['Message'])['default']
+    assert '[10 + 5] Sharded' in message
+    assert '[20 + 5] Unsharded' in message
@@ -0,0 +1,112 @@
+from decimal import Decimal
+
+from boto3.dynamodb.types import Binary
+
+from rumor.domain.report_references import (create_profile_items,
+                                            create_reference_report,
+                                            decode_snapshot, encode_snapshot,
+                                            get_news_item_keys,
+                                            get_profile_keys, get_profiles,
+                                            resolve_report)
+
+
+def create_news_item(i):
+    return {
+        'news_item_id': f'{i}',
+        'created_at_date': '2020-01-01',
+        'title': f'title-{i}',
+        'url': f'url-{i}',
+        'score': Decimal(10 * i),
+        'keywords': [f'keyword-{i}']
+    }
+
+
+def create_report():
+    return {
+        'version': '1',
+        'created_at': 1000,
+        'config': {},
+        'news_items': [dict(create_news_item(2), modified_score=Decimal('30.5'))],
+        'profiles': {'pid': [{'news_item_id': '3', 'modified_score': Decimal('60')}]},
+        'profile_news_items': {'3': create_news_item(3)}
+    }
+
+
+def test_create_reference_report():
+    report = create_reference_report(create_report())
+
+    assert report == {
+        'version': '2',
+        'created_at': 1000,
+        'config': {},
+        'news_items': [{'news_item_id': '2', 'modified_score': Decimal('30.5')}],
+        'news_item_keys': {'2': '2020-01-01', '3': '2020-01-01'},
+        'profile_groups': Decimal(1)
+    }
+    assert sorted(get_news_item_keys(report), key=lambda k: k['news_item_id']) == [
+        {'created_at_date': '2020-01-01', 'news_item_id': '2'},
+        {'created_at_date': '2020-01-01', 'news_item_id': '3'}
+    ]
+
+
+def test_resolve_report():
+    report = create_reference_report(create_report())
+    news_items = {ni['news_item_id']: ni for ni in [create_news_item(2), create_news_item(3)]}
+
+    resolved = resolve_report(report, news_items)
+
+    assert resolved['news_items'] == [dict(create_news_item(2), modified_score=Decimal('30.5'))]
+    assert resolved['profile_news_items'] == news_items
+    assert 'news_item_keys' not in resolved
+
+
+def test_profile_items():
+    report = create_report()
+    report['profiles']['empty'] = []
+
+    items = create_profile_items(report)
+
+    assert items == [{'version': 'profile#pid', 'created_at': 1000,
+                      'news_items': [{'news_item_id': '3', 'modified_score': Decimal('60')}]}]
+    assert get_profile_keys(report, ['pid', 'other']) == [
+        {'version': 'profile#pid', 'created_at': 1000},
+        {'version': 'profile#other', 'created_at': 1000}
+    ]
+    assert get_profiles(items) == {'pid': report['profiles']['pid']}
+
+
+def test_resolve_report_missing_news_items():
+    report = create_reference_report(create_report())
+
+    resolved = resolve_report(report, {})
+
+    assert resolved['news_items'] == []
+    assert resolved['profile_news_items'] == {}
+
+
+def test_resolve_report_from_snapshot():
+    report = create_reference_report(create_report(), include_snapshot=True)
+    report['snapshot'] = Binary(report['snapshot'])
+
+    resolved = resolve_report(report, {})
+
+    assert get_news_item_keys(report) == []
+    assert resolved['news_items'] == [{
+        'news_item_id': '2', 'title': 'title-2', 'url': 'url-2', 'score': 20,
+        'modified_score': Decimal('30.5')
+    }]
+    assert 'snapshot' not in resolved
+
+
+def test_resolve_report_version_1():
+    report = create_report()
+    assert resolve_report(report, {}) is report
+    assert get_news_item_keys(report) == []
+
+
+def test_snapshot_roundtrip():
+    news_items = [dict(create_news_item(1), score=Decimal('1.5'))]
+
+    assert decode_snapshot(encode_snapshot(news_items)) == {
+        '1': {'news_item_id': '1', 'title': 'title-1', 'url': 'url-1', 'score': Decimal('1.5')}
+    }
@@ -0,0 +1,97 @@
+from datetime import datetime
+from unittest.mock import patch
+
+from rumor.domain.search import (rebuild_search_index,
+                                 rebuild_search_index_from_table,
+                                 search_news_items, to_match_query,
+                                 update_search_index)
+
+
+def news_item(news_item_id, title, keywords, score=100, created_at=1577880000, updated_at=None):
+    return {
+        'news_item_id': str(news_item_id),
+        'title': title,
+        'keywords': keywords,
+        'url': f'https://example.com/{news_item_id}',
+        'score': score,
+        'created_at': created_at,
+        'created_at_date': datetime.fromtimestamp(created_at).strftime('%Y-%m-%d'),
+        'updated_at': updated_at or created_at
+    }
+
+
+def test_update_and_search(tmp_path):
+    path = str(tmp_path / 'search.db')
+    update_search_index([
+        news_item(1, 'Compiling Rust to WebAssembly', ['compiling', 'rust', 'webassembly'], 300),
+        news_item(2, 'WebAssembly outside the browser', ['webassembly', 'browser'], 50),
+        news_item(3, 'Postgres performance tips', ['postgres', 'performance'], 200),
+    ], path)
+
+    results = search_news_items(path, 'webassembly')
+
+    assert {ni['news_item_id'] for ni in results} == {'1', '2'}
+    assert results[0]['keywords']
+    assert [ni['news_item_id'] for ni in search_news_items(path, 'webassembly', min_score=100)] == ['1']
+    assert [ni['news_item_id'] for ni in search_news_items(path, 'compile rust')] == ['1']
+    assert search_news_items(path, 'kubernetes') == []
+
+
+def test_search_since(tmp_path):
+    path = str(tmp_path / 'search.db')
+    update_search_index([
+        news_item(1, 'WebAssembly in 2019', ['webassembly'], created_at=1546300800),
+        news_item(2, 'WebAssembly in 2020', ['webassembly'], created_at=1580515200),
+    ], path)
+
+    results = search_news_items(path, 'webassembly', since=datetime(2020, 1, 1))
+
+    assert [ni['news_item_id'] for ni in results] == ['2']
+
+
+def test_update_search_index_keeps_newest_version(tmp_path):
+    path = str(tmp_path / 'search.db')
+    update_search_index([news_item(1, 'Old title', ['old'], updated_at=1577880100)], path)
+    update_search_index([news_item(1, 'New title', ['new'], score=500, updated_at=1577880200)], path)
+    update_search_index([news_item(1, 'Stale title', ['stale'], updated_at=1577880150)], path)
+
+    assert search_news_items(path, 'old') == []
+    assert search_news_items(path, 'stale') == []
+    assert [ni['score'] for ni in search_news_items(path, 'new')] == [500]
+
+
+def test_update_search_index_without_path():
+    assert update_search_index([news_item(1, 'Title', [])], None) == 0
+
+
+def test_rebuild_search_index(tmp_path):
+    path = str(tmp_path / 'search.db')
+    update_search_index([news_item(1, 'Replaced story', ['replaced'])], path)
+    batches = [[news_item(i, f'Story {i} about sqlite', ['sqlite'])] for i in range(2, 5)]
+
+    count = rebuild_search_index(iter(batches), path)
+    update_search_index([news_item(5, 'Incremental sqlite story', ['sqlite'])], path)
+
+    assert count == 3
+    assert search_news_items(path, 'replaced') == []
+    assert {ni['news_item_id'] for ni in search_news_items(path, 'sqlite')} == {'2', '3', '4', '5'}
+
+
+@patch('rumor.domain.search.scan_items')
+def test_rebuild_search_index_from_table(mock_scan_items, tmp_path):
+    path = str(tmp_path / 'search.db')
+    item = news_item(1, 'Sharded story', ['sharded'])
+    mock_scan_items.return_value = iter([[dict(item, created_at_date='2020-01-01#3')]])
+
+    count = rebuild_search_index_from_table(path, 'news-items')
+
+    assert count == 1
+    assert search_news_items(path, 'sharded')[0]['created_at_date'] == '2020-01-01'
+    mock_scan_items.assert_called_once_with('news-items')
+
+
+def test_to_match_query():
+    assert to_match_query('what about "WebAssembly" AND c++?') == \
+        '"what" "about" "WebAssembly" "AND" "c"'
+    assert to_match_query('wasm-bindgen 0.2') == '"wasm bindgen" "0 2"'
+    assert to_match_query('  ?! ') is None
@@ -0,0 +1,99 @@
+import pytest
+
+from rumor.domain.similarity import (IdfStatistics, get_features,
+                                     get_preference_columns,
+                                     get_similarity_modifiers,
+                                     load_idf_statistics, multiply,
+                                     save_idf_statistics)
+
+
+def news_item(news_item_id, title, keywords=None):
+    return {'news_item_id': news_item_id, 'title': title, 'keywords': keywords or []}
+
+
+@pytest.fixture
+def news_items():
+    return [
+        news_item('1', 'Scaling PostgreSQL to a billion rows', ['postgresql', 'scaling']),
+        news_item('2', 'Why we moved back to postgres', ['postgres', 'moved']),
+        news_item('3', 'A gentle introduction to trust and safety', ['trust', 'safety']),
+        news_item('4', 'Show HN: a faster static site generator', ['static', 'generator']),
+    ]
+
+
+def test_get_similarity_modifiers_matches_variants(news_items):
+    preferences = [
+        {'preference_key': 'postgres', 'preference_weight': 2},
+        {'preference_key': 'rust', 'preference_weight': 3},
+    ]
+
+    modifiers = get_similarity_modifiers(news_items, preferences, IdfStatistics())
+
+    assert 1.0 < modifiers[0] < 2.0
+    assert modifiers[1] == pytest.approx(2.0)
+    assert modifiers[2] == 1.0
+    assert modifiers[3] == 1.0
+
+
+def test_get_similarity_modifiers_without_preferences(news_items):
+    assert get_similarity_modifiers(news_items, [], IdfStatistics()) == [1.0] * 4
+
+
+def test_multiply():
+    columns = {1: [(0, 0.5)], 2: [(0, 0.25), (1, 1.0)]}
+
+    products = multiply([[1, 2], [2, 3], [3]], columns)
+
+    assert products == [{0: 0.75, 1: 1.0}, {0: 0.25, 1: 1.0}, {}]
+
+
+def test_get_preference_columns_are_normalized():
+    statistics = IdfStatistics()
+    statistics.update([news_item('1', 'postgres')])
+
+    columns = get_preference_columns([{'preference_key': 'Postgres',
+                                       'preference_weight': 2}], statistics)
+
+    assert sum(value for entries in columns.values() for _, value in entries) == pytest.approx(1.0)
+    assert set(columns) == set(get_features(news_item('1', 'postgres')))
+
+
+def test_idf_statistics_update_is_incremental(news_items):
+    statistics = IdfStatistics()
+    statistics.update(news_items[:2])
+    frequencies = dict(statistics.document_frequencies)
+
+    rows = statistics.update(news_items[:2])
+
+    assert len(rows) == 2
+    assert len(statistics.documents) == 2
+    assert dict(statistics.document_frequencies) == frequencies
+
+
+def test_idf_statistics_evicts_oldest_documents(news_items):
+    statistics = IdfStatistics(max_documents=2)
+    statistics.update(news_items)
+
+    assert list(statistics.documents) == ['3', '4']
+    expected = IdfStatistics()
+    expected.update(news_items[2:])
+    assert +statistics.document_frequencies == expected.document_frequencies
+
+
+def test_save_and_load_idf_statistics(news_items, tmp_path):
+    statistics = IdfStatistics()
+    statistics.update(news_items)
+    path = str(tmp_path / 'idf.json')
+    save_idf_statistics(statistics, path)
+
+    loaded = load_idf_statistics(path)
+
+    assert loaded.documents == statistics.documents
+    assert loaded.document_frequencies == statistics.document_frequencies
+
+
+def test_load_idf_statistics_ignores_unreadable_file(tmp_path):
+    path = tmp_path / 'idf.json'
+    path.write_text('{')
+
+    assert len(load_idf_statistics(str(path)).documents) == 0
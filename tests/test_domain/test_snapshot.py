@@ -0,0 +1,94 @@
+import multiprocessing
+import os
+from datetime import datetime
+
+import pytest
+
+from rumor.domain.snapshot import Snapshot, append_to_snapshot
+
+
+def create_news_item(i, keywords=None):
+    return {
+        'news_item_id': str(i),
+        'score': i * 10,
+        'url': f'https://example.com/{i}',
+        'title': f'Title {i} ✓',
+        'created_at': 1000 + i,
+        'updated_at': 2000 + i,
+        'keywords': keywords if keywords is not None else ['rust', f'keyword-{i % 2}']
+    }
+
+
+def test_append_and_read(tmp_path):
+    path = str(tmp_path / 'snapshot')
+
+    append_to_snapshot([create_news_item(i) for i in range(3)], path)
+    append_to_snapshot([create_news_item(i) for i in range(3, 5)], path)
+    append_to_snapshot([create_news_item(5, keywords=[])], path)
+
+    with Snapshot(path) as snapshot:
+        assert len(snapshot) == 6
+        assert snapshot.keywords == ['rust', 'keyword-0', 'keyword-1']
+        assert snapshot.news_item(3) == create_news_item(3)
+        assert snapshot.news_item(5) == create_news_item(5, keywords=[])
+        assert snapshot.keyword_counts(range(5)) == {'rust': 5, 'keyword-0': 3, 'keyword-1': 2}
+
+
+def test_rows_between(tmp_path):
+    path = str(tmp_path / 'snapshot')
+    append_to_snapshot([create_news_item(i) for i in range(10)], path)
+
+    with Snapshot(path) as snapshot:
+        rows = snapshot.rows_between(datetime.fromtimestamp(1002),
+                                     datetime.fromtimestamp(1004))
+        news_items = snapshot.news_items(datetime.fromtimestamp(1002),
+                                         datetime.fromtimestamp(1004))
+
+    assert rows == [2, 3, 4]
+    assert [ni['news_item_id'] for ni in news_items] == ['2', '3', '4']
+
+
+def test_uncommitted_writes_are_discarded(tmp_path):
+    path = str(tmp_path / 'snapshot')
+    append_to_snapshot([create_news_item(0)], path)
+    with open(os.path.join(path, 'score'), 'ab') as f:
+        f.write(b'\x01' * 5)
+
+    append_to_snapshot([create_news_item(1)], path)
+
+    with Snapshot(path) as snapshot:
+        assert [snapshot.news_item(row) for row in range(len(snapshot))] == [
+            create_news_item(0), create_news_item(1)
+        ]
+
+
+def test_empty_and_missing_snapshot(tmp_path):
+    path = str(tmp_path / 'snapshot')
+    append_to_snapshot([], path)
+    append_to_snapshot([create_news_item(0)], None)
+
+    with pytest.raises(FileNotFoundError):
+        Snapshot(path)
+
+
+def append_batches(path, worker, batches):
+    for batch in range(batches):
+        start = (worker * batches + batch) * 5
+        append_to_snapshot([create_news_item(i, keywords=[f'worker-{worker}'])
+                            for i in range(start, start + 5)], path)
+
+
+def test_concurrent_appends_from_processes(tmp_path):
+    path = str(tmp_path / 'snapshot')
+    processes = [multiprocessing.Process(target=append_batches, args=(path, worker, 20))
+                 for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    with Snapshot(path) as snapshot:
+        assert len(snapshot) == 400
+        assert sorted(int(snapshot.news_item(row)['news_item_id'])
+                      for row in range(len(snapshot))) == list(range(400))
+        assert sorted(snapshot.keywords) == [f'worker-{worker}' for worker in range(4)]
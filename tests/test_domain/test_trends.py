@@ -0,0 +1,140 @@
+from collections import Counter
+from datetime import date
+from unittest.mock import patch
+
+from rumor.domain.trends import (CountMinSketch, SpaceSaving, TrendRecorder,
+                                 TrendSketch, flush_trends, get_trend_dates,
+                                 get_trending, rank_trending)
+
+
+def trend_sketch(mentions):
+    sketch = TrendSketch()
+    for keyword, count in mentions.items():
+        for _ in range(count):
+            sketch.add([keyword], 10)
+    return sketch
+
+
+def test_count_min_sketch_never_underestimates():
+    sketch = CountMinSketch(width=16, depth=3)
+    counts = Counter({f'keyword-{i}': i % 7 + 1 for i in range(100)})
+    for keyword, count in counts.items():
+        sketch.add(keyword, count)
+
+    for keyword, count in counts.items():
+        assert sketch.estimate(keyword) >= count
+    assert sketch.estimate('missing') >= 0
+
+
+def test_count_min_sketch_merge_and_serialization():
+    sketch = CountMinSketch()
+    sketch.add('rust', 2)
+    other = CountMinSketch()
+    other.add('rust', 3)
+    other.add('python')
+
+    sketch.merge(other)
+    restored = CountMinSketch.from_bytes(sketch.to_bytes())
+
+    assert restored.estimate('rust') == 5
+    assert restored.estimate('python') == 1
+
+
+def test_space_saving_keeps_heavy_hitters_in_constant_space():
+    summary = SpaceSaving(capacity=10)
+    for keyword in ['rust'] * 10 + ['python'] * 6 + [f'noise-{i}' for i in range(20)]:
+        summary.add(keyword)
+
+    assert len(summary.counters) == 10
+    assert [keyword for keyword, _ in summary.top(2)] == ['rust', 'python']
+
+
+def test_space_saving_merge_sums_counts():
+    summary = SpaceSaving(capacity=3)
+    other = SpaceSaving(capacity=3)
+    for keyword in ['rust'] * 4 + ['go']:
+        summary.add(keyword)
+    for keyword in ['rust'] * 2 + ['python'] * 3:
+        other.add(keyword)
+
+    summary.merge(other)
+
+    assert summary.top(3) == [('rust', 6), ('python', 3), ('go', 1)]
+
+
+def test_trend_sketch_item_roundtrip():
+    sketch = trend_sketch({'rust': 3})
+    sketch.version = 2
+
+    restored = TrendSketch.from_item(sketch.to_item('2020-01-01'))
+
+    assert restored.version == 2
+    assert restored.items == 3
+    assert restored.mentions.estimate('rust') == 3
+    assert restored.score.estimate('rust') == 30
+    assert restored.heavy_hitters.top(1) == [('rust', 3)]
+
+
+def test_rank_trending_prefers_rising_keywords():
+    recent = trend_sketch({'rust': 10, 'python': 10, 'go': 1})
+    baseline = trend_sketch({'python': 70, 'go': 7})
+
+    trending = rank_trending(recent, baseline, days=1, baseline_days=7, top=2)
+
+    assert [row['keyword'] for row in trending] == ['rust', 'python']
+    assert trending[0]['rise'] == 11.0
+    assert trending[1]['baseline_mentions'] == 70
+
+
+def test_get_trend_dates():
+    assert get_trend_dates(3, end=date(2020, 3, 1)) == ['2020-03-01', '2020-02-29', '2020-02-28']
+
+
+@patch('rumor.domain.trends.get_trend_buckets')
+def test_get_trending_splits_recent_and_baseline(mock_get_trend_buckets):
+    buckets = {'2020-01-02': trend_sketch({'rust': 4}).to_item('2020-01-02'),
+               '2020-01-01': trend_sketch({'rust': 1}).to_item('2020-01-01')}
+    mock_get_trend_buckets.side_effect = lambda table, dates: [
+        buckets[trend_date] for trend_date in dates if trend_date in buckets]
+
+    trending = get_trending('trends', days=1, baseline_days=1, end=date(2020, 1, 2))
+
+    assert trending[0]['keyword'] == 'rust'
+    assert trending[0]['mentions'] == 4
+    assert trending[0]['baseline_mentions'] == 1
+
+
+@patch('rumor.domain.trends.store_trend_bucket')
+@patch('rumor.domain.trends.get_trend_buckets')
+def test_flush_trends_merges_into_existing_bucket(mock_get_trend_buckets,
+                                                  mock_store_trend_bucket):
+    existing = trend_sketch({'rust': 2})
+    existing.version = 4
+    mock_get_trend_buckets.return_value = [existing.to_item('2020-01-01')]
+    mock_store_trend_bucket.side_effect = [False, True]
+    recorder = TrendRecorder()
+    recorder.add({'created_at_date': '2020-01-01', 'keywords': ['rust'], 'score': 5})
+
+    assert flush_trends(recorder, 'trends') == 1
+
+    assert mock_store_trend_bucket.call_count == 2
+    item = mock_store_trend_bucket.call_args[0][0]
+    assert mock_store_trend_bucket.call_args[1] == {'previous_version': 4}
+    merged = TrendSketch.from_item(item)
+    assert merged.version == 5
+    assert merged.mentions.estimate('rust') == 3
+    assert merged.score.estimate('rust') == 25
+
+
+@patch('rumor.domain.trends.store_trend_bucket')
+@patch('rumor.domain.trends.get_trend_buckets')
+def test_flush_trends_creates_missing_bucket(mock_get_trend_buckets, mock_store_trend_bucket):
+    mock_get_trend_buckets.return_value = []
+    mock_store_trend_bucket.return_value = True
+    recorder = TrendRecorder()
+    recorder.add({'created_at_date': '2020-01-01', 'keywords': ['rust'], 'score': 5})
+
+    flush_trends(recorder, 'trends')
+
+    assert mock_store_trend_bucket.call_args[1] == {'previous_version': None}
+    assert mock_store_trend_bucket.call_args[0][0]['version'] == 1
@@ -0,0 +1,50 @@
+from rumor.domain.watermark import (WatermarkIndex, load_watermarks,
+                                    save_watermarks)
+
+
+def test_watermark_rejects_items_older_than_sample():
+    index = WatermarkIndex({100: 10000, 200: 20000}, safety_margin_seconds=0)
+
+    assert index.skip(50, created_at_threshold=15000)
+    assert index.skip(100, created_at_threshold=15000)
+    assert not index.skip(150, created_at_threshold=15000)
+    assert not index.skip(250, created_at_threshold=15000)
+    assert index.skipped == 2
+
+
+def test_watermark_is_conservative_with_unordered_samples():
+    index = WatermarkIndex({100: 30000, 200: 5000}, safety_margin_seconds=0)
+
+    assert index.is_older_than(150, created_at_threshold=10000)
+    assert not index.is_older_than(250, created_at_threshold=10000)
+
+
+def test_watermark_applies_safety_margin():
+    index = WatermarkIndex({100: 10000}, safety_margin_seconds=3600)
+
+    assert not index.is_older_than(50, created_at_threshold=12000)
+    assert index.is_older_than(50, created_at_threshold=13600)
+
+
+def test_watermark_never_drops_fresh_items():
+    times = {i: 1000 * i for i in range(1, 1001)}
+    index = WatermarkIndex(max_samples=32, safety_margin_seconds=0)
+    for news_item_id, created_at in times.items():
+        index.observe(news_item_id, created_at)
+
+    threshold = 500000
+    assert len(index.samples) <= 32
+    for news_item_id, created_at in times.items():
+        if index.is_older_than(news_item_id, threshold):
+            assert created_at <= threshold
+
+
+def test_watermark_persistence(tmp_path):
+    path = str(tmp_path / 'watermarks.json')
+    index = WatermarkIndex()
+    index.observe('42', 4200)
+
+    save_watermarks(index, path)
+
+    assert load_watermarks(path).samples == {42: 4200}
+    assert load_watermarks(str(tmp_path / 'missing.json')).samples == {}
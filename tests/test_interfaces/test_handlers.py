@@ -1,8 +1,11 @@
 from unittest.mock import patch
 
-from rumor.interfaces.handlers import (classification_handler,
+from rumor.interfaces.handlers import (classification_event_handler,
+                                       classification_handler,
                                        discovery_handler, evaluation_handler,
-                                       inspection_handler, report_handler)
+                                       inspection_event_handler,
+                                       inspection_handler, refresh_handler,
+                                       report_handler)
 
 
 @patch('rumor.interfaces.handlers.os')
@@ -27,7 +30,8 @@ def test_inspection_handler(mock_inspect, mock_os):
         classification_queue_name='rumor-dev-classification-queue',
         collection_queue_name='rumor-dev-collection-queue',
         news_item_max_age_hours=48,
-        target_api_url='https://hacker-news.firebaseio.com'
+        target_api_url='https://hacker-news.firebaseio.com',
+        watermark_path='/tmp/rumor-watermarks.json'
     )
 
 
@@ -40,7 +44,57 @@ def test_classification_handler(mock_classify, mock_os):
         batch_size=2,
         classification_queue_name='rumor-dev-classification-queue',
         news_item_max_age_hours=48,
-        news_item_table_name='rumor-dev-news-items'
+        news_item_table_name='rumor-dev-news-items',
+        snapshot_path=None,
+        shards=1,
+        fingerprint_path='/tmp/rumor-fingerprints.json',
+        trend_table_name=None,
+        enrichment_timeout=0.0,
+        search_index_path=None
+    )
+
+
+@patch('rumor.interfaces.handlers.os')
+@patch('rumor.interfaces.handlers.inspect_records')
+def test_inspection_event_handler(mock_inspect_records, mock_os):
+    mock_os.environ = {}
+    mock_inspect_records.return_value = ['message-2']
+    records = [{'messageId': f'message-{i}', 'body': '{}'} for i in range(3)]
+
+    results = inspection_event_handler({'Records': records}, {})
+
+    assert results == {'batchItemFailures': [{'itemIdentifier': 'message-2'}]}
+    mock_inspect_records.assert_called_once_with(
+        records=records,
+        classification_queue_name='rumor-dev-classification-queue',
+        news_item_max_age_hours=48,
+        target_api_url='https://hacker-news.firebaseio.com',
+        max_workers=10,
+        watermark_path='/tmp/rumor-watermarks.json'
+    )
+
+
+@patch('rumor.interfaces.handlers.os')
+@patch('rumor.interfaces.handlers.classify_records')
+def test_classification_event_handler(mock_classify_records, mock_os):
+    mock_os.environ = {}
+    mock_classify_records.return_value = []
+    records = [{'messageId': 'message-1', 'body': '{}'}]
+
+    results = classification_event_handler({'Records': records}, {})
+
+    assert results == {'batchItemFailures': []}
+    mock_classify_records.assert_called_once_with(
+        records=records,
+        news_item_max_age_hours=48,
+        news_item_table_name='rumor-dev-news-items',
+        max_workers=10,
+        snapshot_path=None,
+        shards=1,
+        fingerprint_path='/tmp/rumor-fingerprints.json',
+        trend_table_name=None,
+        enrichment_timeout=0.0,
+        search_index_path=None
     )
 
 
@@ -56,7 +110,28 @@ def test_evaluation_handler(mock_evaluate, mock_os):
         news_item_max_age_hours=48,
         news_item_table_name='rumor-dev-news-items',
         qualification_limit=10,
-        qualification_threshold=1.5
+        qualification_threshold=1.5,
+        snapshot_path=None,
+        include_report_snapshot=False,
+        shards=1,
+        scoring_mode='exact',
+        idf_path='/tmp/rumor-idf.json'
+    )
+
+
+@patch('rumor.interfaces.handlers.os')
+@patch('rumor.interfaces.handlers.refresh')
+def test_refresh_handler(mock_refresh, mock_os):
+    mock_os.environ = {}
+    refresh_handler({}, {})
+    mock_refresh.assert_called_once_with(
+        news_item_table_name='rumor-dev-news-items',
+        target_api_url='https://hacker-news.firebaseio.com',
+        news_item_max_age_hours=48,
+        evaluation_period_hours=72,
+        qualification_threshold=1.5,
+        fetch_budget=20,
+        shards=1
     )
 
 
@@ -68,5 +143,10 @@ def test_report_handler(mock_report, mock_os):
     mock_report.assert_called_once_with(
         evaluation_report_table_name='rumor-dev-evaluation-reports',
         report_period_hours=24,
-        topic_arn_hint='rumor-dev-notification-topic'
+        topic_arn_hint='rumor-dev-notification-topic',
+        preference_table_name='rumor-dev-preferences',
+        personalized_topic_arn_hint='rumor-dev-personalized-topic',
+        news_item_table_name='rumor-dev-news-items',
+        shards=1,
+        html=False
     )
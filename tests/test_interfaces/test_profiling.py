@@ -0,0 +1,68 @@
+import io
+import json
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from benchmarks.profile_stages import (STAGES, load_fixture, profile_stage,
+                                       synthetic_news_items)
+from rumor.interfaces.profiling import profile_call, write_collapsed
+
+
+@pytest.mark.parametrize('stage, upstream_call', [
+    ('discover', 'send_messages'),
+    ('inspect', 'news_item_source_request'),
+    ('classify', 'update_news_item'),
+    ('evaluate', 'get_news_items'),
+    ('send_reports', 'publish_notifications'),
+])
+def test_profile_stage(stage, upstream_call):
+    results = profile_stage(stage, synthetic_news_items(20))
+
+    assert results['news_items'] == 20
+    assert results['wall_seconds'] > 0
+    assert results['peak_bytes'] > 0
+    assert results['upstream_calls'][upstream_call] >= 1
+    assert isinstance(results['stacks'], Counter)
+    assert results['stats'] is None
+
+
+def test_profile_stage_cprofile():
+    results = profile_stage('classify', synthetic_news_items(5), profiler='cprofile')
+
+    assert results['upstream_calls'] == {'update_news_item': 5}
+    assert results['stacks'] is None
+    assert results['stats'].total_calls > 0
+    assert 'store_news_item' in {name for _, _, name in results['stats'].stats}
+
+
+def test_profile_call_cprofile_traces_worker_threads():
+    def work():
+        return sum(range(1000))
+
+    def run():
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            list(executor.map(lambda _: work(), range(4)))
+
+    results = profile_call(run, profiler='cprofile')
+
+    assert results['wall_seconds'] > 0
+    assert results['stacks'] is None
+    assert 'work' in {name for _, _, name in results['stats'].stats}
+
+
+def test_write_collapsed():
+    f = io.StringIO()
+    write_collapsed(Counter({'main;b': 2, 'main;a': 3}), f)
+    assert f.getvalue() == 'main;a 3\nmain;b 2\n'
+
+
+def test_load_fixture():
+    news_items = synthetic_news_items(2)
+    assert load_fixture(io.StringIO(json.dumps({'items': news_items}))) == news_items
+    assert load_fixture(io.StringIO(json.dumps(news_items))) == news_items
+
+
+def test_stages():
+    assert sorted(STAGES) == ['classify', 'discover', 'evaluate', 'inspect', 'send_reports']
@@ -0,0 +1,125 @@
+import functools
+import json
+import multiprocessing
+import threading
+import time
+
+from rumor.interfaces.worker import (VisibilityExtender, load_config, serve,
+                                     supervise)
+from tests.stubs import LocalSQS, LocalSQSManager, local_sqs_client
+
+
+def config(tmp_path=None, **kwargs):
+    return load_config('classify', queue_name='queue', wait_seconds=0.2, visibility_timeout=30,
+                       watermark_path=str(tmp_path / 'watermarks.json') if tmp_path else '',
+                       fingerprint_path=str(tmp_path / 'fingerprints.json') if tmp_path else '',
+                       **kwargs)
+
+
+def send(sqs, bodies):
+    sqs.get_queue_url(QueueName='queue')
+    for i in range(0, len(bodies), 10):
+        sqs.send_message_batch(QueueUrl='queue', Entries=[
+            {'Id': str(j), 'MessageBody': json.dumps(body)}
+            for j, body in enumerate(bodies[i:i + 10])])
+
+
+def failing_processor(records, config, caches):
+    return [r['messageId'] for r in records if json.loads(r['body']).get('fail')]
+
+
+def wait_until(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def run_in_thread(sqs, worker_config, processor):
+    stop_event = threading.Event()
+    counters = multiprocessing.Array('q', 3)
+    thread = threading.Thread(target=serve, args=(0, worker_config, stop_event, counters),
+                              kwargs={'client_factory': lambda: sqs, 'processor': processor})
+    thread.start()
+    return stop_event, counters, thread
+
+
+def test_load_config(monkeypatch):
+    monkeypatch.setenv('RUMOR_COLLECTION_QUEUE_NAME', 'collection')
+    monkeypatch.setenv('RUMOR_NEWS_ITEM_SHARDS', '4')
+
+    inspect_config = load_config('inspect', prefetch=3, wait_seconds=None)
+
+    assert inspect_config['queue_name'] == 'collection'
+    assert inspect_config['shards'] == 4
+    assert inspect_config['prefetch'] == 3
+    assert inspect_config['wait_seconds'] == 20
+
+
+def test_serve_deletes_processed_messages(tmp_path):
+    sqs = LocalSQS()
+    send(sqs, [{'i': i} for i in range(25)] + [{'fail': True}])
+
+    stop_event, counters, thread = run_in_thread(sqs, config(tmp_path, prefetch=2),
+                                                 failing_processor)
+    wait_until(lambda: sqs.get_deleted() == 25)
+    stop_event.set()
+    thread.join()
+
+    assert sqs.count('queue') == 1
+    assert counters[1] >= 26
+    assert counters[2] >= 1
+    assert (tmp_path / 'fingerprints.json.worker-0').exists()
+
+
+def test_serve_releases_prefetched_messages_on_shutdown():
+    sqs = LocalSQS()
+    send(sqs, [{'i': i} for i in range(30)])
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_processor(records, config, caches):
+        started.set()
+        release.wait()
+        return []
+
+    stop_event, _, thread = run_in_thread(sqs, config(batch_size=10, prefetch=1), slow_processor)
+    started.wait()
+    wait_until(lambda: not sqs.receive_message(QueueUrl='queue', MaxNumberOfMessages=10,
+                                               VisibilityTimeout=0)['Messages'])
+    stop_event.set()
+    release.set()
+    thread.join()
+
+    assert sqs.get_deleted() == 10
+    assert sqs.count('queue') == 20
+    for _ in range(2):
+        assert len(sqs.receive_message(QueueUrl='queue', MaxNumberOfMessages=10)['Messages']) == 10
+
+
+def test_visibility_extender():
+    sqs = LocalSQS()
+    send(sqs, [{'i': 1}])
+    messages = sqs.receive_message(QueueUrl='queue', VisibilityTimeout=0)['Messages']
+    extender = VisibilityExtender(sqs, 'queue', visibility_timeout=60)
+
+    extender.add(messages)
+    extender.extend()
+
+    assert sqs.receive_message(QueueUrl='queue')['Messages'] == []
+    extender.release(messages)
+    assert len(sqs.receive_message(QueueUrl='queue')['Messages']) == 1
+
+
+def test_supervise_drains_queue_with_worker_processes():
+    with LocalSQSManager() as manager:
+        sqs = manager.LocalSQS()
+        send(sqs, [{'i': i} for i in range(40)])
+
+        counters = supervise(config(), workers=2, max_records=40, duration=30,
+                             client_factory=functools.partial(local_sqs_client, sqs),
+                             processor=failing_processor)
+
+        assert counters['records'] >= 40
+        assert counters['failed'] == 0
+        assert sqs.count('queue') == 0
@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+from rumor.exceptions import UpstreamError
+from rumor.upstreams.articles import (_get_encoding, get_domain_semaphore,
+                                      stream_article)
+from tests.stubs import StubServer
+
+HTML = 'text/html; charset=utf-8'
+
+
+def test_stream_article_stops_at_byte_budget():
+    chunks = []
+    with StubServer() as server:
+        server.route('/article', '<p>' + 'word ' * 50000 + '</p>', content_type=HTML)
+
+        read = stream_article(f'{server.url}/article', 10000, time.monotonic() + 5,
+                              lambda chunk: chunks.append(chunk) or True)
+
+    assert read == 10000
+    assert len(''.join(chunks)) == 10000
+
+
+def test_stream_article_stops_when_consumer_is_done():
+    chunks = []
+    with StubServer() as server:
+        server.route('/article', 'x' * 50000, content_type=HTML)
+
+        read = stream_article(f'{server.url}/article', 50000, time.monotonic() + 5,
+                              lambda chunk: chunks.append(chunk) and False)
+
+    assert read < 50000
+
+
+def test_stream_article_skips_non_html():
+    chunks = []
+    with StubServer() as server:
+        server.route('/paper.pdf', b'%PDF-1.4', content_type='application/pdf')
+
+        read = stream_article(f'{server.url}/paper.pdf', 10000, time.monotonic() + 5,
+                              chunks.append)
+
+    assert read == 0
+    assert chunks == []
+    assert stream_article('ftp://example.com/file', 10000, time.monotonic() + 5,
+                          chunks.append) == 0
+
+
+def test_stream_article_error_status():
+    with StubServer() as server:
+        server.route('/article', 'gone', statuses=[404], content_type=HTML)
+
+        with pytest.raises(UpstreamError):
+            stream_article(f'{server.url}/article', 10000, time.monotonic() + 5,
+                           lambda chunk: True)
+
+
+def test_stream_article_respects_deadline():
+    with StubServer() as server:
+        server.route('/article', '<p>slow</p>', delays=[1.0], content_type=HTML)
+
+        started_at = time.monotonic()
+        with pytest.raises(UpstreamError):
+            stream_article(f'{server.url}/article', 10000, time.monotonic() + 0.2,
+                           lambda chunk: True)
+
+    assert time.monotonic() - started_at < 0.9
+
+
+def test_stream_article_limits_concurrency_per_domain():
+    with StubServer() as server:
+        server.route('/article', '<p>text</p>', content_type=HTML)
+        semaphore = get_domain_semaphore('127.0.0.1')
+        permits = 0
+        while semaphore.acquire(blocking=False):
+            permits += 1
+        try:
+            with pytest.raises(UpstreamError):
+                stream_article(f'{server.url}/article', 10000, time.monotonic() + 0.1,
+                               lambda chunk: True)
+        finally:
+            for _ in range(permits):
+                semaphore.release()
+
+    assert server.requests == []
+
+
+def test_get_encoding():
+    assert _get_encoding('text/html; charset="ISO-8859-1"') == 'iso8859-1'
+    assert _get_encoding('text/html; charset=unknown') == 'utf-8'
+    assert _get_encoding('text/html') == 'utf-8'
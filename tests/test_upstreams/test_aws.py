@@ -1,13 +1,26 @@
+import gzip
 import json
-from datetime import datetime, timedelta
-from decimal import Decimal
+from datetime import datetime
 from unittest.mock import MagicMock, call, patch
 
-from boto3.dynamodb.conditions import Attr
-
-from rumor.upstreams.aws import (delete_messages, get_messages, get_news_items,
-                                 get_preferences, get_reports, send_messages,
-                                 send_notification, store_item)
+import boto3
+import pytest
+from botocore.awsrequest import AWSResponse
+from botocore.exceptions import ClientError
+
+from rumor.exceptions import UpstreamError
+from rumor.upstreams.aws import (DYNAMODB_CONFIG, batch_entries,
+                                 batch_write_items, delete_messages,
+                                 get_items_by_keys, get_messages,
+                                 get_news_items, get_preferences, get_reports,
+                                 mark_report_delivered, publish_notifications,
+                                 query_items, read_table_export,
+                                 reset_topic_arns, resolve_topic_arn,
+                                 send_messages, send_notification, store_item,
+                                 store_trend_bucket, update_news_item)
+from rumor.upstreams.packing import unpack_body
+from rumor.upstreams.rate_control import (get_rate_controller,
+                                          reset_rate_controllers)
 
 
 @patch('rumor.upstreams.aws.boto3')
@@ -34,6 +47,62 @@ def test_send_messages_ok(mock_boto3):
     mock_sqs_client.send_message_batch.assert_has_calls(calls)
 
 
+@patch('rumor.upstreams.aws.boto3')
+def test_send_messages_packed(mock_boto3):
+    mock_sqs_resource = MagicMock()
+    mock_sqs_client = MagicMock()
+    mock_boto3.resource.return_value = mock_sqs_resource
+    mock_boto3.client.return_value = mock_sqs_client
+
+    messages = [{'news_item_id': f'{i}'} for i in range(100)]
+
+    send_messages(messages, queue_name='test-queue', pack=True)
+
+    mock_sqs_client.send_message_batch.assert_called_once()
+    entries = mock_sqs_client.send_message_batch.call_args[1]['Entries']
+    assert len(entries) == 10
+    assert [item for entry in entries
+            for item in unpack_body(entry['MessageBody'])] == messages
+
+
+@patch('rumor.upstreams.aws.boto3')
+def test_send_messages_with_attributes(mock_boto3):
+    mock_sqs_client = mock_boto3.client.return_value
+    attributes = {'rumor_trace': {'DataType': 'String', 'StringValue': '{}'}}
+
+    send_messages([{'news_item_id': '1'}], queue_name='test-queue', pack=True,
+                  message_attributes=attributes)
+
+    entry, = mock_sqs_client.send_message_batch.call_args[1]['Entries']
+    assert entry['MessageAttributes'] == attributes
+
+
+def test_batch_entries_counts_attribute_bytes():
+    entries = [{'Id': f'{i}', 'MessageBody': 'x' * 100000} for i in range(2)]
+
+    assert len(batch_entries(entries, batch_size=10)) == 1
+    assert len(batch_entries(entries, batch_size=10, entry_bytes=40000)) == 2
+
+
+def test_batch_entries_counts_message_attributes():
+    attributes = {'subscriber': {'DataType': 'String.Array',
+                                 'StringValue': json.dumps(['x' * 40] * 1000)}}
+    entries = [{'Id': f'{i}', 'Message': 'x' * 1000, 'MessageAttributes': attributes}
+               for i in range(10)]
+
+    batches = batch_entries(entries, batch_size=10, body_key='Message')
+
+    assert [len(batch) for batch in batches] == [5, 5]
+
+
+def test_batch_entries_respects_payload_size():
+    entries = [{'Id': f'{i}', 'MessageBody': 'x' * 100000} for i in range(5)]
+
+    batches = batch_entries(entries, batch_size=10)
+
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+
+
 @patch('rumor.upstreams.aws.boto3')
 def test_get_messages_ok(mock_boto3):
     mock_sqs_resource = MagicMock()
@@ -56,7 +125,9 @@ def test_get_messages_ok(mock_boto3):
     mock_sqs_client.receive_message.assert_called_once_with(
         QueueUrl=mock_sqs_queue.url,
         MaxNumberOfMessages=batch_size,
-        WaitTimeSeconds=0)
+        WaitTimeSeconds=0,
+        AttributeNames=['SentTimestamp'],
+        MessageAttributeNames=['rumor_trace'])
 
 
 @patch('rumor.upstreams.aws.boto3')
@@ -94,9 +165,10 @@ def test_store_item_ok(mock_boto3):
 
     store_item(item, table_name)
 
-    mock_boto3.resource.assert_called_once_with('dynamodb')
+    mock_boto3.resource.assert_called_once_with('dynamodb', config=DYNAMODB_CONFIG)
     mock_dynamodb_resource.Table.assert_called_once_with(table_name)
-    mock_table.put_item.assert_called_once_with(Item=item)
+    mock_table.put_item.assert_called_once_with(Item=item,
+                                                ReturnConsumedCapacity='TOTAL')
 
 
 @patch('rumor.upstreams.aws.boto3')
@@ -104,57 +176,98 @@ def test_get_news_items_ok(mock_boto3):
     news_item_page = [{}]*4
 
     mock_client = MagicMock()
-    mock_paginator = MagicMock()
     mock_deserializer = MagicMock()
-    mock_paginator.paginate.return_value = [{'Items': news_item_page}]
+    mock_client.query.return_value = {'Items': news_item_page}
     mock_boto3.dynamodb.types.TypeDeserializer.return_value = mock_deserializer
 
     mock_boto3.client.return_value = mock_client
-    mock_client.get_paginator.return_value = mock_paginator
     mock_deserializer.deserialize.side_effect = lambda x: x['M']
 
     news_item_table_name = 'news-items'
-    created_at_to = datetime.now()
-    created_at_from = created_at_to - timedelta(days=1)
+    created_at_from = datetime(2020, 1, 1, 12)
+    created_at_to = datetime(2020, 1, 2, 12)
+    midnight = int(datetime(2020, 1, 2).timestamp())
 
     results = get_news_items(news_item_table_name, created_at_from, created_at_to)
 
     assert results == news_item_page * 2
 
-    mock_boto3.client.assert_called_once_with('dynamodb')
-    mock_client.get_paginator.assert_called_once_with('query')
-    pag_dates = map(str, [created_at_to.date(), created_at_from.date()])
-    paginator_calls = [
+    mock_boto3.client.assert_called_once_with('dynamodb', config=DYNAMODB_CONFIG)
+    bounds = [
+        ('2020-01-01', int(created_at_from.timestamp()), midnight - 1),
+        ('2020-01-02', midnight, int(created_at_to.timestamp()))
+    ]
+    query_calls = [
         call(
             ExpressionAttributeValues={
                 ':created_at_date': {'S': pag_date},
-                ':ca_from': {'N': str(created_at_from.timestamp())},
-                ':ca_to': {'N': str(created_at_to.timestamp())}
+                ':ca_from': {'N': str(ca_from)},
+                ':ca_to': {'N': str(ca_to)}
             }, IndexName='LSI',
             KeyConditionExpression=('created_at_date = :created_at_date '
                                     'AND created_at BETWEEN '
                                     ':ca_from AND :ca_to'),
-            TableName=news_item_table_name
-        ) for pag_date in pag_dates
+            TableName=news_item_table_name,
+            ReturnConsumedCapacity='TOTAL'
+        ) for pag_date, ca_from, ca_to in bounds
     ]
-    mock_paginator.paginate.assert_has_calls(paginator_calls)
+    mock_client.query.assert_has_calls(query_calls, any_order=True)
+    assert mock_client.query.call_count == 2
     mock_deserializer.deserialize.assert_has_calls(
         [call({'M': {}})]*8
     )
 
 
+@patch('rumor.upstreams.aws.boto3')
+def test_get_news_items_sharded(mock_boto3):
+    mock_client = MagicMock()
+    mock_boto3.client.return_value = mock_client
+    mock_boto3.dynamodb.types.TypeDeserializer.return_value.deserialize.side_effect = \
+        lambda x: dict(x['M'])
+
+    def query(**kwargs):
+        pk = kwargs['ExpressionAttributeValues'][':created_at_date']['S']
+        return {'Items': [{'news_item_id': pk, 'created_at_date': pk}]}
+    mock_client.query.side_effect = query
+
+    results = get_news_items('news-items', datetime(2020, 1, 1, 10),
+                             datetime(2020, 1, 1, 11), shards=2)
+
+    assert [r['news_item_id'] for r in results] == ['2020-01-01', '2020-01-01#0', '2020-01-01#1']
+    assert [r['created_at_date'] for r in results] == ['2020-01-01'] * 3
+
+
+@patch('rumor.upstreams.aws.boto3')
+def test_query_items_follows_pages(mock_boto3):
+    mock_client = MagicMock()
+    mock_deserializer = MagicMock()
+    mock_boto3.dynamodb.types.TypeDeserializer.return_value = mock_deserializer
+    mock_deserializer.deserialize.side_effect = lambda x: x['M']
+    mock_client.query.side_effect = [
+        {'Items': [{'a': 1}], 'LastEvaluatedKey': {'k': 1}},
+        {'Items': [{'b': 2}]},
+    ]
+
+    results = list(query_items(mock_client, {'TableName': 'some-table'}))
+
+    assert results == [{'a': 1}, {'b': 2}]
+    mock_client.query.assert_has_calls([
+        call(TableName='some-table', ReturnConsumedCapacity='TOTAL'),
+        call(TableName='some-table', ReturnConsumedCapacity='TOTAL',
+             ExclusiveStartKey={'k': 1}),
+    ])
+
+
 @patch('rumor.upstreams.aws.boto3')
 def test_get_preferences(mock_boto3):
     preference_page = [{}]*4
 
     mock_client = MagicMock()
-    mock_paginator = MagicMock()
     mock_deserializer = MagicMock()
-    mock_paginator.paginate.return_value = [{'Items': preference_page}]
+    mock_client.query.return_value = {'Items': preference_page}
     mock_boto3.dynamodb.types.TypeDeserializer.return_value = mock_deserializer
 
     mock_boto3.client.return_value = mock_client
-    mock_client.get_paginator.return_value = mock_paginator
     mock_deserializer.deserialize.side_effect = lambda x: x['M']
 
     preference_table_name = 'preferences'
@@ -162,35 +275,68 @@ def test_get_preferences(mock_boto3):
     results = get_preferences(preference_table_name)
 
     assert results == preference_page
-    mock_boto3.client.assert_called_once_with('dynamodb')
-    mock_client.get_paginator.assert_called_once_with('query')
-    mock_paginator.paginate.assert_called_once_with(
+    mock_boto3.client.assert_called_once_with('dynamodb', config=DYNAMODB_CONFIG)
+    mock_client.query.assert_called_once_with(
         TableName=preference_table_name,
         KeyConditionExpression='preference_type = :preference_type',
         ExpressionAttributeValues={
             ':preference_type': {'S': 'KEYWORD'}
-        }
+        },
+        ReturnConsumedCapacity='TOTAL'
     )
     mock_deserializer.deserialize.assert_has_calls(
         [call({'M': {}})]*4
     )
 
 
+class RawBody:
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+
+def throttle_first_query(client, sent):
+    def send(request, **kwargs):
+        sent.append(request)
+        if len(sent) == 1:
+            body = {'__type': 'com.amazonaws.dynamodb.v20120810#ProvisionedThroughputExceededException'}
+            return AWSResponse(request.url, 400, {}, RawBody(json.dumps(body).encode('utf-8')))
+        return AWSResponse(request.url, 200, {}, RawBody(b'{"Items": [], "Count": 0}'))
+    client.meta.events.register('before-send.dynamodb.Query', send)
+    return client
+
+
+def test_get_preferences_throttle_reaches_rate_controller():
+    reset_rate_controllers()
+    controller = get_rate_controller('dynamodb:preferences', sleep=lambda seconds: None)
+    sent = []
+    create_client = boto3.client
+
+    with patch('rumor.upstreams.aws.boto3.client', side_effect=lambda *args, **kwargs: throttle_first_query(
+            create_client(*args, region_name='us-east-1', aws_access_key_id='key',
+                          aws_secret_access_key='secret', **kwargs), sent)):
+        assert get_preferences('preferences') == []
+
+    assert len(sent) == 2
+    assert controller.throttle_count == 1
+    assert controller.success_count == 1
+    reset_rate_controllers()
+
+
+def topic_pages(*pages):
+    return [{'Topics': [{'TopicArn': f'arn:{name}:id:something'} for name in page]}
+            for page in pages]
+
+
 @patch('rumor.upstreams.aws.boto3')
 def test_send_notification_ok(mock_boto3):
+    reset_topic_arns()
     mock_client = MagicMock()
     mock_boto3.client.return_value = mock_client
-    mock_client.list_topics.return_value = {
-        'Topics': [
-            {
-                'TopicArn': f'arn:{topic_arn}:id:something'
-            } for topic_arn in [
-                'notification-topic',
-                'another-topic',
-                'testing-topic'
-            ]
-        ]
-    }
+    mock_client.get_paginator.return_value.paginate.return_value = topic_pages(
+        ['notification-topic', 'another-topic', 'testing-topic'])
 
     msg = 'Test body'
     topic_arn_hint = 'notification-topic'
@@ -198,7 +344,8 @@ def test_send_notification_ok(mock_boto3):
 
     send_notification(msg, topic_arn_hint, subject)
 
-    mock_boto3.client.assert_called_once_with('sns')
+    mock_boto3.client.assert_called_with('sns')
+    mock_client.get_paginator.assert_called_once_with('list_topics')
     mock_client.publish.assert_called_once_with(
         Subject=subject,
         Message=msg,
@@ -206,28 +353,227 @@ def test_send_notification_ok(mock_boto3):
     )
 
 
+@patch('rumor.upstreams.aws.boto3')
+def test_resolve_topic_arn_paginates_and_caches(mock_boto3):
+    reset_topic_arns()
+    mock_client = MagicMock()
+    mock_boto3.client.return_value = mock_client
+    mock_client.get_paginator.return_value.paginate.return_value = topic_pages(
+        [f'topic-{i}' for i in range(100)], ['notification-topic'])
+
+    assert resolve_topic_arn('notification-topic') == 'arn:notification-topic:id:something'
+    assert resolve_topic_arn('notification-topic') == 'arn:notification-topic:id:something'
+    mock_client.get_paginator.assert_called_once_with('list_topics')
+
+    with pytest.raises(UpstreamError):
+        resolve_topic_arn('missing-topic')
+
+
+@patch('rumor.upstreams.aws.boto3')
+def test_publish_notifications(mock_boto3):
+    mock_client = MagicMock()
+    mock_boto3.client.return_value = mock_client
+
+    def publish_batch(TopicArn, PublishBatchRequestEntries):
+        ids = [entry['Id'] for entry in PublishBatchRequestEntries]
+        return {
+            'Successful': [{'Id': i} for i in ids if i != '3'],
+            'Failed': [{'Id': i, 'Code': 'InternalError'} for i in ids if i == '3']
+        }
+    mock_client.publish_batch.side_effect = publish_batch
+    entries = [{'Id': str(i), 'Subject': 'subject', 'Message': f'message-{i}'}
+               for i in range(25)]
+
+    successful = publish_notifications(entries, 'topic-arn')
+
+    assert successful == {str(i) for i in range(25)} - {'3'}
+    assert mock_client.publish_batch.call_count == 3
+    assert all(len(c[1]['PublishBatchRequestEntries']) <= 10
+               for c in mock_client.publish_batch.call_args_list)
+
+
+@patch('rumor.upstreams.aws.boto3')
+def test_publish_notifications_batch_error(mock_boto3):
+    mock_client = MagicMock()
+    mock_boto3.client.return_value = mock_client
+
+    def publish_batch(TopicArn, PublishBatchRequestEntries):
+        ids = [entry['Id'] for entry in PublishBatchRequestEntries]
+        if '12' in ids:
+            raise ClientError({'Error': {'Code': 'Throttling'}}, 'PublishBatch')
+        return {'Successful': [{'Id': i} for i in ids]}
+    mock_client.publish_batch.side_effect = publish_batch
+    entries = [{'Id': str(i), 'Subject': 'subject', 'Message': f'message-{i}'}
+               for i in range(25)]
+
+    successful = publish_notifications(entries, 'topic-arn', max_workers=1)
+
+    assert successful == {str(i) for i in range(25)} - {str(i) for i in range(10, 20)}
+
+
+@patch('rumor.upstreams.aws.boto3')
+def test_mark_report_delivered(mock_boto3):
+    mock_table = mock_boto3.resource.return_value.Table.return_value
+    mock_table.update_item.return_value = {}
+
+    mark_report_delivered({'version': '1', 'created_at': 1000}, {'global'},
+                          'evaluation-reports')
+
+    mock_table.update_item.assert_called_once_with(
+        Key={'version': '1', 'created_at': 1000},
+        UpdateExpression='ADD delivered :delivery_keys',
+        ExpressionAttributeValues={':delivery_keys': {'global'}},
+        ReturnConsumedCapacity='TOTAL'
+    )
+
+
 @patch('rumor.upstreams.aws.boto3')
 def test_get_reports(mock_boto3):
-    mock_resource = MagicMock()
-    mock_table = MagicMock()
-    mock_boto3.resource.return_value = mock_resource
-    mock_resource.Table.return_value = mock_table
-    mock_table.scan.return_value = {'Items': [{'foo': 'bar'}]}
+    mock_client = mock_boto3.client.return_value
+    mock_boto3.dynamodb.types.TypeDeserializer.return_value.deserialize.side_effect = \
+        lambda x: x['M']
+    mock_client.query.side_effect = [
+        {'Items': [{'foo': 'bar'}], 'LastEvaluatedKey': {'created_at': {'N': '1'}}},
+        {'Items': [{'foo': 'baz'}]},
+        {'Items': []}
+    ]
 
     evaluation_report_table_name = 'evaluation-reports'
-    created_at_to = datetime.now()
-    created_at_from = created_at_to - timedelta(days=1)
+    created_at_from = datetime(2020, 1, 1, 12)
+    created_at_to = datetime(2020, 1, 2, 12)
 
     results = get_reports(evaluation_report_table_name, created_at_from,
-                          created_at_to)
-
-    assert results == [{'foo': 'bar'}]
-    mock_boto3.resource.assert_called_once_with('dynamodb')
-    mock_resource.Table.assert_called_once_with(evaluation_report_table_name)
-    expected_filter_expression = (
-        Attr('created_at').gte(Decimal(created_at_from.timestamp())) &
-        Attr('created_at').lt(Decimal(created_at_to.timestamp()))
+                          created_at_to, ['2', '1'])
+
+    assert results == [{'foo': 'bar'}, {'foo': 'baz'}]
+    mock_boto3.client.assert_called_once_with('dynamodb', config=DYNAMODB_CONFIG)
+    parameters = {
+        'TableName': evaluation_report_table_name,
+        'KeyConditionExpression': ('version = :version AND '
+                                   'created_at BETWEEN :ca_from AND :ca_to'),
+        'ReturnConsumedCapacity': 'TOTAL'
+    }
+    values = {
+        ':ca_from': {'N': str(int(created_at_from.timestamp()))},
+        ':ca_to': {'N': str(int(created_at_to.timestamp()) - 1)}
+    }
+    mock_client.query.assert_has_calls([
+        call(**parameters, ExpressionAttributeValues=dict(values, **{':version': {'S': '2'}})),
+        call(**parameters, ExpressionAttributeValues=dict(values, **{':version': {'S': '2'}}),
+             ExclusiveStartKey={'created_at': {'N': '1'}}),
+        call(**parameters, ExpressionAttributeValues=dict(values, **{':version': {'S': '1'}}))
+    ])
+
+
+@patch('rumor.upstreams.aws.boto3')
+def test_get_items_by_keys(mock_boto3):
+    mock_resource = mock_boto3.resource.return_value
+    keys = [{'created_at_date': '2020-01-01', 'news_item_id': f'{i}'} for i in range(150)]
+    mock_resource.batch_get_item.side_effect = [
+        {'Responses': {'news-items': [{'news_item_id': f'{i}'} for i in range(90)]},
+         'UnprocessedKeys': {'news-items': {'Keys': keys[90:100]}}},
+        {'Responses': {'news-items': [{'news_item_id': f'{i}'} for i in range(90, 100)]}},
+        {'Responses': {'news-items': [{'news_item_id': f'{i}'} for i in range(100, 150)]}},
+    ]
+
+    items = get_items_by_keys('news-items', keys)
+
+    assert [item['news_item_id'] for item in items] == [f'{i}' for i in range(150)]
+    assert mock_resource.batch_get_item.call_args_list == [
+        call(RequestItems={'news-items': {'Keys': keys[:100]}}, ReturnConsumedCapacity='TOTAL'),
+        call(RequestItems={'news-items': {'Keys': keys[90:100]}}, ReturnConsumedCapacity='TOTAL'),
+        call(RequestItems={'news-items': {'Keys': keys[100:]}}, ReturnConsumedCapacity='TOTAL'),
+    ]
+
+
+@patch('rumor.upstreams.aws.boto3')
+def test_batch_write_items(mock_boto3):
+    mock_resource = mock_boto3.resource.return_value
+    write_requests = [{'PutRequest': {'Item': {'preference_key': f'{i}'}}} for i in range(30)]
+    mock_resource.batch_write_item.side_effect = [
+        {'UnprocessedItems': {'preferences': write_requests[20:25]}}, {}, {}
+    ]
+
+    batch_write_items(write_requests, 'preferences', max_workers=1)
+
+    batches = [c[1]['RequestItems']['preferences']
+               for c in mock_resource.batch_write_item.call_args_list]
+    assert batches == [write_requests[:25], write_requests[20:25], write_requests[25:]]
+
+
+@patch('rumor.upstreams.aws.boto3')
+def test_update_news_item(mock_boto3):
+    mock_table = mock_boto3.resource.return_value.Table.return_value
+    item = {'created_at_date': '2020-01-01#1', 'news_item_id': '1', 'score': 3, 'updated_at': 4}
+
+    assert update_news_item(item, ['score', 'updated_at'], 'new', 'news-items',
+                            previous_fingerprint='old')
+
+    mock_table.update_item.assert_called_once_with(
+        Key={'created_at_date': '2020-01-01#1', 'news_item_id': '1'},
+        UpdateExpression='SET #a0 = :a0, #a1 = :a1, #fingerprint = :fingerprint',
+        ConditionExpression='#fingerprint = :previous_fingerprint',
+        ExpressionAttributeNames={'#a0': 'score', '#a1': 'updated_at',
+                                  '#fingerprint': 'fingerprint'},
+        ExpressionAttributeValues={':a0': 3, ':a1': 4, ':fingerprint': 'new',
+                                   ':previous_fingerprint': 'old'},
+        ReturnConsumedCapacity='TOTAL'
     )
-    mock_table.scan.assert_called_once_with(
-        FilterExpression=expected_filter_expression
+
+
+@patch('rumor.upstreams.aws.boto3')
+def test_update_news_item_unchanged(mock_boto3):
+    mock_table = mock_boto3.resource.return_value.Table.return_value
+    mock_table.update_item.side_effect = ClientError(
+        {'Error': {'Code': 'ConditionalCheckFailedException'}}, 'UpdateItem')
+    item = {'created_at_date': '2020-01-01', 'news_item_id': '1', 'score': 3}
+
+    assert not update_news_item(item, ['score'], 'same', 'news-items')
+    assert mock_table.update_item.call_args[1]['ConditionExpression'] == \
+        'attribute_not_exists(#fingerprint) OR #fingerprint <> :fingerprint'
+
+
+@patch('rumor.upstreams.aws.boto3')
+def test_store_trend_bucket_conditions_on_version(mock_boto3):
+    mock_table = mock_boto3.resource.return_value.Table.return_value
+    item = {'trend_date': '2020-01-01', 'version': 3}
+
+    assert store_trend_bucket(item, 'trends', previous_version=2)
+
+    mock_table.put_item.assert_called_once_with(
+        Item=item,
+        ReturnConsumedCapacity='TOTAL',
+        ConditionExpression='#version = :previous_version',
+        ExpressionAttributeNames={'#version': 'version'},
+        ExpressionAttributeValues={':previous_version': 2}
     )
+
+
+@patch('rumor.upstreams.aws.boto3')
+def test_store_trend_bucket_conflict(mock_boto3):
+    mock_table = mock_boto3.resource.return_value.Table.return_value
+    mock_table.put_item.side_effect = ClientError(
+        {'Error': {'Code': 'ConditionalCheckFailedException'}}, 'PutItem')
+
+    assert not store_trend_bucket({'trend_date': '2020-01-01', 'version': 1}, 'trends')
+    assert mock_table.put_item.call_args[1]['ConditionExpression'] == \
+        'attribute_not_exists(trend_date)'
+
+
+def test_read_table_export(tmp_path):
+    path = str(tmp_path / 'export.json.gz')
+    with gzip.open(path, 'wt') as f:
+        for i in range(3):
+            f.write(json.dumps({'Item': {
+                'news_item_id': {'S': str(i)},
+                'created_at_date': {'S': f'2020-01-01#{i}'},
+                'score': {'N': '10'},
+                'keywords': {'L': [{'S': 'rust'}]}
+            }}) + '\n')
+        f.write('\n')
+
+    batches = list(read_table_export([path], batch_size=2))
+
+    assert [len(batch) for batch in batches] == [2, 1]
+    assert batches[1][0] == {'news_item_id': '2', 'created_at_date': '2020-01-01',
+                             'score': 10, 'keywords': ['rust']}
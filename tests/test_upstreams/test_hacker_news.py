@@ -1,10 +1,24 @@
+import time
 from unittest.mock import MagicMock, patch
 
 import pytest
 
-from rumor.exceptions import UpstreamError
-from rumor.upstreams.hacker_news import (get_news_items,
-                                         news_item_source_request)
+from rumor.exceptions import CircuitOpenError, UpstreamError
+from rumor.upstreams import hacker_news
+from rumor.upstreams.hacker_news import (REQUEST_TIMEOUT_SECONDS,
+                                         get_latency_stats, get_news_items,
+                                         news_item_source_request,
+                                         reset_circuit_breakers,
+                                         set_caller_concurrency)
+from rumor.upstreams.resilience import LatencyTracker
+from tests.stubs import StubServer
+
+
+@pytest.fixture(autouse=True)
+def fresh_circuit_breakers():
+    reset_circuit_breakers()
+    yield
+    reset_circuit_breakers()
 
 
 @patch('rumor.upstreams.hacker_news.requests')
@@ -19,7 +33,8 @@ def test_get_news_items_ok(mock_requests):
     results = get_news_items(target_api_url)
 
     assert results == [1, 13, 24]
-    mock_requests.get.assert_called_once_with(f'{target_api_url}/v0/topstories.json')
+    mock_requests.get.assert_called_once_with(f'{target_api_url}/v0/topstories.json',
+                                              timeout=REQUEST_TIMEOUT_SECONDS)
 
 
 @patch('rumor.upstreams.hacker_news.requests')
@@ -33,7 +48,8 @@ def test_get_news_items_error(mock_requests):
     with pytest.raises(UpstreamError):
         get_news_items(target_api_url)
 
-    mock_requests.get.assert_called_once_with(f'{target_api_url}/v0/topstories.json')
+    mock_requests.get.assert_called_once_with(f'{target_api_url}/v0/topstories.json',
+                                              timeout=REQUEST_TIMEOUT_SECONDS)
 
 
 @patch('rumor.upstreams.hacker_news.requests')
@@ -49,7 +65,8 @@ def test_news_item_source_request_ok(mock_requests):
     results = news_item_source_request(news_item_id, target_api_url)
 
     assert results == {'foo': 'bar'}
-    mock_requests.get.assert_called_once_with(f'{target_api_url}/v0/item/{news_item_id}.json')
+    mock_requests.get.assert_called_once_with(f'{target_api_url}/v0/item/{news_item_id}.json',
+                                              timeout=REQUEST_TIMEOUT_SECONDS)
 
 
 @patch('rumor.upstreams.hacker_news.requests')
@@ -64,4 +81,69 @@ def test_news_item_source_request_error(mock_requests):
     with pytest.raises(UpstreamError):
         news_item_source_request(news_item_id, target_api_url)
 
-    mock_requests.get.assert_called_once_with(f'{target_api_url}/v0/item/{news_item_id}.json')
+    mock_requests.get.assert_called_once_with(f'{target_api_url}/v0/item/{news_item_id}.json',
+                                              timeout=REQUEST_TIMEOUT_SECONDS)
+
+
+@patch('rumor.upstreams.hacker_news._latency_tracker', new_callable=LatencyTracker)
+def test_news_item_source_request_hedges_slow_requests(mock_tracker):
+    for _ in range(hacker_news.HEDGE_MIN_SAMPLES):
+        mock_tracker.record(0.05)
+
+    with StubServer() as server:
+        server.route('/v0/item/1.json', {'id': 1}, delays=[2.0, 0.0])
+
+        started_at = time.monotonic()
+        results = news_item_source_request('1', server.url)
+        elapsed = time.monotonic() - started_at
+
+    assert results == {'id': 1}
+    assert elapsed < 1.0
+    assert server.requests == ['/v0/item/1.json'] * 2
+    assert mock_tracker.hedged == 1
+    assert mock_tracker.hedge_wins == 1
+
+
+@patch('rumor.upstreams.hacker_news.REQUEST_TIMEOUT_SECONDS', 0.2)
+def test_news_item_source_request_timeout():
+    with StubServer() as server:
+        server.route('/v0/item/1.json', {'id': 1}, delays=[1.0, 1.0])
+
+        with pytest.raises(UpstreamError):
+            news_item_source_request('1', server.url)
+
+
+def test_circuit_breaker_fails_fast_during_outage():
+    with StubServer() as server:
+        server.route('/v0/item/1.json', {}, statuses=[503] * 10)
+
+        for _ in range(5):
+            with pytest.raises(UpstreamError):
+                news_item_source_request('1', server.url)
+        with pytest.raises(CircuitOpenError):
+            news_item_source_request('1', server.url)
+
+    assert len(server.requests) == 5
+    assert get_latency_stats()['circuits'][server.url] == 'open'
+
+
+def test_get_latency_stats():
+    with StubServer() as server:
+        server.route('/v0/topstories.json', [1, 2, 3])
+        get_news_items(server.url)
+
+    stats = get_latency_stats()
+
+    assert stats['count'] >= 1
+    assert stats['p50'] is not None
+    assert stats['p99'] >= stats['p50']
+
+
+def test_set_caller_concurrency_sizes_hedge_executor():
+    set_caller_concurrency(16)
+    try:
+        assert hacker_news._executor_workers == 32
+        assert hacker_news._executor._max_workers == 32
+    finally:
+        set_caller_concurrency(hacker_news.DEFAULT_CALLER_CONCURRENCY)
+    assert hacker_news._executor_workers == 20
@@ -0,0 +1,65 @@
+import io
+import json
+
+from rumor.upstreams.metrics import (Histogram, flush_metrics,
+                                     get_emf_documents, get_metrics_report,
+                                     record_metric, reset_metrics)
+
+
+def test_histogram_percentiles_are_bucket_bounded():
+    histogram = Histogram()
+    for value in range(1, 101):
+        histogram.add(float(value))
+
+    assert histogram.count == 100
+    assert 50 <= histogram.percentile(50) <= 50 * 1.25
+    assert 99 <= histogram.percentile(99) <= 100
+    assert histogram.percentile(100) == 100
+
+
+def test_emf_documents_are_chunked_per_stage():
+    pending = {('classify', 'Freshness'): [float(i) for i in range(150)],
+               ('classify', 'QueueWait'): [1.0],
+               ('inspect', 'QueueWait'): [2.0]}
+
+    documents = get_emf_documents(pending, 'Rumor', 1000)
+
+    assert [document['Stage'] for document in documents] == ['classify', 'classify', 'inspect']
+    assert len(documents[0]['Freshness']) == 100
+    assert len(documents[1]['Freshness']) == 50
+    assert 'QueueWait' not in documents[1]
+    assert documents[0]['_aws'] == {
+        'Timestamp': 1000,
+        'CloudWatchMetrics': [{
+            'Namespace': 'Rumor',
+            'Dimensions': [['Stage']],
+            'Metrics': [{'Name': 'Freshness', 'Unit': 'Seconds'},
+                        {'Name': 'QueueWait', 'Unit': 'Seconds'}]
+        }]
+    }
+
+
+def test_flush_metrics_writes_pending_and_keeps_report():
+    reset_metrics()
+    record_metric('inspect', 'QueueWait', 2.0)
+    record_metric('inspect', 'QueueWait', None)
+    stream = io.StringIO()
+
+    assert flush_metrics(stream=stream) == 1
+    assert flush_metrics(stream=stream) == 0
+
+    document = json.loads(stream.getvalue())
+    assert document['QueueWait'] == [2.0]
+    assert get_metrics_report()['inspect']['QueueWait']['count'] == 1
+    reset_metrics()
+
+
+def test_flush_metrics_disabled_discards_pending():
+    reset_metrics()
+    record_metric('inspect', 'QueueWait', 2.0)
+    stream = io.StringIO()
+
+    assert flush_metrics(emit=False, stream=stream) == 0
+    assert flush_metrics(stream=stream) == 0
+    assert stream.getvalue() == ''
+    reset_metrics()
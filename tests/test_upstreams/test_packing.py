@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from rumor.upstreams.packing import (MAX_MESSAGE_BYTES, pack_messages,
+                                     unpack_body)
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_pack_messages_round_trip(compress):
+    messages = [{'news_item_id': f'{i}'} for i in range(100)]
+
+    bodies = pack_messages(messages, max_items=None, compress=compress)
+
+    assert len(bodies) == 1
+    assert [item for body in bodies for item in unpack_body(body)] == messages
+
+
+def test_pack_messages_respects_max_items():
+    messages = [{'news_item_id': f'{i}'} for i in range(25)]
+
+    bodies = pack_messages(messages, max_items=10)
+
+    assert [len(unpack_body(body)) for body in bodies] == [10, 10, 5]
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_pack_messages_respects_max_bytes(compress):
+    messages = [{'id': i, 'text': 'x' * 1000 + str(i)} for i in range(600)]
+
+    bodies = pack_messages(messages, max_items=None, compress=compress)
+
+    assert all(len(body.encode('utf-8')) <= MAX_MESSAGE_BYTES for body in bodies)
+    assert [item for body in bodies for item in unpack_body(body)] == messages
+    if not compress:
+        assert len(bodies) == 3
+
+
+def test_pack_messages_rejects_oversized_item():
+    with pytest.raises(ValueError):
+        pack_messages([{'text': 'x' * 100}], max_bytes=50)
+
+
+def test_unpack_body_legacy_message():
+    assert unpack_body(json.dumps({'news_item_id': '1'})) == [{'news_item_id': '1'}]
@@ -0,0 +1,102 @@
+import math
+from datetime import date, datetime, timedelta
+
+from hypothesis import given
+from hypothesis import strategies as st
+
+from rumor.upstreams.query_planning import (estimate_cost, plan_day_queries,
+                                            plan_range_queries)
+
+windows = st.tuples(
+    st.datetimes(min_value=datetime(2000, 1, 1), max_value=datetime(2030, 1, 1)),
+    st.timedeltas(min_value=timedelta(0), max_value=timedelta(days=10))
+).map(lambda window: (window[0], window[0] + window[1]))
+
+
+def day_of(timestamp):
+    return str(date.fromtimestamp(timestamp))
+
+
+@given(windows, st.data())
+def test_plan_day_queries_covers_window(window, data):
+    created_at_from, created_at_to = window
+    range_from = math.ceil(created_at_from.timestamp())
+    range_to = math.floor(created_at_to.timestamp())
+    queries = plan_day_queries(created_at_from, created_at_to)
+
+    if range_from > range_to:
+        assert queries == []
+        return
+    timestamp = data.draw(st.integers(min_value=range_from, max_value=range_to))
+    matches = [query for query in queries
+               if query['range_from'] <= timestamp <= query['range_to']]
+    assert len(matches) == 1
+    assert matches[0]['partition_key'] == day_of(timestamp)
+
+
+@given(windows)
+def test_plan_day_queries_is_minimal(window):
+    created_at_from, created_at_to = window
+    range_from = math.ceil(created_at_from.timestamp())
+    range_to = math.floor(created_at_to.timestamp())
+    queries = plan_day_queries(created_at_from, created_at_to)
+
+    partition_keys = [query['partition_key'] for query in queries]
+    assert len(partition_keys) == len(set(partition_keys))
+    if queries:
+        first_day = date.fromtimestamp(range_from)
+        last_day = date.fromtimestamp(range_to)
+        assert len(queries) == (last_day - first_day).days + 1
+    for query in queries:
+        assert query['range_from'] <= query['range_to']
+        assert day_of(query['range_from']) == query['partition_key']
+        assert day_of(query['range_to']) == query['partition_key']
+        assert query['range_from'] == range_from or \
+            day_of(query['range_from'] - 1) != query['partition_key']
+        assert query['range_to'] == range_to or \
+            day_of(query['range_to'] + 1) != query['partition_key']
+
+
+@given(windows, st.integers(min_value=2, max_value=16))
+def test_plan_day_queries_fans_out_shards(window, shards):
+    created_at_from, created_at_to = window
+    unsharded = plan_day_queries(created_at_from, created_at_to)
+    sharded = plan_day_queries(created_at_from, created_at_to, shards)
+
+    assert len(sharded) == len(unsharded) * (shards + 1)
+    for query in unsharded:
+        fan_out = [q for q in sharded
+                   if q['partition_key'].split('#')[0] == query['partition_key']]
+        assert len(fan_out) == shards + 1
+        assert {(q['range_from'], q['range_to']) for q in fan_out} == \
+            {(query['range_from'], query['range_to'])}
+
+
+def test_plan_range_queries():
+    created_at_from = datetime(2020, 1, 1)
+    created_at_to = datetime(2020, 1, 2)
+    ts_from = int(created_at_from.timestamp())
+    ts_to = int(created_at_to.timestamp())
+
+    assert plan_range_queries(['1', '2'], created_at_from, created_at_to) == [
+        {'partition_key': '1', 'range_from': ts_from, 'range_to': ts_to},
+        {'partition_key': '2', 'range_from': ts_from, 'range_to': ts_to}
+    ]
+    assert plan_range_queries(['1'], created_at_from, created_at_to, inclusive=False) == [
+        {'partition_key': '1', 'range_from': ts_from, 'range_to': ts_to - 1}
+    ]
+    assert plan_range_queries(['1'], created_at_to, created_at_from) == []
+
+
+def test_estimate_cost():
+    created_at_from = datetime(2020, 1, 1, 12)
+    created_at_to = datetime(2020, 1, 2, 12) - timedelta(seconds=1)
+
+    cost = estimate_cost(plan_day_queries(created_at_from, created_at_to), items_per_hour=400)
+    sharded_cost = estimate_cost(plan_day_queries(created_at_from, created_at_to, shards=3),
+                                 items_per_hour=400)
+
+    assert cost == {'queries': 2, 'seconds': 86400, 'items': 9600, 'read_units': 2 * 1200 * 0.5}
+    assert sharded_cost == {'queries': 8, 'seconds': 86400, 'items': 9600,
+                            'read_units': 8 * 300 * 0.5}
+    assert estimate_cost([], items_per_hour=400)['read_units'] == 0
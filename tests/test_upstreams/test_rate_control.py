@@ -0,0 +1,134 @@
+import pytest
+from botocore.exceptions import ClientError
+
+from rumor.exceptions import UpstreamError
+from rumor.upstreams.rate_control import (AdaptiveRateController,
+                                          consumed_capacity,
+                                          get_rate_controller,
+                                          reset_rate_controllers,
+                                          set_rate_share)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class ThrottlingTable:
+    def __init__(self, clock, capacity_per_second, capacity_per_call=1.0):
+        self.clock = clock
+        self.capacity_per_second = capacity_per_second
+        self.capacity_per_call = capacity_per_call
+        self.available = capacity_per_second
+        self.updated_at = clock()
+        self.throttled = 0
+        self.written = 0
+
+    def put_item(self, **kwargs):
+        elapsed = self.clock() - self.updated_at
+        self.updated_at = self.clock()
+        self.available = min(self.capacity_per_second,
+                             self.available + elapsed * self.capacity_per_second)
+        if self.available < self.capacity_per_call:
+            self.throttled += 1
+            raise ClientError({'Error': {
+                'Code': 'ProvisionedThroughputExceededException'}}, 'PutItem')
+        self.available -= self.capacity_per_call
+        self.written += 1
+        return {'ConsumedCapacity': {'CapacityUnits': self.capacity_per_call}}
+
+
+def test_controller_learns_sustainable_rate():
+    clock = FakeClock()
+    table = ThrottlingTable(clock, capacity_per_second=5.0)
+    controller = AdaptiveRateController(rate=1.0, burst=1.0, max_rate=50.0,
+                                        increase=0.5, clock=clock,
+                                        sleep=clock.sleep)
+
+    for i in range(200):
+        controller.call(table.put_item, Item={'id': i})
+
+    assert table.written == 200
+    assert table.throttled < 10
+    assert 200 / clock.now > 4.0
+    assert controller.throttle_count == table.throttled
+
+
+def test_controller_charges_consumed_capacity():
+    clock = FakeClock()
+    table = ThrottlingTable(clock, capacity_per_second=4.0, capacity_per_call=4.0)
+    controller = AdaptiveRateController(rate=4.0, burst=4.0, increase=0.0,
+                                        clock=clock, sleep=clock.sleep)
+
+    for i in range(10):
+        controller.call(table.put_item, Item={'id': i})
+
+    assert table.throttled == 0
+    assert clock.now >= 9.0
+
+
+def test_controller_gives_up_after_max_attempts():
+    clock = FakeClock()
+    table = ThrottlingTable(clock, capacity_per_second=0.0)
+    controller = AdaptiveRateController(max_attempts=3, clock=clock,
+                                        sleep=clock.sleep)
+
+    with pytest.raises(UpstreamError):
+        controller.call(table.put_item, Item={})
+
+    assert table.throttled == 3
+
+
+def test_controller_reraises_other_errors():
+    def failing_call():
+        raise ClientError({'Error': {'Code': 'ValidationException'}}, 'PutItem')
+
+    controller = AdaptiveRateController()
+
+    with pytest.raises(ClientError):
+        controller.call(failing_call)
+
+    assert controller.throttle_count == 0
+
+
+@pytest.mark.parametrize('response, expected', [
+    ({'ConsumedCapacity': {'CapacityUnits': 2.5}}, 2.5),
+    ({'ConsumedCapacity': [{'CapacityUnits': 1.0}, {'CapacityUnits': 0.5}]}, 1.5),
+    ({'Items': []}, None),
+    (None, None),
+])
+def test_consumed_capacity(response, expected):
+    assert consumed_capacity(response) == expected
+
+
+def test_get_rate_controller_is_shared_per_key():
+    reset_rate_controllers()
+    controller = get_rate_controller('dynamodb:some-table', rate=2.0)
+
+    assert get_rate_controller('dynamodb:some-table') is controller
+    assert get_rate_controller('dynamodb:other-table') is not controller
+    assert controller.rate == 2.0
+    reset_rate_controllers()
+
+
+def test_set_rate_share_divides_rate_limits():
+    reset_rate_controllers()
+    shared = get_rate_controller('dynamodb:some-table', rate=2.0, burst=4.0, max_rate=40.0,
+                                 max_attempts=3)
+
+    set_rate_share(0.25)
+    controller = get_rate_controller('dynamodb:some-table', rate=2.0, burst=4.0, max_rate=40.0,
+                                     max_attempts=3)
+    set_rate_share(1.0)
+
+    assert controller is not shared
+    assert (controller.rate, controller.burst, controller.max_rate) == (0.5, 1.0, 10.0)
+    assert controller.max_attempts == 3
+    assert get_rate_controller('dynamodb:some-table', rate=2.0).rate == 2.0
+    reset_rate_controllers()
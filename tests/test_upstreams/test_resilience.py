@@ -0,0 +1,82 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from rumor.exceptions import CircuitOpenError, UpstreamError
+from rumor.upstreams.resilience import (CLOSED, HALF_OPEN, OPEN,
+                                        CircuitBreaker, LatencyTracker,
+                                        hedged_call)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def failing():
+    raise UpstreamError('boom')
+
+
+def test_circuit_breaker_opens_and_recovers():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+
+    for _ in range(2):
+        with pytest.raises(UpstreamError):
+            breaker.call(failing)
+    assert breaker.state == OPEN
+
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: 'ok')
+
+    clock.now = 10
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_circuit_breaker_reopens_after_failed_trial():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    with pytest.raises(UpstreamError):
+        breaker.call(failing)
+
+    clock.now = 11
+    with pytest.raises(UpstreamError):
+        breaker.call(failing)
+
+    assert breaker.state == OPEN
+    assert breaker.opened_at == 11
+
+
+def test_latency_tracker_percentiles():
+    tracker = LatencyTracker()
+    for i in range(1, 101):
+        tracker.record(i / 100.0)
+
+    assert tracker.percentile(50) == pytest.approx(0.5, abs=0.02)
+    assert tracker.percentile(99) == pytest.approx(0.99, abs=0.02)
+    assert tracker.percentile(95, default=1.0, min_samples=200) == 1.0
+
+
+def test_hedged_call_propagates_errors():
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        with pytest.raises(UpstreamError):
+            hedged_call(executor, failing, hedge_after=0.01)
+
+
+def test_hedged_call_ignores_executor_queue_time():
+    tracker = LatencyTracker()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(time.sleep, 0.3)
+        result = hedged_call(executor, lambda: time.sleep(0.01) or 'ok',
+                             hedge_after=0.1, tracker=tracker)
+
+    assert result == 'ok'
+    assert tracker.hedged == 0
+    assert tracker.percentile(100) < 0.1
@@ -0,0 +1,38 @@
+from rumor.upstreams.sharding import (get_partition_key, get_partition_keys,
+                                      get_shard, shard_item, shard_key,
+                                      unshard_item)
+
+
+def test_get_shard_is_stable():
+    assert get_shard('30000000', 8) == get_shard(30000000, 8)
+    assert {get_shard(str(i), 8) for i in range(100)} == set(range(8))
+
+
+def test_get_partition_key():
+    assert get_partition_key('2020-01-01', '1', 1) == '2020-01-01'
+    assert get_partition_key('2020-01-01', '1', 4) == f'2020-01-01#{get_shard("1", 4)}'
+
+
+def test_get_partition_keys_include_unsharded_partition():
+    assert get_partition_keys('2020-01-01', 1) == ['2020-01-01']
+    assert get_partition_keys('2020-01-01', 3) == [
+        '2020-01-01', '2020-01-01#0', '2020-01-01#1', '2020-01-01#2']
+
+
+def test_shard_item_round_trip():
+    item = {'news_item_id': '1', 'created_at_date': '2020-01-01', 'score': 10}
+
+    sharded = shard_item(item, 4)
+
+    assert item['created_at_date'] == '2020-01-01'
+    assert sharded['created_at_date'] == get_partition_key('2020-01-01', '1', 4)
+    assert shard_item(sharded, 1)['created_at_date'] == '2020-01-01'
+    assert unshard_item(sharded) == item
+
+
+def test_shard_key():
+    key = {'news_item_id': '1', 'created_at_date': '2020-01-01'}
+
+    assert shard_key(key, 1) == key
+    assert shard_key(key, 4) == {'news_item_id': '1',
+                                 'created_at_date': get_partition_key('2020-01-01', '1', 4)}
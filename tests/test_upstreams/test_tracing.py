@@ -0,0 +1,40 @@
+import json
+
+from rumor.upstreams.tracing import (add_hop, get_sent_at,
+                                     get_trace_attributes, get_trace_context,
+                                     merge_trace_contexts, new_trace_context)
+
+
+def test_trace_context_roundtrip_through_sqs_attributes():
+    context = add_hop(new_trace_context(discovered_at=100.0), 'inspect', 1.23456, 0.5)
+
+    message = {'MessageAttributes': get_trace_attributes(context)}
+
+    assert get_trace_context(message) == context
+    assert context['hops'] == [{'stage': 'inspect', 'queue_wait': 1.235, 'processing': 0.5}]
+
+
+def test_get_trace_context_from_lambda_record():
+    record = {'messageAttributes': {'rumor_trace': {
+        'dataType': 'String',
+        'stringValue': json.dumps({'trace_id': 'a', 'discovered_at': 1.0, 'hops': []})
+    }}, 'attributes': {'SentTimestamp': '2500'}}
+
+    assert get_trace_context(record)['trace_id'] == 'a'
+    assert get_sent_at(record) == 2.5
+
+
+def test_get_trace_context_ignores_missing_or_invalid_attributes():
+    assert get_trace_context({'body': '{}'}) is None
+    assert get_trace_context({'MessageAttributes': {'rumor_trace': {
+        'DataType': 'String', 'StringValue': 'not json'}}}) is None
+    assert get_sent_at({}) is None
+    assert get_trace_attributes(None) is None
+
+
+def test_merge_trace_contexts_keeps_oldest_discovery():
+    older = new_trace_context(discovered_at=1.0)
+    newer = new_trace_context(discovered_at=2.0)
+
+    assert merge_trace_contexts([newer, None, older]) == older
+    assert merge_trace_contexts([None]) is None